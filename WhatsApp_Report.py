@@ -1,102 +1,134 @@
 # WhatsApp_Report.py  — PART 1 / 5
 import streamlit as st
-import json
-import os
 import urllib.parse
-import sqlite3
-from datetime import datetime, timedelta
-import pytz
+from datetime import datetime
+from functools import wraps
+
+import aggregate
+import analytics
+import backfill
+import metrics
+import moves
+import report_core
+import templates
+import write_behind
+from report_core import DEFAULT_CUMULATIVE, DONE_FIELDS, MOVE_FIELDS, TZ
 
 # Page config
 st.set_page_config(page_title="Vessel Hourly & 4-Hourly Moves", layout="wide")
 
+# opt-in timing: REPORT_METRICS=<file> writes every run's spans, ?diag=1 shows them at the bottom
+DIAG = st.query_params.get("diag") == "1"
+metrics.begin_run("app", force=DIAG)
+
+def diag_run(fn):
+    """A span inside the full run, or its own metrics run (fragment reruns, button callbacks)."""
+    @wraps(fn)
+    def recorded(*args, **kwargs):
+        with metrics.run_or_span(fn.__name__, force=DIAG) as own:
+            fn(*args, **kwargs)
+        if own is not None and DIAG:
+            st.session_state["diag_runs"] = (st.session_state.get("diag_runs", []) + [own])[-10:]
+    return recorded
+
+def diag_fragment(fn):
+    return st.fragment(diag_run(fn))
+
+# st.toast from a fragment button's on_click only logs a warning: the callback leaves its
+# message here and the fragment shows it at the end of its body
+def toast_later(msg: str):
+    st.session_state["pending_toast"] = msg
+
+def show_pending_toast():
+    msg = st.session_state.pop("pending_toast", None)
+    if msg:
+        st.toast(msg)
+
 # --------------------------
 # CONSTANTS & DB PERSISTENCE
 # --------------------------
 SAVE_DB = "vessel_report.db"
-TZ = pytz.timezone("Africa/Johannesburg")
-
-# default cumulative structure (used if DB empty)
-DEFAULT_CUMULATIVE = {
-    "done_load": 0,
-    "done_disch": 0,
-    "done_restow_load": 0,
-    "done_restow_disch": 0,
-    "done_hatch_open": 0,
-    "done_hatch_close": 0,
-    "last_hour": "06h00 - 07h00",
-    "vessel_name": "MSC NILA",
-    "berthed_date": "14/08/2025 @ 10h55",
-    "planned_load": 687,
-    "planned_disch": 38,
-    "planned_restow_load": 13,
-    "planned_restow_disch": 13,
-    "opening_load": 0,
-    "opening_disch": 0,
-    "opening_restow_load": 0,
-    "opening_restow_disch": 0,
-    "_openings_applied": False
-}
-
-def init_db():
-    """Create DB and default meta row if not exists."""
-    conn = sqlite3.connect(SAVE_DB)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS meta (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        );
-    """)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS hourly (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            hour_label TEXT,
-            timestamp TEXT,
-            data TEXT
-        );
-    """)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS fourh (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            block_label TEXT,
-            timestamp TEXT,
-            data TEXT
-        );
-    """)
-    # ensure a cumulative meta exists
-    cur.execute("SELECT value FROM meta WHERE key = 'cumulative';")
-    row = cur.fetchone()
-    if not row:
-        cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cumulative', ?);",
-                    (json.dumps(DEFAULT_CUMULATIVE),))
-        conn.commit()
-    conn.close()
-
-def load_cumulative_db():
-    conn = sqlite3.connect(SAVE_DB)
-    cur = conn.cursor()
-    cur.execute("SELECT value FROM meta WHERE key = 'cumulative';")
-    row = cur.fetchone()
-    conn.close()
-    if row:
-        try:
-            return json.loads(row[0])
-        except Exception:
-            return DEFAULT_CUMULATIVE.copy()
-    return DEFAULT_CUMULATIVE.copy()
-
-def save_cumulative_db(cum: dict):
-    conn = sqlite3.connect(SAVE_DB)
-    cur = conn.cursor()
-    cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cumulative', ?);",
-                (json.dumps(cum),))
-    conn.commit()
-    conn.close()
-
-# init DB & load cumulative
-init_db()
-cumulative = load_cumulative_db()
+# settings typed into the app; edits are saved in the background (see queue_meta_save)
+META_INPUT_KEYS = ["vessel_name", "berthed_date", "planned_load", "planned_disch",
+                   "planned_restow_load", "planned_restow_disch", "opening_load",
+                   "opening_disch", "opening_restow_load", "opening_restow_disch"]
+
+@st.cache_resource
+@metrics.timed("db_connect")
+def get_db():
+    """One pooled connection per server process, schema checked once at creation."""
+    return report_core.open_db(SAVE_DB)
+
+def list_calls():
+    """[(call_id, vessel_name)], newest call first."""
+    return report_core.list_calls(db)
+
+def create_call(vessel_name: str, berthed_date: str):
+    """Start a new vessel call with default plans; returns its id."""
+    return report_core.create_call(db, vessel_name, berthed_date)
+
+@metrics.timed()
+def load_cumulative_db(call_id: int):
+    return report_core.load_cumulative(db, call_id)
+
+def load_fourh_tracker(call_id: int, since_id: int):
+    """Rebuild the rolling 4-hour tracker from the call's last 4 ledger rows after since_id."""
+    return report_core.load_fourh_ring(db, call_id, since_id)
+
+@st.cache_resource
+def get_autosave():
+    """Per-process write-behind worker: settings edits are coalesced and saved off the UI thread."""
+    return write_behind.WriteBehind()
+
+@st.cache_resource
+def get_move_series(call_id: int):
+    """Per-call prefix-sum series, shared by every session and kept across reruns."""
+    return aggregate.MoveSeries()
+
+@metrics.timed()
+def move_series(call_id: int, kind: str, *args):
+    """One window of the call's series (kind is a MoveSeries query, e.g. "rolling").
+
+    The series is topped up with only the ledger rows saved since it was last read. The
+    query runs under the series lock too: another session's top-up re-sums it in place.
+    """
+    series = get_move_series(call_id)
+    generation = db.generation()
+    with series.lock:
+        if series.generation != generation:
+            report_core.load_series(db, call_id, series)
+            series.generation = generation
+        return getattr(series, kind)(*args)
+
+# cached reads: keyed on the DB generation, so they are reused until something commits.
+# st.cache_data hands every run its own copy, so the app may still mutate `cumulative`.
+@st.cache_data(max_entries=64)
+def cached_cumulative(call_id: int, generation):
+    return load_cumulative_db(call_id)
+
+@st.cache_data(max_entries=8)
+def cached_calls(generation):
+    return list_calls()
+
+@st.cache_data(max_entries=64)
+def cached_summary_window(call_id: int, kind: str, day, shift, generation):
+    return report_core.summary_window(db, call_id, kind, day=day, shift=shift)
+
+@st.cache_data(max_entries=16)
+def cached_latest_hour(call_id: int, generation):
+    return report_core.latest_hour(db, call_id)
+
+@st.cache_data(max_entries=16)
+def cached_ledger_entries(call_id: int, generation):
+    return report_core.ledger_entries(db, call_id)
+
+# init DB & load cumulative for this session's vessel call
+db = get_db()
+autosave = get_autosave()
+if st.session_state.get("call_id") not in [c[0] for c in cached_calls(db.generation())]:
+    st.session_state["call_id"] = cached_calls(db.generation())[0][0]
+CALL_ID = st.session_state["call_id"]
+cumulative = cached_cumulative(CALL_ID, db.generation())
 
 # --------------------------
 # HOUR HELPERS
@@ -142,17 +174,10 @@ for k in [
 ]:
     init_key(k, cumulative.get(k, DEFAULT_CUMULATIVE[k]))
 
-# HOURLY inputs (include gearbox, first & last lift)
-for k in [
-    "hr_fwd_load","hr_mid_load","hr_aft_load","hr_poop_load",
-    "hr_fwd_disch","hr_mid_disch","hr_aft_disch","hr_poop_disch",
-    "hr_fwd_restow_load","hr_mid_restow_load","hr_aft_restow_load","hr_poop_restow_load",
-    "hr_fwd_restow_disch","hr_mid_restow_disch","hr_aft_restow_disch","hr_poop_restow_disch",
-    "hr_hatch_fwd_open","hr_hatch_mid_open","hr_hatch_aft_open",
-    "hr_hatch_fwd_close","hr_hatch_mid_close","hr_hatch_aft_close",
-    "hr_gearbox_total",  # only hourly
-    "first_lift","last_lift"
-]:
+# HOURLY inputs: one widget key per move field ("hr_fwd_load" ...), read and written
+# together through moves.HourRecord; gearbox is hourly only
+HOUR_PREFIX, GEARBOX_KEY = "hr_", "hr_gearbox_total"
+for k in moves.HourRecord.keys(HOUR_PREFIX) + [GEARBOX_KEY, "first_lift", "last_lift"]:
     init_key(k, 0)
 
 # idle entries
@@ -165,198 +190,208 @@ init_key("hourly_time", cumulative.get("last_hour", hours_list[0]))
 
 # FOUR-HOUR tracker
 def empty_tracker():
-    return {
-        "fwd_load": [], "mid_load": [], "aft_load": [], "poop_load": [],
-        "fwd_disch": [], "mid_disch": [], "aft_disch": [], "poop_disch": [],
-        "fwd_restow_load": [], "mid_restow_load": [], "aft_restow_load": [], "poop_restow_load": [],
-        "fwd_restow_disch": [], "mid_restow_disch": [], "aft_restow_disch": [], "poop_restow_disch": [],
-        "hatch_fwd_open": [], "hatch_mid_open": [], "hatch_aft_open": [],
-        "hatch_fwd_close": [], "hatch_mid_close": [], "hatch_aft_close": [],
-        "count_hours": 0,
-    }
-
-init_key("fourh", cumulative.get("fourh", empty_tracker()))
+    # ring buffer of the last 4 hours, each a (position × move type) matrix
+    return moves.empty_ring(4)
+
+if "fourh" not in st.session_state:  # not init_key: its default would query the ledger every rerun
+    st.session_state["fourh"] = load_fourh_tracker(CALL_ID, int(cumulative.get("fourh_since_id", 0)))
 init_key("fourh_manual_override", False)
 
-for k in [
-    "m4h_fwd_load","m4h_mid_load","m4h_aft_load","m4h_poop_load",
-    "m4h_fwd_disch","m4h_mid_disch","m4h_aft_disch","m4h_poop_disch",
-    "m4h_fwd_restow_load","m4h_mid_restow_load","m4h_aft_restow_load","m4h_poop_restow_load",
-    "m4h_fwd_restow_disch","m4h_mid_restow_disch","m4h_aft_restow_disch","m4h_poop_restow_disch",
-    "m4h_hatch_fwd_open","m4h_hatch_mid_open","m4h_hatch_aft_open",
-    "m4h_hatch_fwd_close","m4h_hatch_mid_close","m4h_hatch_aft_close",
-]:
+MANUAL_4H_PREFIX = "m4h_"
+for k in moves.HourRecord.keys(MANUAL_4H_PREFIX):
     init_key(k, 0)
 
 init_key("fourh_block", cumulative.get("fourh_block", four_hour_blocks()[0]))
 
-# small helpers
-def sum_list(lst):
-    return int(sum(lst)) if lst else 0
-
-def add_current_hour_to_4h():
-    tr = st.session_state["fourh"]
-    tr["fwd_load"].append(st.session_state["hr_fwd_load"])
-    tr["mid_load"].append(st.session_state["hr_mid_load"])
-    tr["aft_load"].append(st.session_state["hr_aft_load"])
-    tr["poop_load"].append(st.session_state["hr_poop_load"])
-
-    tr["fwd_disch"].append(st.session_state["hr_fwd_disch"])
-    tr["mid_disch"].append(st.session_state["hr_mid_disch"])
-    tr["aft_disch"].append(st.session_state["hr_aft_disch"])
-    tr["poop_disch"].append(st.session_state["hr_poop_disch"])
-
-    tr["fwd_restow_load"].append(st.session_state["hr_fwd_restow_load"])
-    tr["mid_restow_load"].append(st.session_state["hr_mid_restow_load"])
-    tr["aft_restow_load"].append(st.session_state["hr_aft_restow_load"])
-    tr["poop_restow_load"].append(st.session_state["hr_poop_restow_load"])
-
-    tr["fwd_restow_disch"].append(st.session_state["hr_fwd_restow_disch"])
-    tr["mid_restow_disch"].append(st.session_state["hr_mid_restow_disch"])
-    tr["aft_restow_disch"].append(st.session_state["hr_aft_restow_disch"])
-    tr["poop_restow_disch"].append(st.session_state["hr_poop_restow_disch"])
-
-    tr["hatch_fwd_open"].append(st.session_state["hr_hatch_fwd_open"])
-    tr["hatch_mid_open"].append(st.session_state["hr_hatch_mid_open"])
-    tr["hatch_aft_open"].append(st.session_state["hr_hatch_aft_open"])
-
-    tr["hatch_fwd_close"].append(st.session_state["hr_hatch_fwd_close"])
-    tr["hatch_mid_close"].append(st.session_state["hr_hatch_mid_close"])
-    tr["hatch_aft_close"].append(st.session_state["hr_hatch_aft_close"])
-
-    # keep only last 4 hours per list
-    for k in tr.keys():
-        if isinstance(tr[k], list):
-            tr[k] = tr[k][-4:]
-    tr["count_hours"] = min(4, tr["count_hours"] + 1)
-
 def reset_4h_tracker():
     st.session_state["fourh"] = empty_tracker()
-    # persist to DB
-    cumulative['fourh'] = st.session_state["fourh"]
-    save_cumulative_db(cumulative)
+    # persist to DB: the window restarts after the latest ledger row
+    report_core.restart_fourh_window(db, cumulative, CALL_ID)
     # WhatsApp_Report.py  — PART 2 / 5
 
+# --------------------------
+# Vessel call switcher — each call is its own partition of meta / hourly / fourh
+# --------------------------
+def load_call_into_session(call_id: int):
+    """Overwrite this session's call-specific keys with the stored state of call_id."""
+    cum = load_cumulative_db(call_id)
+    for k in META_INPUT_KEYS:
+        st.session_state[k] = cum.get(k, DEFAULT_CUMULATIVE[k])
+    st.session_state["hourly_time"] = cum.get("last_hour", hour_range_list()[0])
+    st.session_state["fourh"] = load_fourh_tracker(call_id, int(cum.get("fourh_since_id", 0)))
+    st.session_state["fourh_block"] = cum.get("fourh_block", four_hour_blocks()[0])
+
+def on_switch_call():
+    autosave.flush()
+    load_call_into_session(st.session_state["call_id"])
+
+def on_new_call():
+    name = (st.session_state.get("new_call_vessel") or "").strip()
+    if not name:
+        return
+    autosave.flush()
+    new_id = create_call(name, (st.session_state.get("new_call_berthed") or "").strip())
+    st.session_state["call_id"] = new_id
+    load_call_into_session(new_id)
+
+calls = dict(cached_calls(db.generation()))
+with st.sidebar:
+    st.subheader("⚓ Vessel Call")
+    st.selectbox("Active call", options=list(calls), key="call_id", on_change=on_switch_call,
+                 format_func=lambda cid: f"#{cid} — {calls.get(cid) or 'unnamed'}")
+    with st.expander("➕ Start new vessel call"):
+        st.text_input("Vessel Name", key="new_call_vessel")
+        st.text_input("Berthed Date", key="new_call_berthed")
+        st.button("Create call", on_click=on_new_call)
+
 st.title("Vessel Hourly & 4-Hourly Moves Tracker")
 
 # --------------------------
 # Date & Vessel (inputs) - DO NOT assign widget returns back to session_state directly
 # --------------------------
+def session_meta():
+    ss = st.session_state
+    return {k: ss[k] if k in ("vessel_name", "berthed_date") else int(ss.get(k, 0)) for k in META_INPUT_KEYS}
+
+def queue_meta_save():
+    """on_change of the vessel / plan / opening inputs: saved in the background, coalesced."""
+    call_id = st.session_state["call_id"]
+    values = session_meta()
+    cumulative.update(values)
+    autosave.submit(("meta", call_id), values, lambda v: report_core.update_meta(db, call_id, v))
+
+def flush_settings():
+    """Before an explicit action writes: pending edits land first and `cumulative` agrees."""
+    cumulative.update(session_meta())
+    autosave.flush()
+
 left, right = st.columns([2,1])
 with left:
     st.subheader("🚢 Vessel Info")
-    st.text_input("Vessel Name", key="vessel_name")
-    st.text_input("Berthed Date", key="berthed_date")
+    st.text_input("Vessel Name", key="vessel_name", on_change=queue_meta_save)
+    st.text_input("Berthed Date", key="berthed_date", on_change=queue_meta_save)
 with right:
     st.subheader("📅 Report Date")
     st.date_input("Select Report Date", key="report_date")
 
-# apply any vessel/berthed changes to cumulative immediately (auto-save)
-def persist_meta_changes():
-    cumulative["vessel_name"] = st.session_state["vessel_name"]
-    cumulative["berthed_date"] = st.session_state["berthed_date"]
-    cumulative["planned_load"] = int(st.session_state.get("planned_load", 0))
-    cumulative["planned_disch"] = int(st.session_state.get("planned_disch", 0))
-    cumulative["planned_restow_load"] = int(st.session_state.get("planned_restow_load", 0))
-    cumulative["planned_restow_disch"] = int(st.session_state.get("planned_restow_disch", 0))
-    cumulative["opening_load"] = int(st.session_state.get("opening_load", 0))
-    cumulative["opening_disch"] = int(st.session_state.get("opening_disch", 0))
-    cumulative["opening_restow_load"] = int(st.session_state.get("opening_restow_load", 0))
-    cumulative["opening_restow_disch"] = int(st.session_state.get("opening_restow_disch", 0))
-    save_cumulative_db(cumulative)
-
 # Plan Totals & Opening Balance (internal)
 with st.expander("📋 Plan Totals & Opening Balance (Internal Only)", expanded=False):
     c1, c2 = st.columns(2)
     with c1:
-        st.number_input("Planned Load",  min_value=0, key="planned_load")
-        st.number_input("Planned Discharge", min_value=0, key="planned_disch")
-        st.number_input("Planned Restow Load",  min_value=0, key="planned_restow_load")
-        st.number_input("Planned Restow Discharge", min_value=0, key="planned_restow_disch")
+        st.number_input("Planned Load",  min_value=0, key="planned_load", on_change=queue_meta_save)
+        st.number_input("Planned Discharge", min_value=0, key="planned_disch", on_change=queue_meta_save)
+        st.number_input("Planned Restow Load",  min_value=0, key="planned_restow_load", on_change=queue_meta_save)
+        st.number_input("Planned Restow Discharge", min_value=0, key="planned_restow_disch", on_change=queue_meta_save)
     with c2:
-        st.number_input("Opening Load (Deduction)",  min_value=0, key="opening_load")
-        st.number_input("Opening Discharge (Deduction)", min_value=0, key="opening_disch")
-        st.number_input("Opening Restow Load (Deduction)",  min_value=0, key="opening_restow_load")
-        st.number_input("Opening Restow Discharge (Deduction)", min_value=0, key="opening_restow_disch")
-    # persist meta on change
+        st.number_input("Opening Load (Deduction)",  min_value=0, key="opening_load", on_change=queue_meta_save)
+        st.number_input("Opening Discharge (Deduction)", min_value=0, key="opening_disch", on_change=queue_meta_save)
+        st.number_input("Opening Restow Load (Deduction)",  min_value=0, key="opening_restow_load", on_change=queue_meta_save)
+        st.number_input("Opening Restow Discharge (Deduction)", min_value=0, key="opening_restow_disch", on_change=queue_meta_save)
+    # edits save themselves in the background; this just makes sure they are on disk now
     if st.button("💾 Save Plan/Opening changes"):
-        persist_meta_changes()
+        flush_settings()
         st.success("Plan and opening balances saved.")
+if autosave.failed:
+    st.error(f"Background save gave up: {'; '.join(autosave.failed.values())}. Re-enter those changes.")
+elif autosave.last_error:
+    st.warning(f"Background save failed, retrying: {autosave.last_error}")
 
 # --------------------------
-# Hour selector (24h) with safe override handoff
-# --------------------------
-# Apply pending hour change override before rendering
-if "hourly_time_override" in st.session_state:
-    st.session_state["hourly_time"] = st.session_state["hourly_time_override"]
-    del st.session_state["hourly_time_override"]
-
-# Ensure valid label
-if st.session_state.get("hourly_time") not in hour_range_list():
-    st.session_state["hourly_time"] = cumulative.get("last_hour", hour_range_list()[0])
-
-st.selectbox(
-    "⏱ Select Hourly Time",
-    options=hour_range_list(),
-    index=hour_range_list().index(st.session_state["hourly_time"]),
-    key="hourly_time"
-)
-
-st.markdown(f"### 🕐 Hourly Moves Input ({st.session_state['hourly_time']})")
-
-# --------------------------
-# Crane Moves (Load & Discharge) - keep under collapsible groups as original
+# Hourly Totals Tracker (split by position)
 # --------------------------
-with st.expander("🏗️ Crane Moves"):
-    with st.expander("📦 Load"):
-        st.number_input("FWD Load", min_value=0, key="hr_fwd_load")
-        st.number_input("MID Load", min_value=0, key="hr_mid_load")
-        st.number_input("AFT Load", min_value=0, key="hr_aft_load")
-        st.number_input("POOP Load", min_value=0, key="hr_poop_load")
-    with st.expander("📤 Discharge"):
-        st.number_input("FWD Discharge", min_value=0, key="hr_fwd_disch")
-        st.number_input("MID Discharge", min_value=0, key="hr_mid_disch")
-        st.number_input("AFT Discharge", min_value=0, key="hr_aft_disch")
-        st.number_input("POOP Discharge", min_value=0, key="hr_poop_disch")
+def current_hour_record():
+    return moves.HourRecord.from_session(st.session_state, HOUR_PREFIX, GEARBOX_KEY)
 
-# --------------------------
-# Restows (Load & Discharge)
-# --------------------------
-with st.expander("🔄 Restows"):
-    with st.expander("📦 Load"):
-        st.number_input("FWD Restow Load", min_value=0, key="hr_fwd_restow_load")
-        st.number_input("MID Restow Load", min_value=0, key="hr_mid_restow_load")
-        st.number_input("AFT Restow Load", min_value=0, key="hr_aft_restow_load")
-        st.number_input("POOP Restow Load", min_value=0, key="hr_poop_restow_load")
-    with st.expander("📤 Discharge"):
-        st.number_input("FWD Restow Discharge", min_value=0, key="hr_fwd_restow_disch")
-        st.number_input("MID Restow Discharge", min_value=0, key="hr_mid_restow_disch")
-        st.number_input("AFT Restow Discharge", min_value=0, key="hr_aft_restow_disch")
-        st.number_input("POOP Restow Discharge", min_value=0, key="hr_poop_restow_disch")
+def hourly_totals_split():
+    return current_hour_record().split()
+
+@diag_fragment
+def hourly_input_panel():
+    """Hour selector and hourly move inputs; typing a number reruns only this panel."""
+    # --------------------------
+    # Hour selector (24h) with safe override handoff
+    # --------------------------
+    # Apply pending hour change override before rendering
+    if "hourly_time_override" in st.session_state:
+        st.session_state["hourly_time"] = st.session_state["hourly_time_override"]
+        del st.session_state["hourly_time_override"]
+
+    # Ensure valid label
+    if st.session_state.get("hourly_time") not in hour_range_list():
+        st.session_state["hourly_time"] = cumulative.get("last_hour", hour_range_list()[0])
+
+    st.selectbox(
+        "⏱ Select Hourly Time",
+        options=hour_range_list(),
+        index=hour_range_list().index(st.session_state["hourly_time"]),
+        key="hourly_time"
+    )
 
-# --------------------------
-# Hatch Moves (Open & Close)
-# --------------------------
-with st.expander("🛡️ Hatch Moves"):
-    with st.expander("🔓 Open"):
-        st.number_input("FWD Hatch Open", min_value=0, key="hr_hatch_fwd_open")
-        st.number_input("MID Hatch Open", min_value=0, key="hr_hatch_mid_open")
-        st.number_input("AFT Hatch Open", min_value=0, key="hr_hatch_aft_open")
-    with st.expander("🔒 Close"):
-        st.number_input("FWD Hatch Close", min_value=0, key="hr_hatch_fwd_close")
-        st.number_input("MID Hatch Close", min_value=0, key="hr_hatch_mid_close")
-        st.number_input("AFT Hatch Close", min_value=0, key="hr_hatch_aft_close")
-
-# Gearbox (hourly only)
-with st.expander("🔧 Gearbox (Hourly total - one line)"):
-    st.number_input("Total Gearboxes (hour)", min_value=0, key="hr_gearbox_total")
-    st.caption("Note: gearbox total is hourly only and will not be kept cumulative.")
-    # WhatsApp_Report.py  — PART 3 / 5
+    st.markdown(f"### 🕐 Hourly Moves Input ({st.session_state['hourly_time']})")
+
+    # --------------------------
+    # Crane Moves (Load & Discharge) - keep under collapsible groups as original
+    # --------------------------
+    with st.expander("🏗️ Crane Moves"):
+        with st.expander("📦 Load"):
+            st.number_input("FWD Load", min_value=0, key="hr_fwd_load")
+            st.number_input("MID Load", min_value=0, key="hr_mid_load")
+            st.number_input("AFT Load", min_value=0, key="hr_aft_load")
+            st.number_input("POOP Load", min_value=0, key="hr_poop_load")
+        with st.expander("📤 Discharge"):
+            st.number_input("FWD Discharge", min_value=0, key="hr_fwd_disch")
+            st.number_input("MID Discharge", min_value=0, key="hr_mid_disch")
+            st.number_input("AFT Discharge", min_value=0, key="hr_aft_disch")
+            st.number_input("POOP Discharge", min_value=0, key="hr_poop_disch")
+
+    # --------------------------
+    # Restows (Load & Discharge)
+    # --------------------------
+    with st.expander("🔄 Restows"):
+        with st.expander("📦 Load"):
+            st.number_input("FWD Restow Load", min_value=0, key="hr_fwd_restow_load")
+            st.number_input("MID Restow Load", min_value=0, key="hr_mid_restow_load")
+            st.number_input("AFT Restow Load", min_value=0, key="hr_aft_restow_load")
+            st.number_input("POOP Restow Load", min_value=0, key="hr_poop_restow_load")
+        with st.expander("📤 Discharge"):
+            st.number_input("FWD Restow Discharge", min_value=0, key="hr_fwd_restow_disch")
+            st.number_input("MID Restow Discharge", min_value=0, key="hr_mid_restow_disch")
+            st.number_input("AFT Restow Discharge", min_value=0, key="hr_aft_restow_disch")
+            st.number_input("POOP Restow Discharge", min_value=0, key="hr_poop_restow_disch")
+
+    # --------------------------
+    # Hatch Moves (Open & Close)
+    # --------------------------
+    with st.expander("🛡️ Hatch Moves"):
+        with st.expander("🔓 Open"):
+            st.number_input("FWD Hatch Open", min_value=0, key="hr_hatch_fwd_open")
+            st.number_input("MID Hatch Open", min_value=0, key="hr_hatch_mid_open")
+            st.number_input("AFT Hatch Open", min_value=0, key="hr_hatch_aft_open")
+        with st.expander("🔒 Close"):
+            st.number_input("FWD Hatch Close", min_value=0, key="hr_hatch_fwd_close")
+            st.number_input("MID Hatch Close", min_value=0, key="hr_hatch_mid_close")
+            st.number_input("AFT Hatch Close", min_value=0, key="hr_hatch_aft_close")
+
+    # Gearbox (hourly only)
+    with st.expander("🔧 Gearbox (Hourly total - one line)"):
+        st.number_input("Total Gearboxes (hour)", min_value=0, key="hr_gearbox_total")
+        st.caption("Note: gearbox total is hourly only and will not be kept cumulative.")
+
+    with st.expander("🧮 Hourly Totals (split by FWD / MID / AFT / POOP)"):
+        split = hourly_totals_split()
+        st.write(f"**Load**       — FWD {split['load']['FWD']} | MID {split['load']['MID']} | AFT {split['load']['AFT']} | POOP {split['load']['POOP']}")
+        st.write(f"**Discharge**  — FWD {split['disch']['FWD']} | MID {split['disch']['MID']} | AFT {split['disch']['AFT']} | POOP {split['disch']['POOP']}")
+        st.write(f"**Restow Load**— FWD {split['restow_load']['FWD']} | MID {split['restow_load']['MID']} | AFT {split['restow_load']['AFT']} | POOP {split['restow_load']['POOP']}")
+        st.write(f"**Restow Disch**— FWD {split['restow_disch']['FWD']} | MID {split['restow_disch']['MID']} | AFT {split['restow_disch']['AFT']} | POOP {split['restow_disch']['POOP']}")
+        st.write(f"**Hatch Open** — FWD {split['hatch_open']['FWD']} | MID {split['hatch_open']['MID']} | AFT {split['hatch_open']['AFT']}")
+        st.write(f"**Hatch Close**— FWD {split['hatch_close']['FWD']} | MID {split['hatch_close']['MID']} | AFT {split['hatch_close']['AFT']}")
+
+hourly_input_panel()
+# WhatsApp_Report.py  — PART 3 / 5
 
 # --------------------------
 # Idle / Delays
 # --------------------------
-st.subheader("⏸️ Idle / Delays")
 idle_options = [
     "Stevedore tea time/shift change",
     "Awaiting cargo",
@@ -374,261 +409,274 @@ idle_options = [
     "Cell guide struggles",
     "Spreader difficulties",
 ]
-with st.expander("🛑 Idle Entries", expanded=False):
-    st.number_input("Number of Idle Entries", min_value=0, max_value=10, key="num_idle_entries")
-    entries = []
-    for i in range(st.session_state["num_idle_entries"]):
-        st.markdown(f"**Idle Entry {i+1}**")
-        c1, c2, c3, c4 = st.columns([1,1,1,2])
-        crane = c1.text_input(f"Crane {i+1}", key=f"idle_crane_{i}")
-        start = c2.text_input(f"Start {i+1}", key=f"idle_start_{i}", placeholder="e.g., 12h30")
-        end   = c3.text_input(f"End {i+1}",   key=f"idle_end_{i}",   placeholder="e.g., 12h40")
-        sel   = c4.selectbox(f"Delay {i+1}", options=idle_options, key=f"idle_sel_{i}")
-        custom = c4.text_input(f"Custom Delay {i+1} (optional)", key=f"idle_custom_{i}")
-        entries.append({
-            "crane": (crane or "").strip(),
-            "start": (start or "").strip(),
-            "end": (end or "").strip(),
-            "delay": (custom or "").strip() if (custom or "").strip() else sel
-        })
-    # Not a widget key — safe to assign directly
-    st.session_state["idle_entries"] = entries
 
-# --------------------------
-# Hourly Totals Tracker (split by position)
-# --------------------------
-def hourly_totals_split():
-    ss = st.session_state
-    return {
-        "load":       {"FWD": ss["hr_fwd_load"],       "MID": ss["hr_mid_load"],       "AFT": ss["hr_aft_load"],       "POOP": ss["hr_poop_load"]},
-        "disch":      {"FWD": ss["hr_fwd_disch"],      "MID": ss["hr_mid_disch"],      "AFT": ss["hr_aft_disch"],      "POOP": ss["hr_poop_disch"]},
-        "restow_load":{"FWD": ss["hr_fwd_restow_load"],"MID": ss["hr_mid_restow_load"],"AFT": ss["hr_aft_restow_load"],"POOP": ss["hr_poop_restow_load"]},
-        "restow_disch":{"FWD": ss["hr_fwd_restow_disch"],"MID": ss["hr_mid_restow_disch"],"AFT": ss["hr_aft_restow_disch"],"POOP": ss["hr_poop_restow_disch"]},
-        "hatch_open": {"FWD": ss["hr_hatch_fwd_open"], "MID": ss["hr_hatch_mid_open"], "AFT": ss["hr_hatch_aft_open"]},
-        "hatch_close":{"FWD": ss["hr_hatch_fwd_close"],"MID": ss["hr_hatch_mid_close"],"AFT": ss["hr_hatch_aft_close"]},
-    }
-
-with st.expander("🧮 Hourly Totals (split by FWD / MID / AFT / POOP)"):
-    split = hourly_totals_split()
-    st.write(f"**Load**       — FWD {split['load']['FWD']} | MID {split['load']['MID']} | AFT {split['load']['AFT']} | POOP {split['load']['POOP']}")
-    st.write(f"**Discharge**  — FWD {split['disch']['FWD']} | MID {split['disch']['MID']} | AFT {split['disch']['AFT']} | POOP {split['disch']['POOP']}")
-    st.write(f"**Restow Load**— FWD {split['restow_load']['FWD']} | MID {split['restow_load']['MID']} | AFT {split['restow_load']['AFT']} | POOP {split['restow_load']['POOP']}")
-    st.write(f"**Restow Disch**— FWD {split['restow_disch']['FWD']} | MID {split['restow_disch']['MID']} | AFT {split['restow_disch']['AFT']} | POOP {split['restow_disch']['POOP']}")
-    st.write(f"**Hatch Open** — FWD {split['hatch_open']['FWD']} | MID {split['hatch_open']['MID']} | AFT {split['hatch_open']['AFT']}")
-    st.write(f"**Hatch Close**— FWD {split['hatch_close']['FWD']} | MID {split['hatch_close']['MID']} | AFT {split['hatch_close']['AFT']}")
+@diag_fragment
+def idle_panel():
+    st.subheader("⏸️ Idle / Delays")
+    with st.expander("🛑 Idle Entries", expanded=False):
+        st.number_input("Number of Idle Entries", min_value=0, max_value=10, key="num_idle_entries")
+        entries = []
+        for i in range(st.session_state["num_idle_entries"]):
+            st.markdown(f"**Idle Entry {i+1}**")
+            c1, c2, c3, c4 = st.columns([1,1,1,2])
+            crane = c1.text_input(f"Crane {i+1}", key=f"idle_crane_{i}")
+            start = c2.text_input(f"Start {i+1}", key=f"idle_start_{i}", placeholder="e.g., 12h30")
+            end   = c3.text_input(f"End {i+1}",   key=f"idle_end_{i}",   placeholder="e.g., 12h40")
+            sel   = c4.selectbox(f"Delay {i+1}", options=idle_options, key=f"idle_sel_{i}")
+            custom = c4.text_input(f"Custom Delay {i+1} (optional)", key=f"idle_custom_{i}")
+            entries.append({
+                "crane": (crane or "").strip(),
+                "start": (start or "").strip(),
+                "end": (end or "").strip(),
+                "delay": (custom or "").strip() if (custom or "").strip() else sel
+            })
+        # Not a widget key — safe to assign directly. Both templates read the entries, so a
+        # changed list reruns the whole page instead of just this panel.
+        if entries != st.session_state["idle_entries"]:
+            st.session_state["idle_entries"] = entries
+            st.rerun()
+
+idle_panel()
+
+@st.cache_data(max_entries=8)
+def cached_idle_totals(call_id, by, shift, generation):
+    index = report_core.load_idle(db, [call_id])
+    if by == "Shift":
+        return [{"shift started": d.strftime("%d/%m/%Y"), "minutes": m} for d, m in sorted(index.by_shift(shift).items())]
+    totals = index.by_crane() if by == "Crane" else index.by_reason()
+    return [{by.lower(): k, "minutes": m} for k, m in sorted(totals.items(), key=lambda kv: -kv[1])]
+
+with st.expander("📉 Downtime totals (idle saved with each hourly report)"):
+    idle_by = st.radio("Total by", ["Crane", "Reason", "Shift"], horizontal=True, key="idle_by")
+    idle_shift = st.selectbox("Shift", list(aggregate.SHIFTS), key="idle_shift") if idle_by == "Shift" else None
+    idle_rows = cached_idle_totals(CALL_ID, idle_by, idle_shift, db.generation())
+    if idle_rows:
+        st.dataframe(idle_rows, hide_index=True)
+        st.caption("Overlapping delays on the same crane are counted once.")
+    else:
+        st.caption("No idle saved for this call yet.")
 
 # --------------------------
 # WhatsApp (Hourly) – original monospace template
 # --------------------------
-st.subheader("📱 Send Hourly Report to WhatsApp")
-st.text_input("Enter WhatsApp Number (with country code, e.g., 27761234567)", key="wa_num_hour")
-st.text_input("Or enter WhatsApp Group Link (optional)", key="wa_grp_hour")
+# plans / openings as currently entered (may be unsaved edits)
+def session_plans():
+    return {g: st.session_state[f"planned_{g}"] for g in report_core.PLAN_GROUPS}
+
+def session_openings():
+    return {g: int(st.session_state.get(f"opening_{g}", 0)) for g in report_core.PLAN_GROUPS}
 
 def hourly_remaining_and_plan_adjust():
     """Ensure opening balance applied (only once) and adjust plan if done > plan."""
-    # apply openings if not applied in cumulative
-    if not cumulative.get("_openings_applied", False):
-        # Opening balances are "already done" — add to done totals
-        cumulative["done_load"] += int(st.session_state.get("opening_load", 0))
-        cumulative["done_disch"] += int(st.session_state.get("opening_disch", 0))
-        cumulative["done_restow_load"] += int(st.session_state.get("opening_restow_load", 0))
-        cumulative["done_restow_disch"] += int(st.session_state.get("opening_restow_disch", 0))
-        cumulative["_openings_applied"] = True
-
-    # ensure done never exceeds plan (bump plan to done if needed so remain >=0)
-    if cumulative["done_load"] > int(st.session_state.get("planned_load", 0)):
-        st.session_state["planned_load"] = cumulative["done_load"]
-        cumulative["planned_load"] = cumulative["done_load"]
-    if cumulative["done_disch"] > int(st.session_state.get("planned_disch", 0)):
-        st.session_state["planned_disch"] = cumulative["done_disch"]
-        cumulative["planned_disch"] = cumulative["done_disch"]
-    if cumulative["done_restow_load"] > int(st.session_state.get("planned_restow_load", 0)):
-        st.session_state["planned_restow_load"] = cumulative["done_restow_load"]
-        cumulative["planned_restow_load"] = cumulative["done_restow_load"]
-    if cumulative["done_restow_disch"] > int(st.session_state.get("planned_restow_disch", 0)):
-        st.session_state["planned_restow_disch"] = cumulative["done_restow_disch"]
-        cumulative["planned_restow_disch"] = cumulative["done_restow_disch"]
+    report_core.apply_openings_once(cumulative, session_openings())
+    for g, plan in report_core.bump_plans(cumulative, session_plans()).items():
+        st.session_state[f"planned_{g}"] = plan
 
+def report_values(move_values: dict, **extra):
+    """Flat slot values for templates, with this session's vessel / plan inputs."""
+    ss = st.session_state
+    return report_core.report_values(cumulative, move_values, ss["report_date"], plans=session_plans(),
+                                     vessel_name=ss["vessel_name"], berthed_date=ss["berthed_date"], **extra)
+
+@metrics.timed()
 def generate_hourly_template():
     # Ensure openings applied and plan adjusted before computing remaining
     hourly_remaining_and_plan_adjust()
+    ss = st.session_state
+    record = current_hour_record()
+    values = report_values(record.fields(), hour=ss["hourly_time"], gearbox=record.gearbox,
+                           first_lift=ss.get("first_lift", ""), last_lift=ss.get("last_lift", ""))
+    return templates.HOURLY.render(values, ss["idle_entries"])
 
-    remaining_load  = int(st.session_state.get("planned_load", 0))  - cumulative["done_load"]
-    remaining_disch = int(st.session_state.get("planned_disch", 0)) - cumulative["done_disch"]
-    remaining_restow_load  = int(st.session_state.get("planned_restow_load", 0))  - cumulative["done_restow_load"]
-    remaining_restow_disch = int(st.session_state.get("planned_restow_disch", 0)) - cumulative["done_restow_disch"]
-
-    # Template — keep format unchanged; re-add first/last lift and gearbox line near top
-    tmpl = f"""\
-{st.session_state['vessel_name']}
-Berthed {st.session_state['berthed_date']}
-
-Date: {st.session_state['report_date'].strftime('%d/%m/%Y')}
-Hour: {st.session_state['hourly_time']}
-_________________________
-*First Lift:* {st.session_state.get('first_lift', '')}    *Last Lift:* {st.session_state.get('last_lift', '')}
-_________________________
-   *HOURLY MOVES*
-_________________________
-*Crane Moves*
-           Load   Discharge
-FWD       {st.session_state['hr_fwd_load']:>5}     {st.session_state['hr_fwd_disch']:>5}
-MID       {st.session_state['hr_mid_load']:>5}     {st.session_state['hr_mid_disch']:>5}
-AFT       {st.session_state['hr_aft_load']:>5}     {st.session_state['hr_aft_disch']:>5}
-POOP      {st.session_state['hr_poop_load']:>5}     {st.session_state['hr_poop_disch']:>5}
-_________________________
-*Restows*
-           Load   Discharge
-FWD       {st.session_state['hr_fwd_restow_load']:>5}     {st.session_state['hr_fwd_restow_disch']:>5}
-MID       {st.session_state['hr_mid_restow_load']:>5}     {st.session_state['hr_mid_restow_disch']:>5}
-AFT       {st.session_state['hr_aft_restow_load']:>5}     {st.session_state['hr_aft_restow_disch']:>5}
-POOP      {st.session_state['hr_poop_restow_load']:>5}     {st.session_state['hr_poop_restow_disch']:>5}
-_________________________
-*Gearbox*
-Total Gearboxes (hour): {st.session_state.get('hr_gearbox_total',0)}
-_________________________
-      *CUMULATIVE*
-_________________________
-           Load   Disch
-Plan       {st.session_state['planned_load']:>5}      {st.session_state['planned_disch']:>5}
-Done       {cumulative['done_load']:>5}      {cumulative['done_disch']:>5}
-Remain     {remaining_load:>5}      {remaining_disch:>5}
-_________________________
-*Restows*
-           Load   Disch
-Plan       {st.session_state['planned_restow_load']:>5}      {st.session_state['planned_restow_disch']:>5}
-Done       {cumulative['done_restow_load']:>5}      {cumulative['done_restow_disch']:>5}
-Remain     {remaining_restow_load:>5}      {remaining_restow_disch:>5}
-_________________________
-*Hatch Moves*
-           Open   Close
-FWD       {st.session_state['hr_hatch_fwd_open']:>5}      {st.session_state['hr_hatch_fwd_close']:>5}
-MID       {st.session_state['hr_hatch_mid_open']:>5}      {st.session_state['hr_hatch_mid_close']:>5}
-AFT       {st.session_state['hr_hatch_aft_open']:>5}      {st.session_state['hr_hatch_aft_close']:>5}
-_________________________
-*Idle / Delays*
-"""
-    for i, idle in enumerate(st.session_state["idle_entries"]):
-        tmpl += f"{i+1}. {idle['crane']} {idle['start']}-{idle['end']} : {idle['delay']}\n"
-    return tmpl
+def current_hour_input():
+    ss = st.session_state
+    record = current_hour_record()
+    if record.problems():
+        raise ValueError(f"negative counts in this hour: {', '.join(record.problems())}")
+    return report_core.HourInput(
+        hour_label=ss["hourly_time"], report_date=ss["report_date"],
+        moves=record.fields(), gearbox=record.gearbox,
+        first_lift=ss.get("first_lift"), last_lift=ss.get("last_lift"),
+    )
 
+@metrics.timed()
 def apply_hour_to_cumulative_and_save():
-    """Apply the current hourly inputs into cumulative and 4h tracker, then save DB."""
-    # compute hour values
-    hour_load = int(st.session_state["hr_fwd_load"]) + int(st.session_state["hr_mid_load"]) + int(st.session_state["hr_aft_load"]) + int(st.session_state["hr_poop_load"])
-    hour_disch = int(st.session_state["hr_fwd_disch"]) + int(st.session_state["hr_mid_disch"]) + int(st.session_state["hr_aft_disch"]) + int(st.session_state["hr_poop_disch"])
-    hour_restow_load = int(st.session_state["hr_fwd_restow_load"]) + int(st.session_state["hr_mid_restow_load"]) + int(st.session_state["hr_aft_restow_load"]) + int(st.session_state["hr_poop_restow_load"])
-    hour_restow_disch = int(st.session_state["hr_fwd_restow_disch"]) + int(st.session_state["hr_mid_restow_disch"]) + int(st.session_state["hr_aft_restow_disch"]) + int(st.session_state["hr_poop_restow_disch"])
-    hour_hatch_open = int(st.session_state["hr_hatch_fwd_open"]) + int(st.session_state["hr_hatch_mid_open"]) + int(st.session_state["hr_hatch_aft_open"])
-    hour_hatch_close = int(st.session_state["hr_hatch_fwd_close"]) + int(st.session_state["hr_hatch_mid_close"]) + int(st.session_state["hr_hatch_aft_close"])
-
-    # Apply opening balances first time only (if not yet applied)
-    if not cumulative.get("_openings_applied", False):
-        cumulative["done_load"] += int(st.session_state.get("opening_load", 0))
-        cumulative["done_disch"] += int(st.session_state.get("opening_disch", 0))
-        cumulative["done_restow_load"] += int(st.session_state.get("opening_restow_load", 0))
-        cumulative["done_restow_disch"] += int(st.session_state.get("opening_restow_disch", 0))
-        cumulative["_openings_applied"] = True
-
-    # Add current hour
-    cumulative["done_load"] += hour_load
-    cumulative["done_disch"] += hour_disch
-    cumulative["done_restow_load"] += hour_restow_load
-    cumulative["done_restow_disch"] += hour_restow_disch
-    cumulative["done_hatch_open"] += hour_hatch_open
-    cumulative["done_hatch_close"] += hour_hatch_close
-
-    # Keep done <= plan: if done>plan then bump plan to avoid negative remain
-    if cumulative["done_load"] > int(st.session_state.get("planned_load", 0)):
-        st.session_state["planned_load"] = cumulative["done_load"]
-        cumulative["planned_load"] = cumulative["done_load"]
-    if cumulative["done_disch"] > int(st.session_state.get("planned_disch", 0)):
-        st.session_state["planned_disch"] = cumulative["done_disch"]
-        cumulative["planned_disch"] = cumulative["done_disch"]
-    if cumulative["done_restow_load"] > int(st.session_state.get("planned_restow_load", 0)):
-        st.session_state["planned_restow_load"] = cumulative["done_restow_load"]
-        cumulative["planned_restow_load"] = cumulative["done_restow_load"]
-    if cumulative["done_restow_disch"] > int(st.session_state.get("planned_restow_disch", 0)):
-        st.session_state["planned_restow_disch"] = cumulative["done_restow_disch"]
-        cumulative["planned_restow_disch"] = cumulative["done_restow_disch"]
-
-    # persist cumulative to DB
-    cumulative["last_hour"] = st.session_state["hourly_time"]
-    cumulative["fourh"] = st.session_state["fourh"]
+    """Append the current hourly inputs to the ledger, the 4h tracker and meta (one transaction)."""
     cumulative["fourh_block"] = st.session_state["fourh_block"]
-    save_cumulative_db(cumulative)
-
-    # add to hourly table for audit trail
-    conn = sqlite3.connect(SAVE_DB)
-    cur = conn.cursor()
-    entry = {
-        "hour_label": st.session_state["hourly_time"],
-        "data": {
-            "hour_load": hour_load,
-            "hour_disch": hour_disch,
-            "hour_restow_load": hour_restow_load,
-            "hour_restow_disch": hour_restow_disch,
-            "hour_hatch_open": hour_hatch_open,
-            "hour_hatch_close": hour_hatch_close,
-            "gearbox": int(st.session_state.get("hr_gearbox_total",0)),
-            "first_lift": st.session_state.get("first_lift"),
-            "last_lift": st.session_state.get("last_lift")
-        }
-    }
-    cur.execute("INSERT INTO hourly (hour_label, timestamp, data) VALUES (?, ?, ?);",
-                (st.session_state["hourly_time"], datetime.now(TZ).isoformat(), json.dumps(entry["data"])))
-    conn.commit()
-    conn.close()
-
+    state = report_core.ReportState(CALL_ID, cumulative, st.session_state["fourh"])
+    bumped = report_core.apply_hour(db, state, current_hour_input(),
+                                    plans=session_plans(), openings=session_openings())
+    # Keep done <= plan: plans that were passed are bumped in the inputs too
+    for g, plan in bumped.items():
+        st.session_state[f"planned_{g}"] = plan
+
+@diag_run
 def on_generate_hourly():
-    # first, push current hour into rolling 4-hour tracker using values from hourly inputs
-    add_current_hour_to_4h()
-    # then apply to cumulative and save (this ensures template shows updated done immediately)
-    apply_hour_to_cumulative_and_save()
+    """Button callback: runs before any widget is drawn, so hourly inputs may be cleared here."""
+    # push the hour into cumulative, the ledger and the rolling 4-hour tracker (this ensures the
+    # template shows updated done immediately); every write of this action shares one commit
+    flush_settings()
+    with db.transaction():
+        apply_hour_to_cumulative_and_save()
+        report_core.save_idle(db, CALL_ID, st.session_state["report_date"], st.session_state["idle_entries"])
+    # keep the generated template text for display after the page refreshes
+    st.session_state["hourly_text"] = generate_hourly_template()
     # auto-advance hour safely for next render of selectbox
     st.session_state["hourly_time_override"] = next_hour_label(st.session_state["hourly_time"])
     # clear hourly gearbox only after saving (gearbox not cumulative)
-    st.session_state["hr_gearbox_total"] = 0
-    # return the generated template text for display
-    return generate_hourly_template()
+    st.session_state[GEARBOX_KEY] = 0
     # WhatsApp_Report.py  — PART 4 / 5
 
-colA, colB, colC = st.columns([1,1,1])
-with colA:
-    if st.button("✅ Generate Hourly Template & Update Totals"):
-        txt = on_generate_hourly()
-        st.code(txt, language="text")
-
-# removed preview button as requested (single generate button only)
-with colC:
-    if st.button("📤 Open WhatsApp (Hourly)"):
-        txt = generate_hourly_template()
-        wa_text = f"```{txt}```"
-        if st.session_state.get("wa_num_hour"):
-            link = f"https://wa.me/{st.session_state['wa_num_hour']}?text={urllib.parse.quote(wa_text)}"
-            st.markdown(f"[Open WhatsApp]({link})", unsafe_allow_html=True)
-        elif st.session_state.get("wa_grp_hour"):
-            st.markdown(f"[Open WhatsApp Group]({st.session_state['wa_grp_hour']})", unsafe_allow_html=True)
-        else:
-            st.info("Enter a WhatsApp number or group link to send.")
-
 # Reset HOURLY inputs + safe hour advance
 def reset_hourly_inputs():
-    for k in [
-        "hr_fwd_load","hr_mid_load","hr_aft_load","hr_poop_load",
-        "hr_fwd_disch","hr_mid_disch","hr_aft_disch","hr_poop_disch",
-        "hr_fwd_restow_load","hr_mid_restow_load","hr_aft_restow_load","hr_poop_restow_load",
-        "hr_fwd_restow_disch","hr_mid_restow_disch","hr_aft_restow_disch","hr_poop_restow_disch",
-        "hr_hatch_fwd_open","hr_hatch_mid_open","hr_hatch_aft_open",
-        "hr_hatch_fwd_close","hr_hatch_mid_close","hr_hatch_aft_close",
-        "first_lift","last_lift","hr_gearbox_total"
-    ]:
-        st.session_state[k] = 0
+    moves.HourRecord().to_session(st.session_state, HOUR_PREFIX, GEARBOX_KEY)
+    st.session_state["first_lift"] = st.session_state["last_lift"] = 0
     st.session_state["hourly_time_override"] = next_hour_label(st.session_state["hourly_time"])
     # do NOT touch cumulative; only clear the hourly inputs
-    st.success("Hourly inputs cleared and hour advanced.")
+    toast_later("Hourly inputs cleared and hour advanced.")
+
+@diag_fragment
+def hourly_send_panel():
+    """Send panel; the two buttons that change saved state refresh the whole page."""
+    st.subheader("📱 Send Hourly Report to WhatsApp")
+    st.text_input("Enter WhatsApp Number (with country code, e.g., 27761234567)", key="wa_num_hour")
+    st.text_input("Or enter WhatsApp Group Link (optional)", key="wa_grp_hour")
+
+    colA, colB, colC = st.columns([1,1,1])
+    with colA:
+        # the hour moved into cumulative, the 4h tracker and the totals below: full rerun
+        if st.button("✅ Generate Hourly Template & Update Totals", on_click=on_generate_hourly):
+            st.rerun()
+        if "hourly_text" in st.session_state:
+            st.code(st.session_state.pop("hourly_text"), language="text")
+
+    # removed preview button as requested (single generate button only)
+    with colC:
+        if st.button("📤 Open WhatsApp (Hourly)"):
+            txt = generate_hourly_template()
+            wa_text = f"```{txt}```"
+            if st.session_state.get("wa_num_hour"):
+                link = f"https://wa.me/{st.session_state['wa_num_hour']}?text={urllib.parse.quote(wa_text)}"
+                st.markdown(f"[Open WhatsApp]({link})", unsafe_allow_html=True)
+            elif st.session_state.get("wa_grp_hour"):
+                st.markdown(f"[Open WhatsApp Group]({st.session_state['wa_grp_hour']})", unsafe_allow_html=True)
+            else:
+                st.info("Enter a WhatsApp number or group link to send.")
+
+    if st.button("🔄 Reset Hourly Inputs (and advance hour)", on_click=reset_hourly_inputs):
+        st.rerun()
+    show_pending_toast()
+
+hourly_send_panel()
+
+# --------------------------
+# Backfill missed hours (CSV or sent hourly reports, one transaction)
+# --------------------------
+@diag_run
+def on_backfill(hours):
+    """Button callback: the whole batch goes into the ledger and cumulative in one commit."""
+    flush_settings()
+    state = report_core.ReportState(CALL_ID, cumulative, st.session_state["fourh"])
+    bumped = report_core.apply_hours(db, state, hours, plans=session_plans(), openings=session_openings())
+    for g, plan in bumped.items():
+        st.session_state[f"planned_{g}"] = plan
+    st.session_state["bf_text"] = ""
+    st.session_state["bf_upload"] += 1  # fresh uploader widget = cleared file
+    toast_later(f"Imported {len(hours)} hour(s).")
+
+init_key("bf_upload", 0)
+with st.expander("📥 Backfill missed hours (CSV or sent hourly reports)"):
+    st.caption("Paste hourly WhatsApp reports exactly as sent, or upload a CSV with a "
+               "date, hour and one column per move (missing move columns count as 0).")
+    st.download_button("⬇️ CSV template", backfill.template_csv(), file_name="backfill_template.csv",
+                       mime="text/csv")
+    upload = st.file_uploader("CSV or text file", type=["csv", "txt"], key=f"bf_file_{st.session_state['bf_upload']}")
+    st.text_area("…or paste reports / CSV here", key="bf_text", height=200)
+    bf_source = upload.getvalue().decode("utf-8-sig") if upload else st.session_state["bf_text"]
+    if bf_source.strip():
+        bf_hours, problems = backfill.parse(bf_source)
+        problems += backfill.check_batch(bf_hours, report_core.ledger_hours(db, CALL_ID))
+        if problems:
+            st.error("Nothing imported — fix these first:\n\n" + "\n".join(f"- {p}" for p in problems))
+        else:
+            bf_hours = backfill.in_order(bf_hours)
+            first, last = bf_hours[0], bf_hours[-1]
+            st.success(f"{len(bf_hours)} hour(s) ready: {first.report_date.strftime('%d/%m/%Y')} {first.hour_label[:5]}"
+                       f" → {last.report_date.strftime('%d/%m/%Y')} {last.hour_label[-5:]}")
+            st.button(f"📥 Import {len(bf_hours)} hour(s)", on_click=on_backfill, args=(bf_hours,))
 
-st.button("🔄 Reset Hourly Inputs (and advance hour)", on_click=reset_hourly_inputs)
+# --------------------------
+# Correct saved hours (edit / delete / undo; totals move by the difference only)
+# --------------------------
+def correction_state():
+    return report_core.ReportState(CALL_ID, cumulative, st.session_state["fourh"])
+
+def after_correction(bumped=None):
+    for g, plan in (bumped or {}).items():
+        st.session_state[f"planned_{g}"] = plan
+
+def load_entry_into_editor():
+    """on_change of the hour picker: copy the picked hour's saved values into the edit inputs."""
+    entry = st.session_state["ed_entries"].get(st.session_state.get("ed_pick"))
+    if entry is None:
+        return
+    st.session_state["ed_date"] = entry.hour.report_date
+    st.session_state["ed_hour"] = entry.hour.hour_label
+    moves.HourRecord.from_fields(entry.hour.moves, entry.hour.gearbox).to_session(st.session_state, "ed_", "ed_gearbox")
+
+@diag_run
+def on_undo_hour():
+    flush_settings()
+    last = report_core.undo_last_hour(db, correction_state())
+    after_correction()
+    if last is None:
+        st.toast("No saved hours to undo.")
+    else:
+        st.session_state["hourly_time_override"] = last.hour.hour_label
+        st.toast(f"Removed {last.hour.report_date.strftime('%d/%m/%Y')} {last.hour.hour_label}.")
+
+@diag_run
+def on_save_correction(hour_id):
+    flush_settings()
+    ss = st.session_state
+    entry = ss["ed_entries"][hour_id]
+    record = moves.HourRecord.from_session(ss, "ed_", "ed_gearbox")
+    hour = report_core.HourInput(ss["ed_hour"], ss["ed_date"], record.fields(),
+                                 record.gearbox, entry.hour.first_lift, entry.hour.last_lift)
+    after_correction(report_core.edit_hour(db, correction_state(), hour_id, hour))
+    st.toast("Hour corrected; totals updated.")
+
+@diag_run
+def on_delete_hour(hour_id):
+    flush_settings()
+    report_core.delete_hour(db, correction_state(), hour_id)
+    after_correction()
+    st.session_state.pop("ed_pick", None)
+    st.toast("Hour deleted; totals updated.")
+
+with st.expander("✏️ Correct saved hours (edit / delete / undo)"):
+    st.button("↩️ Undo last saved hour", on_click=on_undo_hour)
+    entries = {e.id: e for e in cached_ledger_entries(CALL_ID, db.generation())}
+    st.session_state["ed_entries"] = entries
+    if not entries:
+        st.caption("No hours saved for this call yet.")
+    else:
+        if st.session_state.get("ed_pick") not in entries:
+            st.session_state["ed_pick"] = next(iter(entries))
+            load_entry_into_editor()
+        st.selectbox("Saved hour (latest 24)", options=list(entries), key="ed_pick", on_change=load_entry_into_editor,
+                     format_func=lambda i: f"{entries[i].hour.report_date.strftime('%d/%m/%Y')} "
+                                           f"{entries[i].hour.hour_label} — {sum(entries[i].hour.row().values())} moves")
+        e1, e2, e3 = st.columns(3)
+        e1.date_input("Date", key="ed_date")
+        e2.selectbox("Hour", hour_range_list(), key="ed_hour")
+        e3.number_input("Gearbox", min_value=0, key="ed_gearbox")
+        cols = st.columns(4)
+        for i, f in enumerate(MOVE_FIELDS):
+            cols[i % 4].number_input(f.replace("_", " ").upper(), min_value=0, key=f"ed_{f}")
+        b1, b2 = st.columns(2)
+        b1.button("💾 Save correction", on_click=on_save_correction, args=(st.session_state["ed_pick"],))
+        b2.button("🗑️ Delete this hour", on_click=on_delete_hour, args=(st.session_state["ed_pick"],))
 
 # --------------------------
 # 4-Hourly Tracker & Report
@@ -636,219 +684,220 @@ st.button("🔄 Reset Hourly Inputs (and advance hour)", on_click=reset_hourly_i
 st.markdown("---")
 st.header("📊 4-Hourly Tracker & Report")
 
-# pick 4-hour block label
-block_opts = four_hour_blocks()
-if st.session_state["fourh_block"] not in block_opts:
-    st.session_state["fourh_block"] = block_opts[0]
-st.selectbox("Select 4-Hour Block", options=block_opts,
-             index=block_opts.index(st.session_state["fourh_block"]),
-             key="fourh_block")
-
 def computed_4h():
-    tr = st.session_state["fourh"]
-    return {
-        "fwd_load": sum_list(tr["fwd_load"]), "mid_load": sum_list(tr["mid_load"]), "aft_load": sum_list(tr["aft_load"]), "poop_load": sum_list(tr["poop_load"]),
-        "fwd_disch": sum_list(tr["fwd_disch"]), "mid_disch": sum_list(tr["mid_disch"]), "aft_disch": sum_list(tr["aft_disch"]), "poop_disch": sum_list(tr["poop_disch"]),
-        "fwd_restow_load": sum_list(tr["fwd_restow_load"]), "mid_restow_load": sum_list(tr["mid_restow_load"]), "aft_restow_load": sum_list(tr["aft_restow_load"]), "poop_restow_load": sum_list(tr["poop_restow_load"]),
-        "fwd_restow_disch": sum_list(tr["fwd_restow_disch"]), "mid_restow_disch": sum_list(tr["mid_restow_disch"]), "aft_restow_disch": sum_list(tr["aft_restow_disch"]), "poop_restow_disch": sum_list(tr["poop_restow_disch"]),
-        "hatch_fwd_open": sum_list(tr["hatch_fwd_open"]), "hatch_mid_open": sum_list(tr["hatch_mid_open"]), "hatch_aft_open": sum_list(tr["hatch_aft_open"]),
-        "hatch_fwd_close": sum_list(tr["hatch_fwd_close"]), "hatch_mid_close": sum_list(tr["hatch_mid_close"]), "hatch_aft_close": sum_list(tr["hatch_aft_close"]),
-    }
+    return moves.as_fields(moves.window_sum(st.session_state["fourh"]))
 
 def manual_4h():
-    ss = st.session_state
-    return {
-        "fwd_load": ss["m4h_fwd_load"], "mid_load": ss["m4h_mid_load"], "aft_load": ss["m4h_aft_load"], "poop_load": ss["m4h_poop_load"],
-        "fwd_disch": ss["m4h_fwd_disch"], "mid_disch": ss["m4h_mid_disch"], "aft_disch": ss["m4h_aft_disch"], "poop_disch": ss["m4h_poop_disch"],
-        "fwd_restow_load": ss["m4h_fwd_restow_load"], "mid_restow_load": ss["m4h_mid_restow_load"], "aft_restow_load": ss["m4h_aft_restow_load"], "poop_restow_load": ss["m4h_poop_restow_load"],
-        "fwd_restow_disch": ss["m4h_fwd_restow_disch"], "mid_restow_disch": ss["m4h_mid_restow_disch"], "aft_restow_disch": ss["m4h_aft_restow_disch"], "poop_restow_disch": ss["m4h_poop_restow_disch"],
-        "hatch_fwd_open": ss["m4h_hatch_fwd_open"], "hatch_mid_open": ss["m4h_hatch_mid_open"], "hatch_aft_open": ss["m4h_hatch_aft_open"],
-        "hatch_fwd_close": ss["m4h_hatch_fwd_close"], "hatch_mid_close": ss["m4h_hatch_mid_close"], "hatch_aft_close": ss["m4h_hatch_aft_close"],
-    }
-
-with st.expander("🧮 4-Hour Totals (auto-calculated)"):
-    calc = computed_4h()
+    return moves.HourRecord.from_session(st.session_state, MANUAL_4H_PREFIX).fields()
+
+def write_move_totals(mat):
+    """Position breakdown of a (4, 6) move matrix, one line per move type."""
+    calc = moves.as_fields(mat)
     st.write(f"**Crane Moves – Load:** FWD {calc['fwd_load']} | MID {calc['mid_load']} | AFT {calc['aft_load']} | POOP {calc['poop_load']}")
     st.write(f"**Crane Moves – Discharge:** FWD {calc['fwd_disch']} | MID {calc['mid_disch']} | AFT {calc['aft_disch']} | POOP {calc['poop_disch']}")
     st.write(f"**Restows – Load:** FWD {calc['fwd_restow_load']} | MID {calc['mid_restow_load']} | AFT {calc['aft_restow_load']} | POOP {calc['poop_restow_load']}")
     st.write(f"**Restows – Discharge:** FWD {calc['fwd_restow_disch']} | MID {calc['mid_restow_disch']} | AFT {calc['aft_restow_disch']} | POOP {calc['poop_restow_disch']}")
     st.write(f"**Hatch Open:** FWD {calc['hatch_fwd_open']} | MID {calc['hatch_mid_open']} | AFT {calc['hatch_aft_open']}")
     st.write(f"**Hatch Close:** FWD {calc['hatch_fwd_close']} | MID {calc['hatch_mid_close']} | AFT {calc['hatch_aft_close']}")
-    # WhatsApp_Report.py  — PART 5 / 5
-
-with st.expander("✏️ Manual Override 4-Hour Totals", expanded=False):
-    st.checkbox("Use manual totals instead of auto-calculated", key="fourh_manual_override")
-    c1, c2, c3, c4 = st.columns(4)
-    with c1:
-        st.number_input("FWD Load 4H", min_value=0, key="m4h_fwd_load")
-        st.number_input("FWD Disch 4H", min_value=0, key="m4h_fwd_disch")
-        st.number_input("FWD Rst Load 4H", min_value=0, key="m4h_fwd_restow_load")
-        st.number_input("FWD Rst Disch 4H", min_value=0, key="m4h_fwd_restow_disch")
-        st.number_input("FWD Hatch Open 4H", min_value=0, key="m4h_hatch_fwd_open")
-        st.number_input("FWD Hatch Close 4H", min_value=0, key="m4h_hatch_fwd_close")
-    with c2:
-        st.number_input("MID Load 4H", min_value=0, key="m4h_mid_load")
-        st.number_input("MID Disch 4H", min_value=0, key="m4h_mid_disch")
-        st.number_input("MID Rst Load 4H", min_value=0, key="m4h_mid_restow_load")
-        st.number_input("MID Rst Disch 4H", min_value=0, key="m4h_mid_restow_disch")
-        st.number_input("MID Hatch Open 4H", min_value=0, key="m4h_hatch_mid_open")
-        st.number_input("MID Hatch Close 4H", min_value=0, key="m4h_hatch_mid_close")
-    with c3:
-        st.number_input("AFT Load 4H", min_value=0, key="m4h_aft_load")
-        st.number_input("AFT Disch 4H", min_value=0, key="m4h_aft_disch")
-        st.number_input("AFT Rst Load 4H", min_value=0, key="m4h_aft_restow_load")
-        st.number_input("AFT Rst Disch 4H", min_value=0, key="m4h_aft_restow_disch")
-        st.number_input("AFT Hatch Open 4H", min_value=0, key="m4h_hatch_aft_open")
-        st.number_input("AFT Hatch Close 4H", min_value=0, key="m4h_hatch_aft_close")
-    with c4:
-        st.number_input("POOP Load 4H", min_value=0, key="m4h_poop_load")
-        st.number_input("POOP Disch 4H", min_value=0, key="m4h_poop_disch")
-        st.number_input("POOP Rst Load 4H", min_value=0, key="m4h_poop_restow_load")
-        st.number_input("POOP Rst Disch 4H", min_value=0, key="m4h_poop_restow_disch")
-
-# Populate manual 4H fields from computed 4H tracker
-if st.button("⏬ Populate 4-Hourly from Hourly Tracker"):
-    calc_vals = computed_4h()
-    # map computed values into manual 4h session keys
-    st.session_state["m4h_fwd_load"] = calc_vals["fwd_load"]
-    st.session_state["m4h_mid_load"] = calc_vals["mid_load"]
-    st.session_state["m4h_aft_load"] = calc_vals["aft_load"]
-    st.session_state["m4h_poop_load"] = calc_vals["poop_load"]
-
-    st.session_state["m4h_fwd_disch"] = calc_vals["fwd_disch"]
-    st.session_state["m4h_mid_disch"] = calc_vals["mid_disch"]
-    st.session_state["m4h_aft_disch"] = calc_vals["aft_disch"]
-    st.session_state["m4h_poop_disch"] = calc_vals["poop_disch"]
-
-    st.session_state["m4h_fwd_restow_load"] = calc_vals["fwd_restow_load"]
-    st.session_state["m4h_mid_restow_load"] = calc_vals["mid_restow_load"]
-    st.session_state["m4h_aft_restow_load"] = calc_vals["aft_restow_load"]
-    st.session_state["m4h_poop_restow_load"] = calc_vals["poop_restow_load"]
-
-    st.session_state["m4h_fwd_restow_disch"] = calc_vals["fwd_restow_disch"]
-    st.session_state["m4h_mid_restow_disch"] = calc_vals["mid_restow_disch"]
-    st.session_state["m4h_aft_restow_disch"] = calc_vals["aft_restow_disch"]
-    st.session_state["m4h_poop_restow_disch"] = calc_vals["poop_restow_disch"]
-
-    st.session_state["m4h_hatch_fwd_open"] = calc_vals["hatch_fwd_open"]
-    st.session_state["m4h_hatch_mid_open"] = calc_vals["hatch_mid_open"]
-    st.session_state["m4h_hatch_aft_open"] = calc_vals["hatch_aft_open"]
-
-    st.session_state["m4h_hatch_fwd_close"] = calc_vals["hatch_fwd_close"]
-    st.session_state["m4h_hatch_mid_close"] = calc_vals["hatch_mid_close"]
-    st.session_state["m4h_hatch_aft_close"] = calc_vals["hatch_aft_close"]
+    per_pos = mat[:, :4].sum(axis=1)  # load+disch+restows
+    st.write("**Container Moves per Position:** " + " | ".join(f"{p.upper()} {n}" for p, n in zip(moves.POSITIONS, per_pos)))
 
+# Populate manual 4H fields from computed 4H tracker (button callback, so the
+# manual inputs can still be written before they are drawn)
+def populate_4h_from_tracker():
+    moves.HourRecord(moves.window_sum(st.session_state["fourh"])).to_session(st.session_state, MANUAL_4H_PREFIX)
     # enable manual override so template will use these values
     st.session_state["fourh_manual_override"] = True
-    st.success("Manual 4-hour inputs populated from hourly tracker; manual override enabled.")
-
-vals4h = manual_4h() if st.session_state["fourh_manual_override"] else computed_4h()
-
-def generate_4h_template():
-    remaining_load  = int(st.session_state.get("planned_load", 0))  - cumulative["done_load"]
-    remaining_disch = int(st.session_state.get("planned_disch", 0)) - cumulative["done_disch"]
-    remaining_restow_load  = int(st.session_state.get("planned_restow_load", 0))  - cumulative["done_restow_load"]
-    remaining_restow_disch = int(st.session_state.get("planned_restow_disch", 0)) - cumulative["done_restow_disch"]
-
-    t = f"""\
-{st.session_state['vessel_name']}
-Berthed {st.session_state['berthed_date']}
-
-Date: {st.session_state['report_date'].strftime('%d/%m/%Y')}
-4-Hour Block: {st.session_state['fourh_block']}
-_________________________
-   *HOURLY MOVES*
-_________________________
-*Crane Moves*
-           Load    Discharge
-FWD       {vals4h['fwd_load']:>5}     {vals4h['fwd_disch']:>5}
-MID       {vals4h['mid_load']:>5}     {vals4h['mid_disch']:>5}
-AFT       {vals4h['aft_load']:>5}     {vals4h['aft_disch']:>5}
-POOP      {vals4h['poop_load']:>5}     {vals4h['poop_disch']:>5}
-_________________________
-*Restows*
-           Load    Discharge
-FWD       {vals4h['fwd_restow_load']:>5}     {vals4h['fwd_restow_disch']:>5}
-MID       {vals4h['mid_restow_load']:>5}     {vals4h['mid_restow_disch']:>5}
-AFT       {vals4h['aft_restow_load']:>5}     {vals4h['aft_restow_disch']:>5}
-POOP      {vals4h['poop_restow_load']:>5}     {vals4h['poop_restow_disch']:>5}
-_________________________
-      *CUMULATIVE* (from hourly saved entries)
-_________________________
-           Load   Disch
-Plan       {st.session_state['planned_load']:>5}      {st.session_state['planned_disch']:>5}
-Done       {cumulative['done_load']:>5}      {cumulative['done_disch']:>5}
-Remain     {remaining_load:>5}      {remaining_disch:>5}
-_________________________
-*Restows*
-           Load    Disch
-Plan       {st.session_state['planned_restow_load']:>5}      {st.session_state['planned_restow_disch']:>5}
-Done       {cumulative['done_restow_load']:>5}      {cumulative['done_restow_disch']:>5}
-Remain     {remaining_restow_load:>5}      {remaining_restow_disch:>5}
-_________________________
-*Hatch Moves*
-             Open         Close
-FWD          {vals4h['hatch_fwd_open']:>5}          {vals4h['hatch_fwd_close']:>5}
-MID          {vals4h['hatch_mid_open']:>5}          {vals4h['hatch_mid_close']:>5}
-AFT          {vals4h['hatch_aft_open']:>5}          {vals4h['hatch_aft_close']:>5}
-_________________________
-*Idle / Delays*
-"""
-    for i, idle in enumerate(st.session_state["idle_entries"]):
-        t += f"{i+1}. {idle['crane']} {idle['start']}-{idle['end']} : {idle['delay']}\n"
-    return t
-
-st.code(generate_4h_template(), language="text")
-
-st.subheader("📱 Send 4-Hourly Report to WhatsApp")
-st.text_input("Enter WhatsApp Number for 4H report (optional)", key="wa_num_4h")
-st.text_input("Or enter WhatsApp Group Link for 4H report (optional)", key="wa_grp_4h")
-
-cA, cB, cC = st.columns([1,1,1])
-with cA:
-    if st.button("👁️ Preview 4-Hourly Template Only"):
-        st.code(generate_4h_template(), language="text")
-with cB:
-    if st.button("📤 Open WhatsApp (4-Hourly)"):
-        t = generate_4h_template()
-        wa_text = f"```{t}```"
-        if st.session_state.get("wa_num_4h"):
-            link = f"https://wa.me/{st.session_state['wa_num_4h']}?text={urllib.parse.quote(wa_text)}"
-            st.markdown(f"[Open WhatsApp]({link})", unsafe_allow_html=True)
-        elif st.session_state.get("wa_grp_4h"):
-            st.markdown(f"[Open WhatsApp Group]({st.session_state['wa_grp_4h']})", unsafe_allow_html=True)
-        else:
-            st.info("Enter a WhatsApp number or group link to send.")
-with cC:
-    if st.button("🔄 Reset 4-Hourly Tracker (clear last 4 hours)"):
-        reset_4h_tracker()
-        st.success("4-hourly tracker reset.")
-
-# Master reset: clears DB meta and session_state then reinitializes defaults
-if st.button("🚨 MASTER RESET (clear ALL including cumulative)"):
-    # confirm
-    if st.confirm("Are you sure? This will clear all saved data including cumulative and hourly history."):
-        # wipe DB meta and tables
-        conn = sqlite3.connect(SAVE_DB)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM meta WHERE key='cumulative';")
-        cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cumulative', ?);",
-                    (json.dumps(DEFAULT_CUMULATIVE),))
-        cur.execute("DELETE FROM hourly;")
-        cur.execute("DELETE FROM fourh;")
-        conn.commit()
-        conn.close()
-        # re-load defaults into memory and session_state
-        cumulative.clear()
-        cumulative.update(DEFAULT_CUMULATIVE.copy())
-        save_cumulative_db(cumulative)
-        # re-init session keys to default
-        for k in ["vessel_name","berthed_date","planned_load","planned_disch",
-                  "planned_restow_load","planned_restow_disch","opening_load",
-                  "opening_disch","opening_restow_load","opening_restow_disch"]:
-            st.session_state[k] = cumulative.get(k, DEFAULT_CUMULATIVE[k])
-        reset_4h_tracker()
-        st.experimental_rerun()
+    toast_later("Manual 4-hour inputs populated from hourly tracker; manual override enabled.")
+
+@metrics.timed()
+def generate_4h_template(vals4h):
+    values = report_values(vals4h, block=st.session_state["fourh_block"])
+    return templates.FOUR_HOUR.render(values, st.session_state["idle_entries"])
+
+def on_reset_4h():
+    flush_settings()
+    reset_4h_tracker()
+    toast_later("4-hourly tracker reset.")
+
+@diag_fragment
+def fourh_panel():
+    """4-hour block, totals, manual override, template and send buttons."""
+    # pick 4-hour block label
+    block_opts = four_hour_blocks()
+    if st.session_state["fourh_block"] not in block_opts:
+        st.session_state["fourh_block"] = block_opts[0]
+    st.selectbox("Select 4-Hour Block", options=block_opts,
+                 index=block_opts.index(st.session_state["fourh_block"]),
+                 key="fourh_block")
+
+    with st.expander("🧮 4-Hour Totals (auto-calculated)"):
+        write_move_totals(moves.window_sum(st.session_state["fourh"]))
+        # WhatsApp_Report.py  — PART 5 / 5
+
+    with st.expander("✏️ Manual Override 4-Hour Totals", expanded=False):
+        st.checkbox("Use manual totals instead of auto-calculated", key="fourh_manual_override")
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            st.number_input("FWD Load 4H", min_value=0, key="m4h_fwd_load")
+            st.number_input("FWD Disch 4H", min_value=0, key="m4h_fwd_disch")
+            st.number_input("FWD Rst Load 4H", min_value=0, key="m4h_fwd_restow_load")
+            st.number_input("FWD Rst Disch 4H", min_value=0, key="m4h_fwd_restow_disch")
+            st.number_input("FWD Hatch Open 4H", min_value=0, key="m4h_hatch_fwd_open")
+            st.number_input("FWD Hatch Close 4H", min_value=0, key="m4h_hatch_fwd_close")
+        with c2:
+            st.number_input("MID Load 4H", min_value=0, key="m4h_mid_load")
+            st.number_input("MID Disch 4H", min_value=0, key="m4h_mid_disch")
+            st.number_input("MID Rst Load 4H", min_value=0, key="m4h_mid_restow_load")
+            st.number_input("MID Rst Disch 4H", min_value=0, key="m4h_mid_restow_disch")
+            st.number_input("MID Hatch Open 4H", min_value=0, key="m4h_hatch_mid_open")
+            st.number_input("MID Hatch Close 4H", min_value=0, key="m4h_hatch_mid_close")
+        with c3:
+            st.number_input("AFT Load 4H", min_value=0, key="m4h_aft_load")
+            st.number_input("AFT Disch 4H", min_value=0, key="m4h_aft_disch")
+            st.number_input("AFT Rst Load 4H", min_value=0, key="m4h_aft_restow_load")
+            st.number_input("AFT Rst Disch 4H", min_value=0, key="m4h_aft_restow_disch")
+            st.number_input("AFT Hatch Open 4H", min_value=0, key="m4h_hatch_aft_open")
+            st.number_input("AFT Hatch Close 4H", min_value=0, key="m4h_hatch_aft_close")
+        with c4:
+            st.number_input("POOP Load 4H", min_value=0, key="m4h_poop_load")
+            st.number_input("POOP Disch 4H", min_value=0, key="m4h_poop_disch")
+            st.number_input("POOP Rst Load 4H", min_value=0, key="m4h_poop_restow_load")
+            st.number_input("POOP Rst Disch 4H", min_value=0, key="m4h_poop_restow_disch")
+
+    st.button("⏬ Populate 4-Hourly from Hourly Tracker", on_click=populate_4h_from_tracker)
+
+    vals4h = manual_4h() if st.session_state["fourh_manual_override"] else computed_4h()
+    fourh_text = generate_4h_template(vals4h)
+    st.code(fourh_text, language="text")
+
+    st.subheader("📱 Send 4-Hourly Report to WhatsApp")
+    st.text_input("Enter WhatsApp Number for 4H report (optional)", key="wa_num_4h")
+    st.text_input("Or enter WhatsApp Group Link for 4H report (optional)", key="wa_grp_4h")
+
+    cA, cB, cC = st.columns([1,1,1])
+    with cA:
+        if st.button("👁️ Preview 4-Hourly Template Only"):
+            st.code(fourh_text, language="text")
+    with cB:
+        if st.button("📤 Open WhatsApp (4-Hourly)"):
+            wa_text = f"```{fourh_text}```"
+            if st.session_state.get("wa_num_4h"):
+                link = f"https://wa.me/{st.session_state['wa_num_4h']}?text={urllib.parse.quote(wa_text)}"
+                st.markdown(f"[Open WhatsApp]({link})", unsafe_allow_html=True)
+            elif st.session_state.get("wa_grp_4h"):
+                st.markdown(f"[Open WhatsApp Group]({st.session_state['wa_grp_4h']})", unsafe_allow_html=True)
+            else:
+                st.info("Enter a WhatsApp number or group link to send.")
+    with cC:
+        st.button("🔄 Reset 4-Hourly Tracker (clear last 4 hours)", on_click=on_reset_4h)
+    show_pending_toast()
+
+fourh_panel()
+
+# --------------------------
+# Shift / Day / Call totals (any window over this call's hourly ledger;
+# shift, day and whole-call read their summary row, rolling / custom use the series)
+# --------------------------
+st.markdown("---")
+st.header("📈 Shift & Day Totals")
+
+window = st.radio("Window", ["Rolling hours", "Shift", "Day", "Whole call", "Custom range"],
+                  horizontal=True, key="agg_window")
+if window == "Rolling hours":
+    n_hours = st.number_input("Last N hours", min_value=1, max_value=72, value=4, key="agg_hours")
+    mat, n = move_series(CALL_ID, "rolling", int(n_hours))
+    window_day, window_label = st.session_state["report_date"], f"Last {n_hours} hours"
+elif window == "Shift":
+    w1, w2 = st.columns(2)
+    with w1:
+        shift_day = st.date_input("Shift date", value=st.session_state["report_date"], key="agg_shift_date")
+    with w2:
+        shift_name = st.selectbox("Shift", list(aggregate.SHIFTS), key="agg_shift")
+    mat, n = cached_summary_window(CALL_ID, "shift", shift_day, shift_name, db.generation())
+    window_day, window_label = shift_day, shift_name
+elif window == "Day":
+    agg_day = st.date_input("Day", value=st.session_state["report_date"], key="agg_day")
+    mat, n = cached_summary_window(CALL_ID, "day", agg_day, None, db.generation())
+    window_day, window_label = agg_day, "Full day 00h00 - 24h00"
+elif window == "Whole call":
+    mat, n = cached_summary_window(CALL_ID, "call", None, None, db.generation())
+    window_day, window_label = st.session_state["report_date"], None
+else:
+    hours = hour_range_list()
+    w1, w2, w3, w4 = st.columns(4)
+    with w1:
+        from_day = st.date_input("From date", value=st.session_state["report_date"], key="agg_from_date")
+    with w2:
+        from_hour = st.selectbox("From hour", hours, key="agg_from_hour")
+    with w3:
+        to_day = st.date_input("To date", value=st.session_state["report_date"], key="agg_to_date")
+    with w4:
+        to_hour = st.selectbox("Up to and including", hours, index=len(hours) - 1, key="agg_to_hour")
+    mat, n = move_series(CALL_ID, "custom", from_day, hours.index(from_hour), to_day, hours.index(to_hour) + 1)
+    window_day = from_day
+    window_label = f"{from_day.strftime('%d/%m')} {from_hour[:5]} - {to_day.strftime('%d/%m')} {to_hour[-5:]}"
+
+latest = cached_latest_hour(CALL_ID, db.generation())
+if latest:
+    last_day, last_hour = latest
+    st.caption(f"{n} saved hour(s) in window • latest saved hour {last_day.strftime('%d/%m/%Y')} {hour_range_list()[last_hour]}")
+else:
+    st.caption("No hours saved for this call yet.")
+write_move_totals(mat)
+shift_values = report_values(moves.as_fields(mat), date=window_day.strftime("%d/%m/%Y"))
+if window_label is None:
+    st.code(templates.END_OF_CALL.render(dict(shift_values, hours=n)), language="text")
+else:
+    st.code(templates.SHIFT.render(dict(shift_values, window=window_label)), language="text")
+
+# --------------------------
+# Crane productivity (gross / net moves per crane hour)
+# --------------------------
+@st.cache_data(max_entries=8)
+def cached_productivity(call_ids, generation):
+    row_calls, mats = analytics.load_ledger(db, call_ids)
+    idle = analytics.idle_arrays(report_core.load_idle(db, call_ids))
+    return analytics.table(analytics.productivity(row_calls, mats, idle), dict(cached_calls(generation)))
+
+with st.expander("⚙️ Crane productivity (moves per crane hour)"):
+    all_calls = st.checkbox("All vessel calls (benchmark gangs across calls)", key="prod_all_calls")
+    prod_rows = cached_productivity(None if all_calls else (CALL_ID,), db.generation())
+    if prod_rows:
+        st.dataframe(prod_rows, hide_index=True)
+        st.caption("Gross = box moves / hours on the call of each working crane; net also takes out idle logged against "
+                   "that crane (FWD / MID / AFT / POOP in the crane name, otherwise vessel level only).")
+    else:
+        st.caption("No hours saved yet.")
+
+# Master reset: clears this call's DB rows and session keys, after a second (confirming) click
+def on_master_reset():
+    # wipe this call's partition only; other berths are untouched
+    autosave.flush()
+    report_core.reset_call(db, CALL_ID)
+    get_move_series.clear()
+    # re-init session keys from the (now default) stored state
+    load_call_into_session(CALL_ID)
+    st.session_state.pop("confirm_master_reset", None)
+
+if st.session_state.get("confirm_master_reset"):
+    st.warning("Are you sure? This will clear all saved data for this call including cumulative and hourly history.")
+    mr1, mr2 = st.columns(2)
+    mr1.button("🚨 Yes, clear everything for this call", on_click=on_master_reset)
+    if mr2.button("Cancel", key="cancel_master_reset"):
+        st.session_state.pop("confirm_master_reset", None)
+        st.rerun()
+elif st.button("🚨 MASTER RESET (clear ALL for this vessel call including cumulative)"):
+    st.session_state["confirm_master_reset"] = True
+    st.rerun()
+
+if DIAG:
+    with st.expander("🩺 Diagnostics (this rerun)", expanded=False):
+        if metrics.current() is not None:
+            st.code(metrics.format_run(metrics.current()), language="text")
+        for run in reversed(st.session_state.get("diag_runs", [])):
+            st.code(metrics.format_run(run), language="text")
+        st.caption(f"Metrics file: {metrics.metrics_path() or 'not set (REPORT_METRICS)'}")
 
 st.markdown("---")
 st.caption(
@@ -857,3 +906,5 @@ st.caption(
     "• Resets do not loop; they just clear values. "
     "• Hour advances automatically after generating hourly or when you reset hourly inputs."
     )
+
+metrics.end_run()
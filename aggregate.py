@@ -0,0 +1,152 @@
+# aggregate.py — window totals over the hourly ledger (rolling / shift / day / call / custom)
+import threading
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+
+import numpy as np
+
+import moves
+
+# shift name -> (start hour, length in hours); night shifts run into the next calendar day
+SHIFTS = {
+    "Day 06h00 - 14h00": (6, 8),
+    "Afternoon 14h00 - 22h00": (14, 8),
+    "Night 22h00 - 06h00": (22, 8),
+    "Day 06h00 - 18h00 (12h)": (6, 12),
+    "Night 18h00 - 06h00 (12h)": (18, 12),
+}
+
+def hour_key(day: date, start_hour: int) -> int:
+    """Absolute hour number, so windows are plain integer ranges."""
+    return day.toordinal() * 24 + start_hour
+
+def key_to_day_hour(key: int):
+    return date.fromordinal(key // 24), key % 24
+
+class MoveSeries:
+    """Ledger hours in time order with running (prefix) totals.
+
+    prefix[i] holds the sum of the first i hours, so any window is one bisect on the
+    sorted hour keys plus one subtraction: O(log n) per query. New hours normally land
+    at the end (O(1) amortised); an hour saved out of order only re-sums the tail.
+    Several hours with the same key (e.g. a re-entered hour) all count.
+
+    A corrected or deleted hour is folded in as a delta entry at the hour's key (the old
+    values negated, the new ones added), so the hour count is kept as its own prefix.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.prefix = np.zeros((1,) + moves.SHAPE, dtype=np.int64)
+        self.counts = np.zeros(1, dtype=np.int64)  # hours, as prefix totals like `prefix`
+        self.last_id = 0   # highest ledger id already folded in
+        self.last_change = 0  # highest hourly_changes seq already folded in
+        self.generation = None  # DB generation the series was last topped up at
+        self.reader = uuid.uuid4().hex  # how far it read the change journal is recorded under this id
+        self.reported = None    # (last_change, time) as last recorded
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Forget every hour (the series is then rebuilt from the ledger as it is now)."""
+        self.keys = []
+        self.prefix = np.zeros((1,) + moves.SHAPE, dtype=np.int64)
+        self.counts = np.zeros(1, dtype=np.int64)
+        self.last_id = self.last_change = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _grow(self, extra):
+        need = len(self.keys) + 1 + extra
+        if need > len(self.prefix):
+            grown = np.zeros((max(need, 2 * len(self.prefix)),) + moves.SHAPE, dtype=np.int64)
+            grown[:len(self.keys) + 1] = self.prefix[:len(self.keys) + 1]
+            self.prefix = grown
+            counts = np.zeros(len(grown), dtype=np.int64)
+            counts[:len(self.keys) + 1] = self.counts[:len(self.keys) + 1]
+            self.counts = counts
+
+    def add(self, key: int, mat, hours: int = 1):
+        self._grow(1)
+        n = len(self.keys)
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.prefix[n + 1] = self.prefix[n] + mat
+            self.counts[n + 1] = self.counts[n] + hours
+            return
+        i = bisect_right(self.keys, key)
+        insort(self.keys, key)
+        # shift the tail up one slot and add this hour into every later running total
+        self.prefix[i + 2:n + 2] = self.prefix[i + 1:n + 1] + mat
+        self.prefix[i + 1] = self.prefix[i] + mat
+        self.counts[i + 2:n + 2] = self.counts[i + 1:n + 1] + hours
+        self.counts[i + 1] = self.counts[i] + hours
+
+    def extend_rows(self, rows, fields):
+        """Fold in ledger rows (id, report_date ISO, hour_label, *fields) newer than last_id."""
+        rows = [r for r in rows if r[0] > self.last_id]
+        if not rows:
+            return
+        mats = moves.matrices_from_rows([r[3:] for r in rows], fields)
+        for r, mat in zip(rows, mats):
+            day = date.fromisoformat(r[1]) if r[1] else date.today()
+            self.add(hour_key(day, int(r[2][:2]) if r[2] else 0), mat)
+        self.last_id = max(r[0] for r in rows)
+
+    def apply_changes(self, changes, fields):
+        """Fold in hourly_changes rows (seq, hour_id, report_date ISO, hour_label, hours, *fields).
+
+        Only changes to hours already folded in count: a newer row is read as it is now.
+        """
+        changes = [c for c in changes if c[0] > self.last_change]
+        if not changes:
+            return
+        mats = moves.matrices_from_rows([c[5:] for c in changes], fields)
+        for c, mat in zip(changes, mats):
+            if c[1] <= self.last_id:
+                day = date.fromisoformat(c[2]) if c[2] else date.today()
+                self.add(hour_key(day, int(c[3][:2]) if c[3] else 0), mat, c[4])
+        self.last_change = max(c[0] for c in changes)
+
+    # ---------- queries: each returns a (4, 6) matrix plus the number of hours ----------
+    def range_sum(self, start_key: int, end_key: int):
+        """Totals for hours with start_key <= key < end_key."""
+        i = bisect_left(self.keys, start_key)
+        j = bisect_left(self.keys, end_key)
+        return self.prefix[j] - self.prefix[i], int(self.counts[j] - self.counts[i])
+
+    def latest_key(self):
+        """Key of the latest hour still saved (a deleted hour leaves its key with no hours)."""
+        i = len(self.keys)
+        while i:
+            key = self.keys[i - 1]
+            j = bisect_left(self.keys, key)
+            if self.counts[i] - self.counts[j] > 0:
+                return key
+            i = j
+        return None
+
+    def rolling(self, hours: int):
+        """Last `hours` clock hours up to and including the latest saved hour."""
+        latest = self.latest_key()
+        if latest is None:
+            return self.prefix[0].copy(), 0
+        return self.range_sum(latest + 1 - hours, latest + 1)
+
+    def shift(self, day: date, shift_name: str):
+        start, length = SHIFTS[shift_name]
+        k = hour_key(day, start)
+        return self.range_sum(k, k + length)
+
+    def day(self, day: date):
+        k = hour_key(day, 0)
+        return self.range_sum(k, k + 24)
+
+    def call(self):
+        n = len(self.keys)
+        return self.prefix[n].copy(), int(self.counts[n])
+
+    def custom(self, start_day: date, start_hour: int, end_day: date, end_hour: int):
+        """Inclusive of the start hour, exclusive of the end hour."""
+        return self.range_sum(hour_key(start_day, start_hour), hour_key(end_day, end_hour))
@@ -0,0 +1,121 @@
+# analytics.py — crane productivity: gross / net moves per crane hour, vectorised over calls
+#
+# Crane hours = every ledger hour of the call, for each position that made any box move in
+#               the call (the crane is allocated to the vessel whether or not it is stopped).
+# Gross rate  = box moves / crane hours.
+# Net rate    = box moves / (crane hours - idle hours logged against that crane), with the
+#               crane's overlapping delays counted once (see idle.py).
+# Idle lines whose crane names no position ("Crane 3") only count at vessel level.
+import re
+
+import numpy as np
+
+import moves
+from idle import IdleIndex
+
+FIELDS = list(moves.FIELD_INDEX)
+# load, disch, restow load, restow disch: hatch covers are not box moves
+BOX_TYPES = slice(0, 4)
+POSITION_LABELS = [p.upper() for p in moves.POSITIONS]
+_POSITION_WORDS = {"fwd": 0, "forward": 0, "mid": 1, "aft": 2, "poop": 3}
+
+# --------------------------
+# Inputs
+# --------------------------
+def crane_position(crane):
+    """Position index named in a crane label ('FWD', 'Aft crane'), or -1."""
+    for word in re.findall(r"[a-z]+", str(crane or "").lower()):
+        if word in _POSITION_WORDS:
+            return _POSITION_WORDS[word]
+    return -1
+
+def idle_arrays(index: IdleIndex):
+    """(calls, positions, minutes) from an idle index, each crane's overlapping delays merged."""
+    calls, cranes, minutes = index.per_crane()
+    positions = np.array([crane_position(c) for c in cranes], dtype=np.int64)
+    return calls, positions, minutes.astype(np.float64)
+
+def load_ledger(db, call_ids=None):
+    """Every ledger hour of the given calls (all calls by default) -> (row_calls (n,), mats (n, 4, 6))."""
+    sql = f"SELECT call_id, {', '.join(FIELDS)} FROM hourly"
+    params = ()
+    if call_ids is not None:
+        call_ids = list(call_ids)
+        sql += f" WHERE call_id IN ({', '.join('?' * len(call_ids))})"
+        params = call_ids
+    rows = db.query(sql + ";", params)
+    if not rows:
+        return np.zeros(0, dtype=np.int64), moves.matrices_from_rows([], FIELDS)
+    arr = np.asarray(rows, dtype=np.int64)
+    return arr[:, 0], moves.matrices_from_rows(arr[:, 1:], FIELDS)
+
+def from_records(records, call_id=0):
+    """JSON-app hourly_records -> (row_calls, mats); missing fields count as 0."""
+    rows = [[int(r.get(f, 0) or 0) for f in FIELDS] for r in records]
+    return np.full(len(rows), call_id, dtype=np.int64), moves.matrices_from_rows(rows, FIELDS)
+
+# --------------------------
+# KPIs
+# --------------------------
+def _rate(moves_done, hours):
+    out = np.zeros_like(moves_done, dtype=np.float64)
+    np.divide(moves_done, hours, out=out, where=hours > 0)
+    return out
+
+def productivity(row_calls, mats, idle=None):
+    """Per-call KPIs; every result is an array with one row per call (ordered like `calls`).
+
+    row_calls / mats as from load_ledger(); idle as from idle_arrays(). Idle for calls with
+    no ledger hours is ignored.
+    """
+    calls, idx = np.unique(row_calls, return_inverse=True)
+    k = len(calls)
+    box = mats[:, :, BOX_TYPES].sum(axis=2)                      # (n, 4) box moves per position
+    moves_done = np.stack([np.bincount(idx, weights=box[:, p], minlength=k) for p in range(4)], axis=1)
+    hours = np.bincount(idx, minlength=k).astype(np.float64)
+    # stopped hours stay in crane hours: idle is only taken out once, for the net rate
+    crane_hours = np.where(moves_done > 0, hours[:, None], 0.0)
+
+    idle_hours = np.zeros((k, 5))                                # 4 positions + unassigned
+    if idle is not None and len(idle[0]):
+        idle_calls, idle_pos, idle_mins = idle
+        at = np.searchsorted(calls, idle_calls)
+        known = (at < k) & (calls[np.minimum(at, k - 1)] == idle_calls) if k else np.zeros(len(idle_calls), bool)
+        np.add.at(idle_hours, (at[known], np.where(idle_pos[known] < 0, 4, idle_pos[known])), idle_mins[known] / 60)
+
+    net_hours = np.maximum(crane_hours - idle_hours[:, :4], 0)
+    vessel_moves = moves_done.sum(axis=1)
+    vessel_crane_hours = crane_hours.sum(axis=1)
+    return {
+        "calls": calls,
+        "hours": hours,
+        "moves": moves_done,
+        "crane_hours": crane_hours,
+        "idle_hours": idle_hours[:, :4],
+        "idle_unassigned_hours": idle_hours[:, 4],
+        "gross": _rate(moves_done, crane_hours),
+        "net": _rate(moves_done, net_hours),
+        "vessel_moves": vessel_moves,
+        "vessel_per_hour": _rate(vessel_moves, hours),
+        "vessel_gross": _rate(vessel_moves, vessel_crane_hours),
+        "vessel_net": _rate(vessel_moves, np.maximum(vessel_crane_hours - idle_hours.sum(axis=1), 0)),
+    }
+
+def table(kpis, names=None):
+    """Flat rows for display: one per position plus a VESSEL row for each call."""
+    names = names or {}
+    rows = []
+    for i, call_id in enumerate(kpis["calls"]):
+        call = {"call": int(call_id), "vessel": names.get(int(call_id), "")}
+        for p, label in enumerate(POSITION_LABELS):
+            rows.append(dict(call, position=label, moves=int(kpis["moves"][i, p]),
+                             crane_hours=int(kpis["crane_hours"][i, p]),
+                             idle_hours=round(float(kpis["idle_hours"][i, p]), 2),
+                             gross_mph=round(float(kpis["gross"][i, p]), 1),
+                             net_mph=round(float(kpis["net"][i, p]), 1)))
+        rows.append(dict(call, position="VESSEL", moves=int(kpis["vessel_moves"][i]),
+                         crane_hours=int(kpis["crane_hours"][i].sum()),
+                         idle_hours=round(float(kpis["idle_hours"][i].sum() + kpis["idle_unassigned_hours"][i]), 2),
+                         gross_mph=round(float(kpis["vessel_gross"][i]), 1),
+                         net_mph=round(float(kpis["vessel_net"][i]), 1)))
+    return rows
@@ -0,0 +1,131 @@
+# backfill.py — parse missed hours from CSV or sent hourly WhatsApp text, checked as a batch
+#
+# Both parsers return (hours, problems): every row is checked and every problem reported, so
+# nothing is written until the whole batch is clean. report_core.apply_hours() then inserts
+# the batch in one transaction.
+import csv
+import io
+import re
+from datetime import date, datetime
+
+import chatlog
+from report_core import MOVE_FIELDS, HourInput, check_hour
+
+CSV_EXTRA = ["date", "hour", "gearbox", "first_lift", "last_lift"]
+CSV_HEADER = ["date", "hour"] + MOVE_FIELDS + ["gearbox", "first_lift", "last_lift"]
+
+def parse_date(text):
+    """YYYY-MM-DD or the report's DD/MM/YYYY."""
+    text = text.strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"bad date {text!r} (use YYYY-MM-DD or DD/MM/YYYY)")
+
+def parse_hour(text):
+    """'06h00 - 07h00', or just the start hour ('6', '06', '06h00'); labels are checked by report_core."""
+    text = text.strip()
+    m = re.fullmatch(r"(\d{1,2})(?:h00)?", text)
+    label = f"{int(m.group(1)):02d}h00 - {(int(m.group(1)) + 1) % 24:02d}h00" if m and int(m.group(1)) < 24 else text
+    check_hour(HourInput(label, None))
+    return label
+
+def _count(text, name):
+    text = (text or "").strip()
+    if not text:
+        return 0
+    if not text.isdigit():
+        raise ValueError(f"{name} must be a whole number >= 0, got {text!r}")
+    return int(text)
+
+def parse_csv(text):
+    """Header row required; move columns left out count as 0. See CSV_HEADER for the full set."""
+    reader = csv.DictReader(io.StringIO(text.lstrip("﻿")))
+    cols = [c.strip().lower() for c in reader.fieldnames or []]
+    reader.fieldnames = cols
+    problems = []
+    unknown = [c for c in cols if c not in MOVE_FIELDS and c not in CSV_EXTRA]
+    missing = [c for c in ("date", "hour") if c not in cols]
+    if unknown:
+        problems.append(f"unknown column(s): {', '.join(unknown)}")
+    if missing:
+        problems.append(f"missing column(s): {', '.join(missing)}")
+    if problems:
+        return [], problems
+    hours = []
+    for line_no, rec in enumerate(reader, start=2):
+        if not any((v or "").strip() for v in rec.values()):
+            continue
+        try:
+            hour = HourInput(
+                hour_label=parse_hour(rec["hour"] or ""),
+                report_date=parse_date(rec["date"] or ""),
+                moves={f: _count(rec.get(f), f) for f in MOVE_FIELDS if f in rec},
+                gearbox=_count(rec.get("gearbox"), "gearbox"),
+                first_lift=(rec.get("first_lift") or "").strip(),
+                last_lift=(rec.get("last_lift") or "").strip(),
+            )
+            check_hour(hour)
+            hours.append(hour)
+        except ValueError as e:  # report_core.InvalidHour included
+            problems.append(f"line {line_no}: {e}")
+    return hours, problems
+
+# --------------------------
+# Sent hourly template text (templates.HOURLY layout, read with the chatlog grammar)
+# --------------------------
+def parse_report_text(text):
+    """Hourly reports pasted one after another, as sent (``` fences are ignored).
+
+    Only the hour's own blocks are used (date, hour, lifts, crane moves, restows, gearbox,
+    hatch moves); the cumulative block is recomputed from the ledger on import.
+    """
+    hours, problems = [], []
+    for rep, problem in chatlog.iter_chat_reports(text.splitlines()):
+        if problem:
+            problems.append(problem)
+        elif rep.kind != "hourly":
+            problems.append(f"line {rep.line}: 4-hour report {rep.label} (backfill takes hourly reports)")
+        else:
+            hour = rep.hour_input()
+            try:
+                check_hour(hour)
+            except ValueError as e:
+                problems.append(f"line {rep.line}: {e}")
+            else:
+                hours.append(hour)
+    if not hours and not problems:
+        problems.append("no 'Hour:' lines found")
+    return hours, problems
+
+# --------------------------
+# Batch checks
+# --------------------------
+def check_batch(hours, already_saved=frozenset()):
+    """Problems across the batch: an hour twice, or an hour the ledger already has."""
+    problems, seen = [], set()
+    for h in hours:
+        key = (h.report_date.isoformat(), h.hour_label)
+        when = f"{h.report_date.strftime('%d/%m/%Y')} {h.hour_label}"
+        if key in seen:
+            problems.append(f"{when} appears more than once")
+        elif key in already_saved:
+            problems.append(f"{when} is already saved for this call")
+        seen.add(key)
+    return problems
+
+def in_order(hours):
+    """Oldest first, so the 4-hour tracker sees the hours as they happened."""
+    return sorted(hours, key=lambda h: (h.report_date, int(h.hour_label[:2])))
+
+def parse(text):
+    """CSV if the first line is a header with a 'date' column, report text otherwise."""
+    first = next((l for l in text.splitlines() if l.strip()), "")
+    if "," in first and "date" in [c.strip().lower().lstrip("﻿") for c in first.split(",")]:
+        return parse_csv(text)
+    return parse_report_text(text)
+
+def template_csv():
+    return ",".join(CSV_HEADER) + "\n" + f"{date.today().isoformat()},06h00 - 07h00" + ",0" * (len(MOVE_FIELDS) + 1) + ",,\n"
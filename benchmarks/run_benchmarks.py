@@ -0,0 +1,237 @@
+# run_benchmarks.py — time the hourly / 4-hourly pipeline on synthetic multi-week vessel calls
+#
+#   python benchmarks/run_benchmarks.py                      # 3 vessels x 3 weeks, check thresholds
+#   python benchmarks/run_benchmarks.py --weeks 6 --out results.json
+#   python benchmarks/run_benchmarks.py --update-thresholds  # re-baseline (3x headroom)
+#
+# Writes one JSON document (stdout or --out) and exits 1 if any mean exceeds its threshold.
+# Thresholds are multiples of a fixed pure-Python workload timed in the same run ("baseline"),
+# so they hold on a faster or slower machine.
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import analytics  # noqa: E402
+import idle  # noqa: E402
+import moves  # noqa: E402
+import report_core  # noqa: E402
+from record_store import RecordStore  # noqa: E402
+
+THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+HEADROOM = 3.0
+BASELINE = "baseline"
+BLOCKS = ["06h00 - 10h00", "10h00 - 14h00", "14h00 - 18h00", "18h00 - 22h00", "22h00 - 02h00", "02h00 - 06h00"]
+IDLE_REASONS = ["Awaiting cargo", "Windbound", "Crane break down", "Stevedore tea time/shift change"]
+
+# --------------------------
+# Synthetic data
+# --------------------------
+def hour_label(h):
+    return f"{h:02d}h00 - {(h + 1) % 24:02d}h00"
+
+def synthetic_hours(rng, n_hours, start=date(2025, 8, 1)):
+    """Consecutive hours from 06h00 on `start`, with realistic-ish crane rates."""
+    t = datetime(start.year, start.month, start.day, 6)
+    for _ in range(n_hours):
+        mv = {f: rng.randint(0, 30) if f.endswith(("_load", "_disch")) and "restow" not in f else rng.randint(0, 3)
+              for f in report_core.MOVE_FIELDS}
+        yield report_core.HourInput(hour_label(t.hour), t.date(), mv, rng.randint(0, 4), "06h10", "06h55")
+        t += timedelta(hours=1)
+
+def synthetic_idle(rng, n):
+    out = []
+    for _ in range(n):
+        h, m = rng.randint(0, 23), rng.randint(0, 50)
+        out.append({"crane": f"Crane {rng.randint(1, 4)}", "start": f"{h:02d}h{m:02d}",
+                    "end": f"{h:02d}h{m + rng.randint(1, 9):02d}", "delay": rng.choice(IDLE_REASONS)})
+    return out
+
+def json_record(hour, ts):
+    rec = {"date": hour.report_date.isoformat(), "start_hour": int(hour.hour_label[:2]),
+           "hour_label": hour.hour_label, **hour.row(), "used_in_4h": False, "ts": ts}
+    return rec
+
+# --------------------------
+# Timing
+# --------------------------
+class Timer:
+    def __init__(self):
+        self.samples = {}
+
+    def time(self, name, fn, *args, **kwargs):
+        t0 = time.perf_counter_ns()
+        out = fn(*args, **kwargs)
+        self.samples.setdefault(name, []).append(time.perf_counter_ns() - t0)
+        return out
+
+    def summary(self):
+        out = {}
+        for name, ns in self.samples.items():
+            ns_sorted = sorted(ns)
+            out[name] = {
+                "n": len(ns),
+                "total_s": round(sum(ns) / 1e9, 6),
+                "mean_us": round(statistics.fmean(ns) / 1e3, 3),
+                "min_us": round(ns_sorted[0] / 1e3, 3),
+                "median_us": round(ns_sorted[len(ns) // 2] / 1e3, 3),
+                "p95_us": round(ns_sorted[min(len(ns) - 1, int(len(ns) * 0.95))] / 1e3, 3),
+            }
+        return out
+
+# --------------------------
+# Benchmarks
+# --------------------------
+def baseline_work():
+    return sum(i * i for i in range(5000))
+
+def bench_baseline(timer, n=200):
+    for _ in range(20):
+        baseline_work()  # warm up
+    for _ in range(n):
+        timer.time(BASELINE, baseline_work)
+
+def bench_sqlite_app(timer, rng, workdir, vessels, n_hours, idle):
+    """WhatsApp_Report.py paths through report_core: apply, 4h tracker, windows, templates."""
+    db = report_core.open_db(os.path.join(workdir, "bench.db"))
+    for v in range(vessels):
+        call_id = report_core.create_call(db, f"SYNTH VESSEL {v}", "01/08/2025 @ 06h00")
+        state = report_core.load_state(db, call_id)
+        state.cumulative.update({f"planned_{g}": 10 ** 6 for g in report_core.PLAN_GROUPS})
+        state.idle = idle
+        scratch = moves.empty_ring(4)  # apply_hour already pushed the hour into state.fourh
+        for i, hour in enumerate(synthetic_hours(rng, n_hours)):
+            timer.time("apply_hour", report_core.apply_hour, db, state, hour)
+            timer.time("add_hour_to_4h", moves.push_hour, scratch,
+                       moves.matrix_from(list(hour.row().values()), report_core.MOVE_FIELDS))
+            timer.time("computed_4h", lambda: moves.as_fields(moves.window_sum(state.fourh)))
+            timer.time("render_hourly", report_core.render_hourly, state, hour)
+            if i % 4 == 3:
+                timer.time("render_4h", report_core.render_4h, state, BLOCKS[(i // 4) % 6], hour.report_date)
+        timer.time("render_hourly_unchanged", report_core.render_hourly, state, hour)
+        timer.time("load_state", report_core.load_state, db, call_id)
+        series = timer.time("load_series", report_core.load_series, db, call_id)
+        days = sorted({hour.report_date for hour in synthetic_hours(random.Random(0), n_hours)})
+        for d in days:
+            timer.time("window_shift", report_core.compute_window, series, "shift", day=d, shift="Day 06h00 - 14h00")
+            timer.time("window_day", report_core.compute_window, series, "day", day=d)
+            timer.time("window_rolling_12h", report_core.compute_window, series, "rolling", hours=12)
+        timer.time("window_call", report_core.compute_window, series, "call")
+        for d in days:
+            timer.time("summary_shift", report_core.summary_window, db, call_id, "shift", day=d, shift="Day 06h00 - 14h00")
+            timer.time("summary_day", report_core.summary_window, db, call_id, "day", day=d)
+        timer.time("summary_call", report_core.summary_window, db, call_id, "call")
+    timer.time("productivity_all_calls", lambda: analytics.productivity(*analytics.load_ledger(db)))
+    db.close()
+
+def bench_idle(timer, rng, n_events, n_hours):
+    """Idle rollups over one long call's delays (stored intervals, overlaps merged)."""
+    days = [date(2025, 8, 1) + timedelta(days=d) for d in range(max(1, n_hours // 24))]
+    entries = [dict(e, date=rng.choice(days).isoformat()) for e in synthetic_idle(rng, n_events)]
+    index = timer.time("idle_index_build", idle.IdleIndex.from_entries, entries)
+    for _ in range(5):
+        timer.time("idle_by_crane", index.by_crane)
+        timer.time("idle_by_reason", index.by_reason)
+        timer.time("idle_by_shift", index.by_shift, "Day 06h00 - 14h00")
+
+def bench_json_app(timer, rng, workdir, vessels, n_hours, idle):
+    """whatsapp_report.py paths: save_data (log appends), block matcher, replay and cached load."""
+    for v in range(vessels):
+        path = os.path.join(workdir, f"call_{v}.jsonl")
+        store = RecordStore(path)
+        data = store.load()
+        store.update({"vessel_name": f"SYNTH VESSEL {v}", "planned_load": 10 ** 6})
+        for i, hour in enumerate(synthetic_hours(rng, n_hours)):
+            rec = json_record(hour, f"{v}-{i}")
+            add = {f"done_{g}": sum(rec[f] for f in fields) for g, fields in report_core.DONE_FIELDS.items()}
+            timer.time("save_data_hourly", store.append, "hourly_records", rec,
+                       values={"hourly_last_saved": hour.hour_label}, add=add)
+        for i, entry in enumerate(idle):
+            timer.time("save_data_idle", store.append, "idle_logs", dict(entry, ts=f"idle-{i}"))
+        days = sorted({r["date"] for r in data["hourly_records"]})
+        for d in days:
+            for block in BLOCKS:
+                timer.time("block_match", store.match_block, d, block, include_used=False)
+        timer.time("store_load_replay", RecordStore(path).load)
+        timer.time("store_load_cached", store.load)
+
+# --------------------------
+# Main
+# --------------------------
+def ratios(results):
+    """Each mean as a multiple of the baseline's fastest run (the least noisy figure)."""
+    base = results[BASELINE]["min_us"]
+    return {name: round(r["mean_us"] / base, 4) for name, r in results.items() if name != BASELINE}
+
+def check(results, thresholds):
+    regressions = []
+    got = ratios(results)
+    for name, limit in thresholds.items():
+        if name in got and got[name] > limit["max_ratio"]:
+            regressions.append({"bench": name, "mean_us": results[name]["mean_us"], "ratio": got[name],
+                                "max_ratio": limit["max_ratio"]})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the report pipeline on synthetic vessel calls.")
+    parser.add_argument("--vessels", type=int, default=3)
+    parser.add_argument("--weeks", type=float, default=3)
+    parser.add_argument("--idle", type=int, default=500, help="idle entries per vessel")
+    parser.add_argument("--report-idle", type=int, default=8, help="idle lines on each report")
+    parser.add_argument("--idle-events", type=int, default=5000, help="delays in the idle rollup bench")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON here instead of stdout")
+    parser.add_argument("--thresholds", default=THRESHOLDS)
+    parser.add_argument("--update-thresholds", action="store_true",
+                        help=f"rewrite the thresholds file as {HEADROOM:g}x this run's ratios to the baseline")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    n_hours = int(args.weeks * 7 * 24)
+    timer = Timer()
+    bench_baseline(timer)
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_sqlite_app(timer, rng, workdir, args.vessels, n_hours, synthetic_idle(rng, args.report_idle))
+        bench_json_app(timer, rng, workdir, args.vessels, n_hours, synthetic_idle(rng, args.idle))
+    bench_idle(timer, rng, args.idle_events, n_hours)
+    results = timer.summary()
+
+    if args.update_thresholds:
+        thresholds = {k: {"max_ratio": float(f"{v * HEADROOM:.3g}")} for k, v in sorted(ratios(results).items())}
+        with open(args.thresholds, "w") as f:
+            json.dump(thresholds, f, indent=2)
+            f.write("\n")
+    try:
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    except FileNotFoundError:
+        thresholds = {}
+    regressions = check(results, thresholds)
+
+    doc = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "vessels": args.vessels, "hours_per_vessel": n_hours, "idle_per_vessel": args.idle,
+                 "seed": args.seed, "run_at": datetime.now().isoformat(timespec="seconds")},
+        "results": results,
+        "ratios": ratios(results),
+        "regressions": regressions,
+    }
+    text = json.dumps(doc, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+# chatlog.py — stream hourly / 4-hour reports back out of exported WhatsApp chats
+#
+#   python report_cli.py import-chat "WhatsApp Chat with Berth 5.txt"
+#
+# A chat export is read one line at a time and one message at a time, so a multi-year export
+# never sits in memory. Every report line is classified by one compiled regex (LINE below).
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import idle
+import report_core
+from report_core import MOVE_FIELDS
+
+# --------------------------
+# Grammar
+# --------------------------
+# WhatsApp export prefixes: Android "14/08/2025, 07:01 - Name: text",
+# iOS "[14/08/2025, 07:01:22] Name: text". Anything else continues the previous message.
+MESSAGE = re.compile(
+    r"^‎?(?:\[(?P<ios_date>\d{1,2}/\d{1,2}/\d{2,4}),\s(?P<ios_time>[\d:]+(?:\s?[APap][Mm])?)\]"
+    r"|(?P<date>\d{1,2}/\d{1,2}/\d{2,4}),\s(?P<time>[\d:]+(?:\s?[APap][Mm])?)\s-)"
+    r"\s(?P<sender>[^:]+):\s(?P<text>.*)$"
+)
+
+# report line kinds, tried in this order by one alternation; lastgroup names the match
+_LINE_KINDS = [
+    ("sep",      r"_{5,}"),
+    ("berthed",  r"Berthed (?P<berth>.*)"),
+    ("date",     r"Date: (?P<day>\d{2}/\d{2}/\d{4})"),
+    ("hour",     r"Hour: (?P<hr>\d{2}h00 - \d{2}h00)"),
+    ("block",    r"4-Hour Block: (?P<blk>\S.*)"),
+    ("lifts",    r"\*First Lift:\*\s*(?P<first>.*?)\s+\*Last Lift:\*\s*(?P<last>.*)"),
+    ("grid",     r"(?P<pos>FWD|MID|AFT|POOP)\s+(?P<a>\d+)\s+(?P<b>\d+)"),
+    ("plan",     r"(?P<row>Plan|Done|Remain)\s+(?P<pa>-?\d+)\s+(?P<pb>-?\d+)"),
+    ("gearbox",  r"Total Gearboxes \(hour\): (?P<gb>\d+)"),
+    ("idle",     r"(?P<n>\d+)\. (?P<crane>.+?) (?P<start>\S+)-(?P<end>\S+) : (?P<delay>.*)"),
+    ("heading",  r"\*(?P<head>[^*]+)\*.*"),
+    ("columns",  r"(?:Load|Open)\s+(?:Discharge|Disch|Close)"),
+]
+# each kind's group encloses its fields, so it closes last and m.lastgroup is the line kind
+LINE = re.compile("|".join(f"(?P<{kind}>{pat})" for kind, pat in _LINE_KINDS))
+
+# section heading -> section; "*Restows*" right after the crane moves is the hour's restows,
+# the second one sits under *CUMULATIVE*
+HEADINGS = {
+    "Crane Moves": "moves",
+    "Restows": "restows",
+    "Hatch Moves": "hatch",
+    "Gearbox": None,
+    "Idle / Delays": "idle",
+    "CUMULATIVE": "cum",
+    "HOURLY MOVES": None,
+    "SHIFT MOVES": None,
+    "CALL TOTAL MOVES": None,
+}
+GRID_FIELDS = {
+    "moves": ("{p}_load", "{p}_disch"),
+    "restows": ("{p}_restow_load", "{p}_restow_disch"),
+    "hatch": ("hatch_{p}_open", "hatch_{p}_close"),
+}
+PLAN_PREFIX = {"Plan": "planned", "Done": "done", "Remain": "remain"}
+
+@dataclass
+class Report:
+    """One hourly or 4-hour report as sent."""
+    kind: str = ""            # "hourly" or "4h" once the Hour / 4-Hour Block line is seen
+    label: str = ""           # hour label or block label
+    vessel_name: str = ""
+    berthed_date: str = ""
+    report_date: Optional[date] = None
+    first_lift: str = ""
+    last_lift: str = ""
+    moves: Dict[str, int] = field(default_factory=dict)
+    gearbox: int = 0
+    cumulative: Dict[str, int] = field(default_factory=dict)  # planned_/done_/remain_<group>
+    idle: List[dict] = field(default_factory=list)
+    sent_at: str = ""
+    sender: str = ""
+    line: int = 0             # first line of the report in the input
+    sections: set = field(default_factory=set)
+
+    def problem(self):
+        """Why this report cannot be stored, or None."""
+        where = f"line {self.line}"
+        if not self.kind:
+            return f"{where}: report without an 'Hour:' or '4-Hour Block:' line"
+        if self.report_date is None:
+            return f"{where}: {self.label} has no 'Date:' line"
+        if "moves" not in self.sections:
+            return f"{where}: {self.label} has no *Crane Moves* block"
+        return None
+
+    def hour_input(self) -> report_core.HourInput:
+        return report_core.HourInput(self.label, self.report_date, self.moves, self.gearbox,
+                                     self.first_lift, self.last_lift)
+
+# --------------------------
+# Parsing
+# --------------------------
+def parse_reports(lines: Iterable[str], start_line: int = 1, sent_at: str = "", sender: str = ""):
+    """Reports in a run of text lines (one message, or reports pasted back to back).
+
+    Yields (report, problem) pairs; problem is None for a report that can be stored.
+    A new report starts at each "Berthed" line (the vessel name is the line above it),
+    or at an Hour / 4-Hour Block line when the current report already has one.
+    """
+    rep, section, prev = None, None, ""
+    for line_no, raw in enumerate(lines, start=start_line):
+        text = raw.strip().strip("`").strip()
+        m = LINE.fullmatch(text)
+        kind = m.lastgroup if m else None
+        if kind == "berthed" or (kind in ("hour", "block") and (rep is None or rep.kind)):
+            if rep is not None:
+                yield rep, rep.problem()
+            rep = Report(sent_at=sent_at, sender=sender, line=line_no)
+            section = None
+            if kind == "berthed":
+                rep.vessel_name, rep.berthed_date = prev, m.group("berth").strip()
+        if text:
+            prev = text
+        if rep is None or kind is None:
+            continue
+        if kind == "date":
+            rep.report_date = datetime.strptime(m.group("day"), "%d/%m/%Y").date()
+        elif kind == "hour":
+            rep.kind, rep.label = "hourly", m.group("hr")
+        elif kind == "block":
+            rep.kind, rep.label = "4h", m.group("blk").strip()
+        elif kind == "lifts":
+            rep.first_lift, rep.last_lift = m.group("first"), m.group("last")
+        elif kind == "heading":
+            name = m.group("head").strip()
+            if name == "Restows" and section != "moves":
+                section = "cum_restows" if section == "cum" else None
+            else:
+                section = HEADINGS.get(name)
+        elif kind == "grid" and section in GRID_FIELDS:
+            pos = m.group("pos").lower()
+            if section == "hatch" and pos == "poop":
+                continue
+            fa, fb = GRID_FIELDS[section]
+            rep.moves[fa.format(p=pos)] = int(m.group("a"))
+            rep.moves[fb.format(p=pos)] = int(m.group("b"))
+            rep.sections.add(section)
+        elif kind == "plan" and section in ("cum", "cum_restows"):
+            ga, gb = ("load", "disch") if section == "cum" else ("restow_load", "restow_disch")
+            prefix = PLAN_PREFIX[m.group("row")]
+            rep.cumulative[f"{prefix}_{ga}"] = int(m.group("pa"))
+            rep.cumulative[f"{prefix}_{gb}"] = int(m.group("pb"))
+        elif kind == "gearbox":
+            rep.gearbox = int(m.group("gb"))
+        elif kind == "idle" and section == "idle":
+            rep.idle.append({"crane": m.group("crane"), "start": m.group("start"),
+                             "end": m.group("end"), "delay": m.group("delay")})
+    if rep is not None:
+        yield rep, rep.problem()
+
+def iter_messages(lines: Iterable[str]):
+    """(first line number, sent_at, sender, message lines) per chat message, streamed."""
+    start, sent_at, sender, body = 0, "", "", []
+    for line_no, raw in enumerate(lines, start=1):
+        line = raw.rstrip("\r\n")
+        m = MESSAGE.match(line)
+        if m:
+            if body:
+                yield start, sent_at, sender, body
+            d, t = (m.group("ios_date"), m.group("ios_time")) if m.group("ios_date") else (m.group("date"), m.group("time"))
+            start, sent_at, sender, body = line_no, f"{d} {t}", m.group("sender").strip(), [m.group("text")]
+        elif body or line.strip():
+            body.append(line)
+            start = start or line_no
+    if body:
+        yield start, sent_at, sender, body
+
+def iter_chat_reports(lines: Iterable[str]) -> Iterator:
+    """(report, problem) for every report in a chat export (or in plain pasted text)."""
+    for start, sent_at, sender, body in iter_messages(lines):
+        yield from parse_reports(body, start, sent_at, sender)
+
+# --------------------------
+# Loading into the store
+# --------------------------
+def _call_index(db):
+    """(vessel name, berthed) -> call id for the calls already in the DB."""
+    index = {}
+    for call_id, _ in report_core.list_calls(db):
+        cum = report_core.load_cumulative(db, call_id)
+        index.setdefault((cum.get("vessel_name", ""), cum.get("berthed_date", "")), call_id)
+    return index
+
+def _saved_blocks(db, call_id):
+    return set(db.query("SELECT report_date, block_label FROM fourh WHERE call_id = ?;",
+                        (call_id,)))
+
+def import_reports(db, reports: Iterable, batch_size: int = 2000, dry_run: bool = False):
+    """Store parsed reports: hourly ones become ledger rows, 4-hour ones fourh rows.
+
+    Calls are matched on (vessel name, berthed) and created when missing. Hours / blocks a
+    call already has are skipped, so re-importing the same export is harmless. Writes go in
+    one transaction per batch. Each touched call's plans, and any done moves the imported
+    hours do not cover (e.g. opening balances), are taken from its latest report.
+    Returns counts plus the problems of reports that could not be stored.
+    """
+    stats = {"hourly": 0, "4h": 0, "skipped": 0, "calls_created": 0, "problems": []}
+    calls = _call_index(db)
+    saved_hours, saved_blocks, latest = {}, {}, {}
+    hourly_rows, fourh_rows, idle_rows = [], [], []
+    stamp = datetime.now(report_core.TZ).isoformat()
+
+    def flush():
+        if dry_run or not (hourly_rows or fourh_rows or idle_rows):
+            hourly_rows.clear()
+            fourh_rows.clear()
+            idle_rows.clear()
+            return
+        cols = ["call_id", "hour_label", "timestamp", "report_date"] + MOVE_FIELDS + ["gearbox", "first_lift", "last_lift"]
+        with db.transaction() as cur:
+            cur.executemany(f"INSERT INTO hourly ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))});",
+                            hourly_rows)
+            cur.executemany(f"INSERT INTO fourh ({', '.join(report_core.FOURH_COLUMNS)}) "
+                            f"VALUES ({', '.join('?' * len(report_core.FOURH_COLUMNS))});", fourh_rows)
+            # the same delay is repeated on every report until it scrolls off: stored once
+            cur.executemany("INSERT OR IGNORE INTO idle (call_id, crane, reason, start_at, end_at) "
+                            "VALUES (?, ?, ?, ?, ?);", idle_rows)
+        hourly_rows.clear()
+        fourh_rows.clear()
+        idle_rows.clear()
+
+    for rep, problem in reports:
+        if problem:
+            stats["problems"].append(problem)
+            continue
+        if rep.kind == "hourly":
+            hour = rep.hour_input()
+            try:
+                report_core.check_hour(hour)  # the same checks as every other ledger write
+            except report_core.InvalidHour as e:
+                stats["problems"].append(f"line {rep.line}: {e}")
+                continue
+        key = (rep.vessel_name, rep.berthed_date)
+        if key not in calls:
+            calls[key] = -len(calls) - 1 if dry_run else report_core.create_call(db, *key)
+            stats["calls_created"] += 1
+        call_id = calls[key]
+        day = rep.report_date.isoformat()
+        if rep.kind == "hourly":
+            if call_id not in saved_hours:
+                saved_hours[call_id] = report_core.ledger_hours(db, call_id) if call_id > 0 else set()
+            seen = saved_hours[call_id]
+            if (day, rep.label) in seen:
+                stats["skipped"] += 1
+                continue
+            seen.add((day, rep.label))
+            row = hour.row()
+            hourly_rows.append([call_id, rep.label, rep.sent_at or stamp, day] + [row[f] for f in MOVE_FIELDS]
+                               + [rep.gearbox, rep.first_lift, rep.last_lift])
+        else:
+            if call_id not in saved_blocks:
+                saved_blocks[call_id] = _saved_blocks(db, call_id) if call_id > 0 else set()
+            seen = saved_blocks[call_id]
+            if (day, rep.label) in seen:
+                stats["skipped"] += 1
+                continue
+            seen.add((day, rep.label))
+            fourh_rows.append(report_core.fourh_row(call_id, rep.label, rep.sent_at or stamp, day, rep.moves,
+                                                    rep.cumulative, {"sent_at": rep.sent_at, "sender": rep.sender,
+                                                                     "idle": rep.idle}))
+        stats[rep.kind] += 1
+        for e in rep.idle:
+            span = idle.interval(rep.report_date, e["start"], e["end"])
+            if span is not None:
+                idle_rows.append((call_id, e["crane"].strip(), e["delay"].strip(), *span))
+        if rep.cumulative:
+            latest[call_id] = rep.cumulative
+        if len(hourly_rows) + len(fourh_rows) >= batch_size:
+            flush()
+    flush()
+    if not dry_run:
+        for call_id, snap in latest.items():
+            _sync_cumulative(db, call_id, snap)
+    return stats
+
+def _sync_cumulative(db, call_id, snap):
+    """Plans from the latest report; done moves missing from the ledger become carried_*."""
+    with db.transaction() as cur:
+        cum = report_core.load_cumulative(db, call_id)
+        cum[report_core.FORECAST_KEY] = report_core.forecast_state(cur, call_id)
+        for g in report_core.PLAN_GROUPS:
+            if f"planned_{g}" in snap:
+                cum[f"planned_{g}"] = snap[f"planned_{g}"]
+            if f"done_{g}" in snap:
+                missing = snap[f"done_{g}"] - cum[f"done_{g}"]
+                if missing > 0:
+                    cum[f"carried_{g}"] = int(cum.get(f"carried_{g}", 0)) + missing
+                    cum[f"done_{g}"] += missing
+        # opening balances are already inside the reported done totals
+        cum["_openings_applied"] = True
+        report_core.save_cumulative(db, cum, call_id)
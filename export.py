@@ -0,0 +1,113 @@
+# export.py — chunked CSV / JSON-lines / Parquet export of record lists to a temp file
+import csv
+import json
+import os
+import tempfile
+from itertools import islice
+
+CHUNK_ROWS = 5000
+
+# label -> (file suffix, mime type)
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "JSON lines": (".jsonl", "application/x-ndjson"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+def available_formats():
+    """Parquet is offered only when pyarrow is installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return [f for f in FORMATS if f != "Parquet"]
+    return list(FORMATS)
+
+def chunks(records, size=None):
+    it, size = iter(records), size or CHUNK_ROWS
+    while True:
+        block = list(islice(it, size))
+        if not block:
+            return
+        yield block
+
+def columns_of(records):
+    """Union of keys in first-seen order (records from older versions may lack fields)."""
+    cols = {}
+    for rec in records:
+        for k in rec:
+            cols.setdefault(k, None)
+    return list(cols)
+
+def write_csv(records, fh, columns):
+    writer = csv.DictWriter(fh, fieldnames=columns, restval="", extrasaction="ignore")
+    writer.writeheader()
+    for block in chunks(records):
+        writer.writerows(block)
+
+def write_jsonl(records, fh):
+    for block in chunks(records):
+        fh.write("".join(json.dumps(rec, separators=(",", ":")) + "\n" for rec in block))
+
+def _arrow_schema(records, columns):
+    """One type per column from a scan of the values; mixed columns fall back to string."""
+    import pyarrow as pa
+    kinds = {c: set() for c in columns}
+    for rec in records:
+        for c in columns:
+            v = rec.get(c)
+            if v is not None:
+                kinds[c].add(bool if isinstance(v, bool) else type(v))
+    def arrow_type(ks):
+        if ks == {bool}:
+            return pa.bool_()
+        if ks and ks <= {int}:
+            return pa.int64()
+        if ks and ks <= {int, float}:
+            return pa.float64()
+        return pa.string()
+    return pa.schema([(c, arrow_type(kinds[c])) for c in columns])
+
+def write_parquet(records, path, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _arrow_schema(records, columns)
+    as_text = [f.name for f in schema if pa.types.is_string(f.type)]
+    with pq.ParquetWriter(path, schema) as writer:
+        for block in chunks(records):
+            cols = {c: [r.get(c) for r in block] for c in columns}
+            for c in as_text:
+                cols[c] = [None if v is None else (v if isinstance(v, str) else json.dumps(v)) for v in cols[c]]
+            writer.write_table(pa.table(cols, schema=schema))
+
+def export_records(records, fmt):
+    """Write `records` to a temp file in fixed-size chunks; returns its path (caller removes it).
+
+    Only one chunk of rows is materialised at a time, so the export adds no full-history
+    copy (no DataFrame, no in-memory CSV string) on top of the records themselves.
+    """
+    suffix, _ = FORMATS[fmt]
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    columns = columns_of(records)
+    if fmt == "Parquet":
+        write_parquet(records, path, columns)
+    else:
+        with open(path, "w", newline="") as fh:
+            if fmt == "CSV":
+                write_csv(records, fh, columns)
+            else:
+                write_jsonl(records, fh)
+    return path
+
+def export_json(data):
+    """Full data as indented JSON, encoded piecewise straight into a temp file."""
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w") as fh:
+        json.dump(data, fh, indent=2)
+    return path
+
+def open_once(path):
+    """Open a finished export for reading and unlink it: the file goes once the reader closes it."""
+    fh = open(path, "rb")
+    os.remove(path)
+    return fh
@@ -0,0 +1,88 @@
+# forecast.py — estimated time of completion (ETC) from recent hourly move rates
+#
+# Each position's box moves per hour are tracked as an exponentially weighted moving
+# average (EWMA), together with the EWMA variance of the vessel's hourly total. Adding an
+# hour is O(1); the state is a small dict kept in the call's meta (cumulative["forecast"]).
+# Hours lost to idle simply come through as slow hours, so recent delays pull the rate down.
+import math
+from datetime import datetime, timedelta
+
+import aggregate
+
+ALPHA = 0.2      # weight of the newest hour: the last ~9 hours carry 85% of the estimate
+Z = 1.28         # band half-width in standard deviations (~80% band)
+MIN_HOURS = 3    # no estimate from fewer saved hours
+TAIL = 48        # hours read back when the state is rebuilt (older ones weigh < 0.01%)
+POSITIONS = 4
+
+def empty():
+    return {"rate": [0.0] * POSITIONS, "var": 0.0, "hours": 0, "last": None}
+
+def update(state, key, box_moves):
+    """Fold in one hour (aggregate.hour_key, box moves per position) in time order."""
+    total = float(sum(box_moves))
+    if not state["hours"]:
+        state["rate"] = [float(x) for x in box_moves]
+        state["var"] = 0.0
+    else:
+        diff = total - sum(state["rate"])
+        state["var"] = (1 - ALPHA) * (state["var"] + ALPHA * diff * diff)
+        state["rate"] = [r + ALPHA * (x - r) for r, x in zip(state["rate"], box_moves)]
+    state["hours"] += 1
+    state["last"] = key
+    return state
+
+def rebuild(hours):
+    """State from (key, box moves per position) pairs, oldest first."""
+    state = empty()
+    for key, box_moves in hours:
+        update(state, key, box_moves)
+    return state
+
+def estimate(state, remaining):
+    """ETC for `remaining` box moves, or None when there is too little history to say.
+
+    The finish is counted from the end of the latest saved hour. The band assumes hourly
+    totals vary independently around the rate: over h hours the spread is Z * sd / sqrt(h)
+    on the rate. `latest` is None when the slow end of the band has no positive rate.
+    """
+    if not state or state.get("hours", 0) < MIN_HOURS or state.get("last") is None:
+        return None
+    day, hour = aggregate.key_to_day_hour(state["last"])
+    start = datetime(day.year, day.month, day.day, hour) + timedelta(hours=1)
+    rate = sum(state["rate"])
+    if remaining <= 0:
+        return {"remaining": 0, "rate": rate, "hours": 0.0, "etc": start, "earliest": start, "latest": start}
+    if rate <= 0:
+        return None
+    hours = remaining / rate
+    spread = Z * math.sqrt(state["var"]) / math.sqrt(max(hours, 1.0))
+    slow = rate - spread
+    return {
+        "remaining": remaining,
+        "rate": rate,
+        "hours": hours,
+        "etc": start + timedelta(hours=hours),
+        "earliest": start + timedelta(hours=remaining / (rate + spread)),
+        "latest": start + timedelta(hours=remaining / slow) if slow > 0 else None,
+    }
+
+def _stamp(when):
+    return when.strftime("%d/%m %Hh%M")
+
+def etc_text(est, min_hours=MIN_HOURS):
+    """Template line value."""
+    if est is None:
+        return f"n/a (needs {min_hours}+ saved hours and a recent move rate)"
+    if not est["remaining"]:
+        return "plan complete"
+    band = f"{_stamp(est['earliest'])} - {_stamp(est['latest'])}" if est["latest"] else f"from {_stamp(est['earliest'])}"
+    return f"{_stamp(est['etc'])} ({band}) @ {est['rate']:.0f} moves/h"
+
+def as_json(est):
+    """API form: ISO timestamps, rates rounded."""
+    if est is None:
+        return None
+    return {"remaining": est["remaining"], "rate_per_hour": round(est["rate"], 2), "hours": round(est["hours"], 2),
+            "etc": est["etc"].isoformat(timespec="minutes"), "earliest": est["earliest"].isoformat(timespec="minutes"),
+            "latest": est["latest"].isoformat(timespec="minutes") if est["latest"] else None}
@@ -0,0 +1,160 @@
+# idle.py — idle / delay intervals: times parsed once, overlaps merged per crane, swept totals
+#
+# An interval is [start, end) in absolute minutes (day ordinal * 1440 + clock minutes), so
+# delays past midnight and across report days compare as plain integers. Rollups merge each
+# crane's overlapping delays first (two lines for the same stoppage count once), then sum.
+import re
+from datetime import date
+
+import numpy as np
+
+import aggregate
+
+DAY = 24 * 60
+_TIME = re.compile(r"^\s*(\d{1,2})\s*[h:.]?\s*(\d{2})\s*$", re.IGNORECASE)
+
+def clock_minutes(text):
+    """'12h30', '12:30' or '1230' -> minutes after midnight; None if unreadable."""
+    m = _TIME.match(str(text or ""))
+    if not m or int(m.group(1)) > 23 or int(m.group(2)) > 59:
+        return None
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+def idle_minutes(start, end):
+    """Length of one idle line in minutes (an end before the start runs past midnight)."""
+    s, e = clock_minutes(start), clock_minutes(end)
+    if s is None or e is None:
+        return None
+    return (e - s) % DAY
+
+def interval(day: date, start, end):
+    """(start, end) absolute minutes for an idle line reported on `day`; None if unreadable."""
+    s, length = clock_minutes(start), idle_minutes(start, end)
+    if s is None or length is None:
+        return None
+    at = day.toordinal() * DAY + s
+    return at, at + length
+
+# --------------------------
+# Sweeps over sorted arrays
+# --------------------------
+def merge(keys, starts, ends):
+    """Union of the intervals of each key: sort by (key, start), then one pass that starts a
+    new run wherever a start is past every earlier end of that key. Returns merged arrays."""
+    keys, starts, ends = (np.asarray(a, dtype=np.int64) for a in (keys, starts, ends))
+    if not len(keys):
+        return keys, starts, ends
+    order = np.lexsort((starts, keys))
+    k, s, e = keys[order], starts[order], ends[order]
+    base = s.min()
+    span = e.max() - base + 1
+    group = np.concatenate([[0], np.cumsum(k[1:] != k[:-1])])
+    # running max of ends within each key: offset keys apart so one accumulate does them all
+    run_end = np.maximum.accumulate(e - base + group * span) - group * span + base
+    new = np.ones(len(k), dtype=bool)
+    new[1:] = (k[1:] != k[:-1]) | (s[1:] > run_end[:-1])
+    first = np.flatnonzero(new)
+    return k[first], s[first], np.maximum.reduceat(e, first)
+
+def covered(starts, ends, t):
+    """Minutes of [starts, ends) lying before each time in t (overlaps count once per interval)."""
+    s, e = np.sort(starts), np.sort(ends)
+    cs = np.concatenate([[0], np.cumsum(s)])
+    ce = np.concatenate([[0], np.cumsum(e)])
+    t = np.asarray(t, dtype=np.int64)
+    i = np.searchsorted(s, t, side="right")
+    j = np.searchsorted(e, t, side="right")
+    return (t * i - cs[i]) - (t * j - ce[j])
+
+def _codes(*columns):
+    """One int code per row for the combination of the given columns."""
+    code = np.zeros(len(columns[0]), dtype=np.int64)
+    for col in columns:
+        values, inverse = np.unique(col, return_inverse=True)
+        code = code * len(values) + inverse
+    return code
+
+class IdleIndex:
+    """Idle lines of one or more calls, parsed once into parallel arrays.
+
+    Built from the idle table (report_core.load_idle) or from entry dicts; every rollup is
+    a merge + sum over the arrays, so thousands of delays stay cheap.
+    """
+
+    def __init__(self, rows):
+        """rows: (call_id, crane, reason, start, end) with absolute-minute start / end."""
+        rows = list(rows)
+        self.calls = np.array([r[0] for r in rows], dtype=np.int64)
+        self.cranes = np.array([str(r[1] or "") for r in rows], dtype=object)
+        self.reasons = np.array([str(r[2] or "") for r in rows], dtype=object)
+        self.starts = np.array([r[3] for r in rows], dtype=np.int64)
+        self.ends = np.array([r[4] for r in rows], dtype=np.int64)
+
+    @classmethod
+    def from_entries(cls, entries, day=None, call_id=0):
+        """Entry dicts as the apps keep them (crane, start, end, delay / reason, optional date)."""
+        rows = []
+        for e in entries:
+            on = date.fromisoformat(e["date"]) if e.get("date") else (day or date.today())
+            span = interval(on, e.get("start"), e.get("end"))
+            if span is not None:
+                rows.append((call_id, e.get("crane"), e.get("delay") or e.get("reason"), *span))
+        return cls(rows)
+
+    def __len__(self):
+        return len(self.calls)
+
+    def _merged(self, *columns):
+        """Merged intervals per combination of columns (always within one call and crane)."""
+        code = _codes(self.calls, self.cranes, *columns)
+        keys, starts, ends = merge(code, self.starts, self.ends)
+        uniq, first = np.unique(code, return_index=True)
+        return first[np.searchsorted(uniq, keys)], starts, ends  # a source row for each run's labels
+
+    @staticmethod
+    def _sum_by(labels, minutes):
+        values, inverse = np.unique(labels, return_inverse=True)
+        sums = np.bincount(inverse, weights=minutes, minlength=len(values))
+        return {v: int(m) for v, m in zip(values.tolist(), sums)}
+
+    def per_crane(self):
+        """(calls, cranes, minutes): merged downtime of each crane of each call."""
+        if not len(self):
+            return self.calls, self.cranes, np.zeros(0, dtype=np.int64)
+        rows, starts, ends = self._merged()
+        code = _codes(self.calls[rows], self.cranes[rows])
+        uniq, first, inverse = np.unique(code, return_index=True, return_inverse=True)
+        minutes = np.bincount(inverse, weights=ends - starts, minlength=len(uniq)).astype(np.int64)
+        return self.calls[rows][first], self.cranes[rows][first], minutes
+
+    def by_crane(self):
+        """{crane: minutes}, overlapping lines of one crane counted once."""
+        if not len(self):
+            return {}
+        rows, starts, ends = self._merged()
+        return self._sum_by(self.cranes[rows], ends - starts)
+
+    def by_reason(self):
+        """{reason: crane-minutes}; overlaps merged per crane and reason."""
+        if not len(self):
+            return {}
+        rows, starts, ends = self._merged(self.reasons)
+        return self._sum_by(self.reasons[rows], ends - starts)
+
+    def by_call(self):
+        """{call_id: crane-minutes}."""
+        if not len(self):
+            return {}
+        rows, starts, ends = self._merged()
+        return self._sum_by(self.calls[rows].tolist(), ends - starts)
+
+    def by_shift(self, shift_name):
+        """{day the shift started: crane-minutes} for one of aggregate.SHIFTS."""
+        if not len(self):
+            return {}
+        _, starts, ends = self._merged()
+        start_hour, length = aggregate.SHIFTS[shift_name]
+        first_day, last_day = starts.min() // DAY - 1, ends.max() // DAY
+        w_start = np.arange(first_day, last_day + 1) * DAY + start_hour * 60
+        minutes = covered(starts, ends, w_start + length * 60) - covered(starts, ends, w_start)
+        return {date.fromordinal(int(s // DAY)): int(m) for s, m in zip(w_start, minutes) if m}
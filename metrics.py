@@ -0,0 +1,140 @@
+# metrics.py — opt-in per-run timing spans, written as JSON lines or Prometheus text
+#
+# Off unless enabled: set REPORT_METRICS=<file> (".prom" -> Prometheus textfile, anything else
+# -> one JSON line per run), or open the app with ?diag=1 to see the spans of each rerun.
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+METRICS_ENV = "REPORT_METRICS"
+
+_current = contextvars.ContextVar("report_metrics_run", default=None)
+_totals = {}  # span name -> [count, seconds], for the Prometheus file
+_totals_lock = threading.Lock()
+
+class Run:
+    """Spans recorded during one script run (or one fragment rerun)."""
+
+    def __init__(self, label, path):
+        self.label = label
+        self.path = path
+        self.spans = []  # (name, depth, seconds)
+        self.depth = 0
+        self.start = time.perf_counter()
+        self.end = None
+
+    def total(self):
+        return (self.end or time.perf_counter()) - self.start
+
+def format_run(run):
+    """Indented text table of a run's spans, in completion order."""
+    lines = [f"{secs * 1e3:9.2f} ms  {'  ' * depth}{name}" for name, depth, secs in run.spans]
+    return "\n".join(lines + [f"{run.total() * 1e3:9.2f} ms  total ({run.label})"])
+
+def metrics_path():
+    return os.environ.get(METRICS_ENV) or None
+
+def current():
+    return _current.get()
+
+def begin_run(label, force=False):
+    """Start recording this run when a metrics file is configured (or `force`, e.g. ?diag=1).
+
+    Any run left open by an interrupted rerun (st.rerun, an exception) is flushed first.
+    """
+    stale = _current.get()
+    if stale is not None:
+        end_run(stale)
+    path = metrics_path()
+    if not (path or force):
+        return None
+    run = Run(label, path)
+    _current.set(run)
+    return run
+
+def end_run(run=None):
+    run = run or _current.get()
+    if run is None:
+        return
+    run.end = run.end or time.perf_counter()
+    if _current.get() is run:
+        _current.set(None)
+    if run.path:
+        _write(run)
+
+@contextmanager
+def span(name):
+    run = _current.get()
+    if run is None:
+        yield
+        return
+    run.depth += 1
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        run.depth -= 1
+        run.spans.append((name, run.depth, time.perf_counter() - t0))
+
+@contextmanager
+def run_or_span(label, force=False):
+    """A span inside a full run; its own run when a fragment reruns on its own (yields that run)."""
+    if _current.get() is not None:
+        with span(label):
+            yield None
+        return
+    run = begin_run(label, force)
+    try:
+        yield run
+    finally:
+        end_run(run)
+
+def timed(name=None):
+    """Decorator: record each call as a span; a plain call when nothing is recording."""
+    def deco(fn):
+        label = name or fn.__name__
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+# --------------------------
+# Output
+# --------------------------
+def _write(run):
+    total = run.total()
+    with _totals_lock:
+        for name, _, secs in run.spans + [(f"run:{run.label}", 0, total)]:
+            t = _totals.setdefault(name, [0, 0.0])
+            t[0] += 1
+            t[1] += secs
+        if run.path.endswith(".prom"):
+            _write_prometheus(run.path)
+            return
+        line = {"ts": datetime.now().isoformat(timespec="milliseconds"), "run": run.label,
+                "total_ms": round(total * 1e3, 3),
+                "spans": [{"name": n, "depth": d, "ms": round(s * 1e3, 3)} for n, d, s in run.spans]}
+        with open(run.path, "a") as f:
+            f.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+def _write_prometheus(path):
+    """Whole-file rewrite (node_exporter textfile collector style); caller holds _totals_lock."""
+    lines = ["# HELP report_span_seconds Time spent in instrumented report code since the process started.",
+             "# TYPE report_span_seconds summary"]
+    for name, (count, secs) in sorted(_totals.items()):
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'report_span_seconds_sum{{span="{label}"}} {secs:.6f}')
+        lines.append(f'report_span_seconds_count{{span="{label}"}} {count}')
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
@@ -0,0 +1,158 @@
+# moves.py — fixed-shape move matrices (position × move type)
+import numpy as np
+
+POSITIONS = ["fwd", "mid", "aft", "poop"]
+MOVE_TYPES = ["load", "disch", "restow_load", "restow_disch", "hatch_open", "hatch_close"]
+SHAPE = (len(POSITIONS), len(MOVE_TYPES))
+
+# flat field name used by session keys / ledger columns -> (position, move type) cell.
+# POOP has no hatch covers, so those two cells always stay 0.
+FIELD_INDEX = {}
+for _p, _pos in enumerate(POSITIONS):
+    for _m, _mt in enumerate(MOVE_TYPES):
+        if _mt.startswith("hatch_"):
+            if _pos != "poop":
+                FIELD_INDEX[f"hatch_{_pos}_{_mt[len('hatch_'):]}"] = (_p, _m)
+        else:
+            FIELD_INDEX[f"{_pos}_{_mt}"] = (_p, _m)
+
+def field_cells(fields):
+    """Index arrays (positions, move types) for a list of field names, for fancy indexing."""
+    cells = np.array([FIELD_INDEX[f] for f in fields])
+    return cells[:, 0], cells[:, 1]
+
+def matrix_from(values, fields):
+    """One hour as a (4, 6) int32 matrix from values listed in `fields` order."""
+    mat = np.zeros(SHAPE, dtype=np.int32)
+    mat[field_cells(fields)] = values
+    return mat
+
+def matrices_from_rows(rows, fields):
+    """Many hours (e.g. ledger rows) as one (n, 4, 6) array."""
+    out = np.zeros((len(rows),) + SHAPE, dtype=np.int32)
+    if len(rows):
+        pos, mt = field_cells(fields)
+        out[:, pos, mt] = np.asarray(rows, dtype=np.int32)
+    return out
+
+def as_fields(mat):
+    """(4, 6) matrix -> {"fwd_load": n, ..., "hatch_aft_close": n} with plain ints."""
+    return {f: int(mat[p, m]) for f, (p, m) in FIELD_INDEX.items()}
+
+_CELLS = field_cells(list(FIELD_INDEX))
+
+# --------------------------
+# One hour as a typed record
+# --------------------------
+class HourRecord:
+    """One hour's moves as a (4, 6) int32 matrix plus the hourly-only gearbox count.
+
+    The app keeps one widget key per field (`<prefix><field>`, e.g. "hr_fwd_load");
+    from_session / to_session read and write them all at once, so the key names come from
+    FIELD_INDEX instead of hand-kept lists, and sums / diffs are single array operations.
+    """
+    __slots__ = ("mat", "gearbox")
+
+    def __init__(self, mat=None, gearbox=0):
+        self.mat = np.zeros(SHAPE, dtype=np.int32) if mat is None else np.asarray(mat, dtype=np.int32).reshape(SHAPE)
+        self.gearbox = int(gearbox or 0)
+
+    @staticmethod
+    def keys(prefix):
+        """Session keys of the move fields, in FIELD_INDEX order."""
+        return [prefix + f for f in FIELD_INDEX]
+
+    @classmethod
+    def from_fields(cls, values, gearbox=0):
+        """From {"fwd_load": n, ...}; missing fields count as 0."""
+        mat = np.zeros(SHAPE, dtype=np.int32)
+        mat[_CELLS] = [int(values.get(f, 0) or 0) for f in FIELD_INDEX]
+        return cls(mat, gearbox)
+
+    @classmethod
+    def from_session(cls, state, prefix, gearbox_key=None):
+        mat = np.zeros(SHAPE, dtype=np.int32)
+        mat[_CELLS] = [int(state.get(k, 0) or 0) for k in cls.keys(prefix)]
+        return cls(mat, state.get(gearbox_key, 0) if gearbox_key else 0)
+
+    def to_session(self, state, prefix, gearbox_key=None):
+        for k, v in zip(self.keys(prefix), self.mat[_CELLS].tolist()):
+            state[k] = v
+        if gearbox_key:
+            state[gearbox_key] = self.gearbox
+
+    def fields(self):
+        return as_fields(self.mat)
+
+    def __add__(self, other):
+        return HourRecord(self.mat + other.mat, self.gearbox + other.gearbox)
+
+    def __sub__(self, other):
+        return HourRecord(self.mat - other.mat, self.gearbox - other.gearbox)
+
+    def __eq__(self, other):
+        return isinstance(other, HourRecord) and self.gearbox == other.gearbox and np.array_equal(self.mat, other.mat)
+
+    def __repr__(self):
+        return f"HourRecord({self.fields()}, gearbox={self.gearbox})"
+
+    def box_moves(self):
+        """Load + discharge + restows per position."""
+        return self.mat[:, :4].sum(axis=1)
+
+    def problems(self):
+        """Field names holding a negative count (POOP hatch cells are never set)."""
+        bad = self.mat[_CELLS] < 0
+        return [f for f, b in zip(FIELD_INDEX, bad) if b] + (["gearbox"] if self.gearbox < 0 else [])
+
+    def split(self):
+        """{move type: {"FWD": n, ...}} for display; POOP has no hatch columns."""
+        return {mt: {p.upper(): int(self.mat[i, m]) for i, p in enumerate(POSITIONS)
+                     if not (mt.startswith("hatch_") and p == "poop")}
+                for m, mt in enumerate(MOVE_TYPES)}
+
+# --------------------------
+# 4-hour ring buffer
+# --------------------------
+def empty_ring(n=4):
+    return {"moves": np.zeros((n,) + SHAPE, dtype=np.int32), "head": 0, "count_hours": 0}
+
+def push_hour(ring, mat):
+    """Overwrite the oldest slot with this hour; O(1), no list trimming."""
+    ring["moves"][ring["head"]] = mat
+    ring["head"] = (ring["head"] + 1) % len(ring["moves"])
+    ring["count_hours"] = min(len(ring["moves"]), ring["count_hours"] + 1)
+
+def window_sum(ring):
+    """(4, 6) totals over the window; empty slots are zero so this is one reduction."""
+    return ring["moves"].sum(axis=0)
+
+# --------------------------
+# Binary forms: little-endian int32 cells, one per field in FIELD_INDEX order
+# --------------------------
+MATRIX_BYTES = 4 * len(FIELD_INDEX)
+
+def to_bytes(mat):
+    """(4, 6) matrix -> MATRIX_BYTES bytes (POOP hatch cells are not stored)."""
+    return np.asarray(mat)[_CELLS].astype("<i4").tobytes()
+
+def from_bytes(blob):
+    return matrices_from_bytes([blob])[0]
+
+def matrices_from_bytes(blobs):
+    """Many packed matrices -> one (n, 4, 6) array, decoded in a single frombuffer."""
+    flat = np.frombuffer(b"".join(blobs), dtype="<i4").reshape(len(blobs), len(FIELD_INDEX))
+    out = np.zeros((len(blobs),) + SHAPE, dtype=np.int32)
+    out[:, _CELLS[0], _CELLS[1]] = flat
+    return out
+
+def pack_counts(values, keys):
+    """{key: int} over a fixed key list (at most 31) -> presence mask + one int32 per key."""
+    mask = sum(1 << i for i, k in enumerate(keys) if k in values)
+    return np.array([mask] + [int(values.get(k, 0)) for k in keys], dtype="<i4").tobytes()
+
+def unpack_counts(blob, keys):
+    """Inverse of pack_counts: only the keys that were present come back."""
+    arr = np.frombuffer(blob, dtype="<i4")
+    mask = int(arr[0])
+    return {k: int(v) for i, (k, v) in enumerate(zip(keys, arr[1:])) if mask >> i & 1}
@@ -0,0 +1,316 @@
+# record_store.py — append-only JSON-lines storage for whatsapp_report.py
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): the in-process lock still serialises sessions
+    fcntl = None
+
+LIST_KEYS = ("hourly_records", "four_hour_reports", "idle_logs")
+
+def block_hours(block_label):
+    """Start hours in a 4H block: "06h00 - 10h00" -> [6, 7, 8, 9], wrapping past midnight."""
+    left, right = block_label.split(" - ")
+    s, e = int(left[:2]), int(right[:2])
+    if s < e:
+        return list(range(s, e))
+    return list(range(s, 24)) + list(range(0, e))
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive flock on a sidecar file, shared by every process writing the log."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _locked(method):
+    """Run a store method under the store's lock (one store is shared by all sessions)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _exclusive(method):
+    """Writes: the store's lock plus the log's file lock, taken once however deeply nested."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            if self.writing:
+                return method(self, *args, **kwargs)
+            with _file_lock(self.path + ".lock"):
+                self.writing = True
+                try:
+                    self.load()  # catch up on lines other processes appended first
+                    return method(self, *args, **kwargs)
+                finally:
+                    self.writing = False
+    return wrapper
+
+class RecordStore:
+    """Vessel data kept as a log of small operations, one JSON object per line.
+
+    Every save appends only what changed (O(new record)); load() replays the log.
+    Once enough superseded lines pile up (edited settings, used flags, deletes), the log
+    is compacted into one "set" line plus one "append" line per record.
+
+    hourly_records are also indexed by (date, start_hour) and by ts; the index is built
+    while replaying and kept current on every write, so 4H block matching and marking
+    records used cost O(block size) rather than O(history).
+
+    load() keeps the replayed data and only reads the log again when its generation
+    (inode, size, mtime) differs from the one it last read or wrote: lines another process
+    appended are replayed onto the data from where the last read stopped; a replaced file
+    (another process compacted: the first line carries a new epoch) is replayed in full. An unchanged rerun costs one stat().
+
+    The replayed data belongs to the store: callers read it and change it only through the
+    write methods. Every write takes a file lock next to the log and first catches up on
+    other processes' lines, so appends and compactions never interleave and a compaction
+    always rewrites the latest state.
+
+    Counters (done_*) are written as "add" deltas rather than totals, so two sessions or
+    processes saving hours from stale copies both count: replay sums every delta.
+
+    Ops:
+      {"op": "set", "values": {...}}                      scalar fields
+      {"op": "append", "list": k, "rec": {...}, "values": {...}, "add": {...}}  (values / add optional)
+      {"op": "mark_used", "ts": [...]}                    hourly_records used_in_4h = True
+      {"op": "reset_used"}                                all used_in_4h = False
+      {"op": "delete", "list": k, "ts": [...]}            drop records by ts
+      {"op": "delete", "list": k, "idx": [...]}           (older logs) drop records by position
+    """
+
+    def __init__(self, path, legacy_path=None, compact_after=500):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.compact_after = compact_after
+        self.lines = 0         # log lines replayed or written
+        self.offset = 0        # bytes of the log reflected in `data`
+        self.by_slot = {}      # (date, start_hour) -> [hourly records, oldest first]
+        self.by_ts = {}        # ts -> hourly record
+        self.data = None       # replayed data, valid while the log is at generation `seen`
+        self.seen = None
+        self.lock = threading.RLock()
+        self.writing = False   # this thread holds the file lock
+        self.head = None       # first line of the log as last replayed
+
+    def generation(self):
+        """(inode, size, mtime_ns) of the log, or None before it exists; changes on every write."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    @property
+    def overhead(self):
+        """Log lines a compaction would remove."""
+        return max(0, self.lines - 1 - sum(len(self.data[k]) for k in LIST_KEYS)) if self.data else 0
+
+    # ---------- load ----------
+    @_locked
+    def load(self):
+        gen = self.generation()
+        if self.data is not None and gen == self.seen:
+            return self.data
+        if self.data is not None and gen and gen[1] >= self.offset and self._head() == self.head:
+            self._replay_tail()
+        else:
+            self._replay()
+        # the generation checked before reading: a line appended while we read is either in
+        # `data` already or picked up by the next load, never marked seen without being read
+        self.seen = gen
+        return self.data
+
+    def _head(self):
+        """First line of the log: a compaction writes a new one (with a fresh epoch)."""
+        try:
+            with open(self.path, "rb") as f:
+                return f.readline()
+        except FileNotFoundError:
+            return None
+
+    def _replay(self):
+        self.data = {k: [] for k in LIST_KEYS}
+        self.by_slot, self.by_ts = {}, {}
+        self.lines = self.offset = 0
+        self.head = self._head()
+        if not os.path.exists(self.path):
+            legacy = self._load_legacy()
+            if legacy:
+                self.data.update(legacy)
+                self._reindex(self.data)
+                with contextlib.nullcontext() if self.writing else _file_lock(self.path + ".lock"):
+                    if not os.path.exists(self.path):
+                        self._write_snapshot(self.data)
+            return
+        self._replay_tail()
+
+    def _replay_tail(self):
+        """Apply the complete lines after `offset` (a torn last line waits for its newline)."""
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            try:
+                op = json.loads(line)
+            except ValueError:
+                continue  # torn line from an interrupted write
+            self._apply(self.data, op)
+            self.lines += 1
+        self.offset += end
+
+    def _load_legacy(self):
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return {}
+        try:
+            with open(self.legacy_path, "r") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _apply(self, data, op):
+        kind = op.get("op")
+        if kind == "set":
+            data.update(op["values"])
+        elif kind == "append":
+            data.setdefault(op["list"], []).append(op["rec"])
+            data.update(op.get("values", {}))
+            for k, n in op.get("add", {}).items():
+                data[k] = data.get(k, 0) + n
+            if op["list"] == "hourly_records":
+                self._index(op["rec"])
+        elif kind == "mark_used":
+            for ts in op["ts"]:
+                rec = self.by_ts.get(ts)
+                if rec is not None:
+                    rec["used_in_4h"] = True
+        elif kind == "reset_used":
+            for rec in data.get("hourly_records", []):
+                rec["used_in_4h"] = False
+        elif kind == "delete":
+            recs = data.get(op["list"], [])
+            if "ts" in op:
+                ts = set(op["ts"])
+                data[op["list"]] = [r for r in recs if r.get("ts") not in ts]
+            else:
+                idx = set(op["idx"])
+                data[op["list"]] = [r for i, r in enumerate(recs) if i not in idx]
+            if op["list"] == "hourly_records":
+                self._reindex(data)
+
+    # ---------- hourly index ----------
+    def _index(self, rec):
+        self.by_slot.setdefault((rec.get("date"), rec.get("start_hour")), []).append(rec)
+        if rec.get("ts") is not None:
+            self.by_ts[rec["ts"]] = rec
+
+    def _reindex(self, data):
+        self.by_slot, self.by_ts = {}, {}
+        for rec in data.get("hourly_records", []):
+            self._index(rec)
+
+    def hourly_for(self, date_str, start_hour, include_used=True):
+        """Hourly records saved for one slot, oldest first."""
+        recs = self.by_slot.get((date_str, start_hour), [])
+        if include_used:
+            return recs
+        return [r for r in recs if not r.get("used_in_4h", False)]
+
+    @_locked
+    def match_block(self, date_str, block_label, include_used=True):
+        """The latest hourly record for each hour of a 4H block: (matched, missing start hours)."""
+        matched, missing = [], []
+        for h in block_hours(block_label):
+            candidates = self.hourly_for(date_str, h, include_used=include_used)
+            if candidates:
+                matched.append(candidates[-1])
+            else:
+                missing.append(h)
+        return matched, missing
+
+    # ---------- writes (file lock held, data caught up with the log) ----------
+    def _write(self, op):
+        self._apply(self.data, op)
+        line = (json.dumps(op, separators=(",", ":")) + "\n").encode()
+        with open(self.path, "ab") as f:
+            if f.tell() != self.offset:
+                line = b"\n" + line  # close a torn line left by an interrupted write
+            f.write(line)
+            self.offset = f.tell()
+        if self.head is None:
+            self.head = self._head()  # we started the log
+        self.lines += 1
+        self.seen = self.generation()
+        self._maybe_compact()
+
+    @_exclusive
+    def update(self, values):
+        """Set scalar fields; only values that differ from the log are written."""
+        changed = {k: v for k, v in values.items() if self.data.get(k, object()) != v}
+        if changed:
+            self._write({"op": "set", "values": changed})
+
+    @_exclusive
+    def append(self, list_key, rec, values=None, add=None):
+        """Append one record (plus scalar updates and counter increments) as a single log line."""
+        op = {"op": "append", "list": list_key, "rec": rec}
+        if values:
+            op["values"] = values
+        if add:
+            op["add"] = add
+        self._write(op)
+
+    @_exclusive
+    def mark_used(self, ts_list):
+        self._write({"op": "mark_used", "ts": list(ts_list)})
+
+    @_exclusive
+    def reset_used(self):
+        self._write({"op": "reset_used"})
+
+    @_exclusive
+    def delete(self, list_key, ts_list):
+        """Drop records by their ts (positions differ between sessions' copies of the list)."""
+        self._write({"op": "delete", "list": list_key, "ts": list(ts_list)})
+
+    # ---------- compaction ----------
+    def _maybe_compact(self):
+        if self.overhead >= self.compact_after:
+            self.compact()
+
+    @_exclusive
+    def compact(self):
+        """Rewrite the log as its minimal equivalent; atomic via rename.
+
+        The snapshot is the log's own state, freshly loaded under the file lock (never a
+        caller's copy), so nothing another process appended can be dropped.
+        """
+        self._write_snapshot(self.load())
+
+    def _write_snapshot(self, data):
+        scalars = {k: v for k, v in data.items() if k not in LIST_KEYS}
+        lines = [{"op": "set", "values": scalars, "epoch": f"{os.getpid()}-{time.time_ns()}"}]
+        lines += [{"op": "append", "list": k, "rec": rec} for k in LIST_KEYS for rec in data.get(k, [])]
+        body = "".join(json.dumps(op, separators=(",", ":")) + "\n" for op in lines).encode()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.head = body[:body.index(b"\n") + 1]
+        self.lines, self.offset = len(lines), len(body)
+        self.seen = self.generation()
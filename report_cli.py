@@ -0,0 +1,321 @@
+# report_cli.py — command line and local HTTP access to report_core (no Streamlit needed)
+#
+#   python report_cli.py calls
+#   python report_cli.py hour --call 1 --hour "06h00 - 07h00" --date 2025-08-14 --move fwd_load=12 --move aft_disch=4
+#   python report_cli.py fourh --call 1 --block "06h00 - 10h00" --date 2025-08-14
+#   python report_cli.py blocks --call 1                        (4-hour blocks imported from chat)
+#   python report_cli.py window --call 1 --kind shift --date 2025-08-14 --shift "Day 06h00 - 14h00"
+#   python report_cli.py backfill --call 1 missed_hours.csv        (or a file of sent hourly reports)
+#   python report_cli.py import-chat "WhatsApp Chat with Berth 5.txt" [--dry-run]
+#   python report_cli.py productivity [--call 1]                (gross / net moves per crane hour)
+#   python report_cli.py idle --call 1 --by reason              (downtime minutes, overlaps merged)
+#   python report_cli.py forecast --call 1                      (ETC with its band, as JSON)
+#   python report_cli.py serve --port 8765
+import argparse
+import json
+import sys
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import aggregate
+import analytics
+import backfill
+import chatlog
+import forecast
+import report_core
+
+def window_label(kind, hours=4, shift=None, day=None, end_day=None, start_hour=0, end_hour=24):
+    """Period line for the shift layout; None selects the end-of-call layout."""
+    if kind == "rolling":
+        return f"Last {hours} hours"
+    if kind == "shift":
+        return shift
+    if kind == "day":
+        return "Full day 00h00 - 24h00"
+    if kind == "custom":
+        end_day = end_day or day
+        return f"{day.strftime('%d/%m')} {start_hour:02d}h00 - {end_day.strftime('%d/%m')} {end_hour % 24:02d}h00"
+    return None
+
+def render_window(db, call_id, kind, day, **params):
+    state = report_core.load_state(db, call_id)
+    if kind in report_core.SUMMARY_KINDS:
+        mat, n = report_core.summary_window(db, call_id, kind, day=day, shift=params.get("shift"))
+    else:
+        mat, n = report_core.compute_window(report_core.load_series(db, call_id), kind, day=day, **params)
+    return report_core.render_window(state, mat, n, day, window_label(kind, day=day, **params))
+
+def apply_and_render_hour(db, call_id, hour, idle=()):
+    state = report_core.load_state(db, call_id)
+    with db.transaction():
+        report_core.apply_hour(db, state, hour)
+        report_core.save_idle(db, call_id, hour.report_date, idle)
+    return report_core.render_hourly(state, hour, idle)
+
+def render_fourh(db, call_id, block, day, idle=()):
+    return report_core.render_4h(report_core.load_state(db, call_id), block, day, idle=idle)
+
+# --------------------------
+# HTTP endpoint
+# --------------------------
+def _window_params(q):
+    """Query-string / JSON values -> compute_window keyword arguments."""
+    params = {}
+    if "hours" in q:
+        params["hours"] = int(q["hours"])
+    if "shift" in q:
+        params["shift"] = q["shift"]
+    if "end_date" in q:
+        params["end_day"] = date.fromisoformat(q["end_date"])
+    for k in ("start_hour", "end_hour"):
+        if k in q:
+            params[k] = int(q[k])
+    return params
+
+def productivity_rows(db, call_ids=None):
+    row_calls, mats = analytics.load_ledger(db, call_ids)
+    idle = analytics.idle_arrays(report_core.load_idle(db, call_ids))
+    return analytics.table(analytics.productivity(row_calls, mats, idle), dict(report_core.list_calls(db)))
+
+def completion_forecast(db, call_id):
+    """ETC as JSON-ready values (None until the call has enough saved hours)."""
+    return forecast.as_json(report_core.estimate_completion(report_core.load_cumulative(db, call_id)))
+
+def idle_totals(db, call_id, by, shift=None):
+    """{label: minutes} of stored idle for one call, by crane / reason / shift day."""
+    index = report_core.load_idle(db, [call_id])
+    if by == "shift":
+        return {d.isoformat(): m for d, m in sorted(index.by_shift(shift).items())}
+    return index.by_crane() if by == "crane" else index.by_reason()
+
+def make_handler(db):
+    class ReportHandler(BaseHTTPRequestHandler):
+        """GET /calls, /report/4h, /report/window, /productivity, /forecast; POST /hour."""
+
+        def _send(self, status, body, content_type="text/plain; charset=utf-8"):
+            data = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self, fn):
+            try:
+                fn()
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, f"bad request: {e}\n")
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == "/calls":
+                self._handle(lambda: self._send(200, json.dumps(report_core.list_calls(db)), "application/json"))
+            elif url.path == "/report/4h":
+                self._handle(lambda: self._send(200, render_fourh(
+                    db, int(q["call"]), q["block"], date.fromisoformat(q["date"]))))
+            elif url.path == "/report/window":
+                self._handle(lambda: self._send(200, render_window(
+                    db, int(q["call"]), q.get("kind", "call"), date.fromisoformat(q["date"]), **_window_params(q))))
+            elif url.path == "/forecast":
+                self._handle(lambda: self._send(200, json.dumps(completion_forecast(db, int(q["call"]))),
+                                                "application/json"))
+            elif url.path == "/productivity":
+                self._handle(lambda: self._send(200, json.dumps(productivity_rows(
+                    db, [int(q["call"])] if "call" in q else None)), "application/json"))
+            else:
+                self._send(404, "not found\n")
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/hour":
+                self._send(404, "not found\n")
+                return
+            def post_hour():
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                hour = report_core.HourInput(
+                    hour_label=body["hour_label"], report_date=date.fromisoformat(body["report_date"]),
+                    moves=body.get("moves", {}), gearbox=int(body.get("gearbox", 0)),
+                    first_lift=body.get("first_lift", ""), last_lift=body.get("last_lift", ""))
+                self._send(200, apply_and_render_hour(db, int(body["call"]), hour, body.get("idle", [])))
+            self._handle(post_hour)
+
+        def log_message(self, fmt, *args):
+            pass  # batch jobs hit this hundreds of times a second
+
+    return ReportHandler
+
+# --------------------------
+# CLI
+# --------------------------
+def _parse_moves(pairs):
+    out = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        if name not in report_core.MOVE_FIELDS:
+            raise SystemExit(f"unknown move field {name!r}; expected one of {', '.join(report_core.MOVE_FIELDS)}")
+        out[name] = int(value)
+    return out
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vessel hourly / 4-hourly reports without Streamlit.")
+    parser.add_argument("--db", default="vessel_report.db", help="SQLite file used by WhatsApp_Report.py")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("calls", help="list vessel calls")
+
+    p = sub.add_parser("new-call", help="start a vessel call")
+    p.add_argument("--vessel", required=True)
+    p.add_argument("--berthed", default="")
+
+    p = sub.add_parser("hour", help="save one hour and print the hourly report")
+    p.add_argument("--call", type=int, required=True)
+    p.add_argument("--hour", required=True, help='e.g. "06h00 - 07h00"')
+    p.add_argument("--date", type=date.fromisoformat, default=date.today())
+    p.add_argument("--move", action="append", metavar="FIELD=N", help="e.g. fwd_load=12 (repeatable)")
+    p.add_argument("--gearbox", type=int, default=0)
+    p.add_argument("--first-lift", default="")
+    p.add_argument("--last-lift", default="")
+
+    p = sub.add_parser("hours", help="list the latest saved hours with their ledger ids")
+    p.add_argument("--call", type=int, required=True)
+    p.add_argument("--limit", type=int, default=24)
+
+    p = sub.add_parser("edit-hour", help="change a saved hour's moves (fields not given keep their value)")
+    p.add_argument("--call", type=int, required=True)
+    p.add_argument("id", type=int, help="ledger id, see `hours`")
+    p.add_argument("--move", action="append", metavar="FIELD=N", help="e.g. fwd_load=12 (repeatable)")
+    p.add_argument("--gearbox", type=int, default=None)
+
+    p = sub.add_parser("delete-hour", help="remove a saved hour from the ledger and every total")
+    p.add_argument("--call", type=int, required=True)
+    p.add_argument("id", type=int, help="ledger id, see `hours`")
+
+    p = sub.add_parser("undo", help="remove the most recently saved hour")
+    p.add_argument("--call", type=int, required=True)
+
+    p = sub.add_parser("productivity", help="gross / net moves per crane hour, per call and position (TSV)")
+    p.add_argument("--call", type=int, action="append", help="limit to these calls (repeatable; default all)")
+
+    p = sub.add_parser("idle", help="idle minutes for a call by crane, reason or shift (overlaps merged)")
+    p.add_argument("--call", type=int, required=True)
+    p.add_argument("--by", choices=["crane", "reason", "shift"], default="crane")
+    p.add_argument("--shift", choices=list(aggregate.SHIFTS), default=list(aggregate.SHIFTS)[0])
+
+    p = sub.add_parser("forecast", help="estimated completion time and band for a call (JSON)")
+    p.add_argument("--call", type=int, required=True)
+
+    p = sub.add_parser("fourh", help="print the 4-hour report from the rolling tracker")
+    p.add_argument("--call", type=int, required=True)
+    p.add_argument("--block", required=True, help='e.g. "06h00 - 10h00"')
+    p.add_argument("--date", type=date.fromisoformat, default=date.today())
+
+    p = sub.add_parser("blocks", help="list the sent 4-hour blocks imported for a call")
+    p.add_argument("--call", type=int, required=True)
+
+    p = sub.add_parser("window", help="print a rolling / shift / day / call / custom report")
+    p.add_argument("--call", type=int, required=True)
+    p.add_argument("--kind", choices=["rolling", "shift", "day", "call", "custom"], default="call")
+    p.add_argument("--date", type=date.fromisoformat, default=date.today())
+    p.add_argument("--hours", type=int, default=4, help="rolling window length")
+    p.add_argument("--shift", choices=list(aggregate.SHIFTS), default=list(aggregate.SHIFTS)[0])
+    p.add_argument("--end-date", type=date.fromisoformat, default=None, help="custom range end day")
+    p.add_argument("--start-hour", type=int, default=0)
+    p.add_argument("--end-hour", type=int, default=24, help="custom range end (exclusive)")
+
+    p = sub.add_parser("backfill", help="import missed hours (CSV or sent hourly reports) in one transaction")
+    p.add_argument("--call", type=int, required=True)
+    p.add_argument("file", help="CSV with date,hour,<move fields>... or pasted hourly report text")
+
+    p = sub.add_parser("import-chat", help="load every hourly / 4-hour report from a WhatsApp chat export")
+    p.add_argument("file", help="exported chat .txt (Android or iOS format)")
+    p.add_argument("--dry-run", action="store_true", help="parse and count only")
+
+    p = sub.add_parser("serve", help="serve reports over HTTP on localhost")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+
+    args = parser.parse_args(argv)
+    db = report_core.open_db(args.db)
+
+    if args.cmd == "calls":
+        for call_id, vessel in report_core.list_calls(db):
+            print(f"{call_id}\t{vessel}")
+    elif args.cmd == "new-call":
+        print(report_core.create_call(db, args.vessel, args.berthed))
+    elif args.cmd == "hour":
+        hour = report_core.HourInput(args.hour, args.date, _parse_moves(args.move), args.gearbox,
+                                     args.first_lift, args.last_lift)
+        sys.stdout.write(apply_and_render_hour(db, args.call, hour))
+    elif args.cmd == "hours":
+        for e in report_core.ledger_entries(db, args.call, args.limit):
+            print(f"{e.id}\t{e.hour.report_date.isoformat()}\t{e.hour.hour_label}\t{sum(e.hour.row().values())} moves")
+    elif args.cmd == "edit-hour":
+        entry = report_core.ledger_entry(db, args.call, args.id)
+        if entry is None:
+            raise SystemExit(f"call {args.call} has no saved hour {args.id}")
+        entry.hour.moves.update(_parse_moves(args.move))
+        if args.gearbox is not None:
+            entry.hour.gearbox = args.gearbox
+        report_core.edit_hour(db, report_core.load_state(db, args.call), args.id, entry.hour)
+        print(f"hour {args.id} updated")
+    elif args.cmd == "delete-hour":
+        try:
+            report_core.delete_hour(db, report_core.load_state(db, args.call), args.id)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"hour {args.id} deleted")
+    elif args.cmd == "undo":
+        last = report_core.undo_last_hour(db, report_core.load_state(db, args.call))
+        print("nothing to undo" if last is None else
+              f"removed {last.hour.report_date.isoformat()} {last.hour.hour_label} (id {last.id})")
+    elif args.cmd == "productivity":
+        rows = productivity_rows(db, args.call)
+        if rows:
+            print("\t".join(rows[0]))
+            for row in rows:
+                print("\t".join(str(v) for v in row.values()))
+    elif args.cmd == "idle":
+        for label, minutes in idle_totals(db, args.call, args.by, args.shift).items():
+            print(f"{label}\t{minutes}")
+    elif args.cmd == "forecast":
+        print(json.dumps(completion_forecast(db, args.call)))
+    elif args.cmd == "fourh":
+        sys.stdout.write(render_fourh(db, args.call, args.block, args.date))
+    elif args.cmd == "blocks":
+        for label, day, mats, totals in zip(*report_core.load_blocks(db, args.call)):
+            print(f"{day}\t{label}\t{int(mats[:, :4].sum())} moves\t{json.dumps(totals)}")
+    elif args.cmd == "window":
+        params = {"hours": args.hours, "shift": args.shift, "end_day": args.end_date,
+                  "start_hour": args.start_hour, "end_hour": args.end_hour}
+        sys.stdout.write(render_window(db, args.call, args.kind, args.date, **params))
+    elif args.cmd == "backfill":
+        with open(args.file, encoding="utf-8-sig") as f:
+            hours, problems = backfill.parse(f.read())
+        problems += backfill.check_batch(hours, report_core.ledger_hours(db, args.call))
+        if problems:
+            raise SystemExit("nothing imported:\n" + "\n".join(f"  {p}" for p in problems))
+        report_core.apply_hours(db, report_core.load_state(db, args.call), backfill.in_order(hours))
+        print(f"imported {len(hours)} hour(s)")
+    elif args.cmd == "import-chat":
+        with open(args.file, encoding="utf-8-sig", errors="replace") as f:
+            stats = chatlog.import_reports(db, chatlog.iter_chat_reports(f), dry_run=args.dry_run)
+        for problem in stats.pop("problems"):
+            print(f"skipped: {problem}", file=sys.stderr)
+        print(json.dumps(stats))
+    elif args.cmd == "serve":
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(db))
+        print(f"serving reports on http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            db.close()
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (report_core.InvalidHour, report_core.UnknownCall) as e:
+        raise SystemExit(f"error: {e}")
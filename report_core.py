@@ -0,0 +1,896 @@
+# report_core.py — Streamlit-free report logic: schema, ledger writes, windows, rendering
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pytz
+
+import aggregate
+import forecast
+import idle as idle_index
+import moves
+import templates
+import vessel_db
+
+# --------------------------
+# CONSTANTS & DB PERSISTENCE
+# --------------------------
+TZ = pytz.timezone("Africa/Johannesburg")
+
+# default cumulative structure (used if DB empty)
+DEFAULT_CUMULATIVE = {
+    "done_load": 0,
+    "done_disch": 0,
+    "done_restow_load": 0,
+    "done_restow_disch": 0,
+    "done_hatch_open": 0,
+    "done_hatch_close": 0,
+    "last_hour": "06h00 - 07h00",
+    "vessel_name": "MSC NILA",
+    "berthed_date": "14/08/2025 @ 10h55",
+    "planned_load": 687,
+    "planned_disch": 38,
+    "planned_restow_load": 13,
+    "planned_restow_disch": 13,
+    "opening_load": 0,
+    "opening_disch": 0,
+    "opening_restow_load": 0,
+    "opening_restow_disch": 0,
+    "_openings_applied": False,
+    # moves counted as done that are not in the hourly ledger (opening balances, pre-ledger history)
+    "carried_load": 0,
+    "carried_disch": 0,
+    "carried_restow_load": 0,
+    "carried_restow_disch": 0,
+    "carried_hatch_open": 0,
+    "carried_hatch_close": 0,
+    # 4-hour window only looks at ledger rows after this id (moved forward on tracker reset)
+    "fourh_since_id": 0,
+}
+
+# hourly ledger columns, grouped by the cumulative total they roll up into
+DONE_FIELDS = {
+    "load":         ["fwd_load", "mid_load", "aft_load", "poop_load"],
+    "disch":        ["fwd_disch", "mid_disch", "aft_disch", "poop_disch"],
+    "restow_load":  ["fwd_restow_load", "mid_restow_load", "aft_restow_load", "poop_restow_load"],
+    "restow_disch": ["fwd_restow_disch", "mid_restow_disch", "aft_restow_disch", "poop_restow_disch"],
+    "hatch_open":   ["hatch_fwd_open", "hatch_mid_open", "hatch_aft_open"],
+    "hatch_close":  ["hatch_fwd_close", "hatch_mid_close", "hatch_aft_close"],
+}
+MOVE_FIELDS = [f for fields in DONE_FIELDS.values() for f in fields]
+LEDGER_COLUMNS = (
+    [("call_id", "INTEGER NOT NULL DEFAULT 1"), ("report_date", "TEXT")]
+    + [(f, "INTEGER NOT NULL DEFAULT 0") for f in MOVE_FIELDS]
+    + [("gearbox", "INTEGER NOT NULL DEFAULT 0"), ("first_lift", "TEXT"), ("last_lift", "TEXT")]
+)
+# done_* totals are derived from carried_* + the ledger and never stored in meta
+DERIVED_KEYS = [f"done_{g}" for g in DONE_FIELDS] + ["fourh"]
+# meta row version a loaded cumulative was read at (kept in its own column, not the blob)
+VERSION_KEY = "_version"
+# keys an hour write keeps from the session's copy when it merges onto a newer stored row
+SESSION_KEYS = ["fourh_block"]
+# groups that have a plan and an opening balance
+PLAN_GROUPS = ["load", "disch", "restow_load", "restow_disch"]
+# ETC state (forecast.py), kept in the meta blob and moved on with every saved hour
+FORECAST_KEY = "forecast"
+
+# sent 4-hour blocks: moves and the plan / done / remain lines are packed int32 columns
+# (moves.to_bytes / moves.pack_counts); `data` keeps only the JSON extras (sender, idle)
+FOURH_COLUMNS = ["call_id", "block_label", "timestamp", "report_date", "moves", "totals", "data"]
+FOURH_TOTALS = [f"{row}_{g}" for row in ("planned", "done", "remain") for g in PLAN_GROUPS]
+
+def _ledger_sums(cur, call_id):
+    """Per-group totals of one call's ledger -> {"load": n, "disch": n, ...} (one summary row)."""
+    cols = ", ".join(" + ".join(fields) for fields in DONE_FIELDS.values())
+    cur.execute(f"SELECT {cols} FROM hourly_summary WHERE call_id = ? AND grain = 'call' AND bucket = '';",
+                (call_id,))
+    return dict(zip(DONE_FIELDS.keys(), cur.fetchone() or [0] * len(DONE_FIELDS)))
+
+# --------------------------
+# Summary tables: hourly_summary holds running totals per call, day, clock hour and shift,
+# kept in step with the ledger by triggers on every insert / update / delete of `hourly`
+# --------------------------
+SUMMARY_FIELDS = MOVE_FIELDS + ["gearbox"]
+
+def _summary_buckets(ref):
+    """(grain, bucket) SQL expressions for one ledger row `ref` (NEW, OLD or hourly)."""
+    day = f"COALESCE({ref}.report_date, substr({ref}.timestamp, 1, 10), '')"
+    return [
+        ("'call'", "''"),
+        ("'day'", day),
+        ("'hour'", f"{day} || ' ' || COALESCE(substr({ref}.hour_label, 1, 2), '')"),
+    ]
+
+def _shift_bucket(ref):
+    """Shift rows come from shift_def: the hour is in a shift if it is < length hours after its
+    start; a shift that runs past midnight is filed under the day it started."""
+    day = f"COALESCE({ref}.report_date, substr({ref}.timestamp, 1, 10), '')"
+    hour = f"CAST(substr({ref}.hour_label, 1, 2) AS INTEGER)"
+    return (f"'shift:' || shift_def.name",
+            f"CASE WHEN {hour} >= shift_def.start THEN {day} ELSE date({day}, '-1 day') END",
+            f"(({hour} - shift_def.start + 24) % 24) < shift_def.length")
+
+def _summary_upserts(ref, sign):
+    """Statements adding (sign "") or removing (sign "-") one ledger row from every bucket."""
+    cols = ", ".join(SUMMARY_FIELDS)
+    vals = ", ".join(f"{sign}{ref}.{f}" for f in SUMMARY_FIELDS)
+    upsert = (f"ON CONFLICT (call_id, grain, bucket) DO UPDATE SET "
+              + ", ".join(f"{f} = {f} + excluded.{f}" for f in SUMMARY_FIELDS + ["hours"]))
+    stmts = [f"INSERT INTO hourly_summary (call_id, grain, bucket, {cols}, hours) "
+             f"VALUES ({ref}.call_id, {grain}, {bucket}, {vals}, {sign}1) {upsert};"
+             for grain, bucket in _summary_buckets(ref)]
+    grain, bucket, member = _shift_bucket(ref)
+    stmts.append(f"INSERT INTO hourly_summary (call_id, grain, bucket, {cols}, hours) "
+                 f"SELECT {ref}.call_id, {grain}, {bucket}, {vals}, {sign}1 FROM shift_def "
+                 f"WHERE {member} {upsert};")
+    return stmts
+
+def rebuild_summaries(cur):
+    """Recompute every summary row from the ledger (first run, or shift definitions changed)."""
+    cur.execute("DELETE FROM hourly_summary;")
+    cols = ", ".join(SUMMARY_FIELDS)
+    sums = ", ".join(f"SUM({f})" for f in SUMMARY_FIELDS)
+    for grain, bucket in _summary_buckets("hourly"):
+        cur.execute(f"INSERT INTO hourly_summary (call_id, grain, bucket, {cols}, hours) "
+                    f"SELECT call_id, {grain}, {bucket}, {sums}, COUNT(*) FROM hourly "
+                    f"GROUP BY call_id, {bucket};")
+    grain, bucket, member = _shift_bucket("hourly")
+    cur.execute(f"INSERT INTO hourly_summary (call_id, grain, bucket, {cols}, hours) "
+                f"SELECT call_id, {grain}, {bucket}, {sums}, COUNT(*) FROM hourly JOIN shift_def ON {member} "
+                f"GROUP BY call_id, shift_def.name, {bucket};")
+
+def init_change_log(cur):
+    """hourly_changes: what each edit or delete of a ledger row took out and put back.
+
+    Summary rows are fixed up by their own triggers; this journal is for readers that keep
+    their own running totals (MoveSeries), so they can apply the delta instead of re-reading.
+    """
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS hourly_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            call_id INTEGER NOT NULL,
+            hour_id INTEGER NOT NULL,
+            report_date TEXT,
+            hour_label TEXT,
+            hours INTEGER NOT NULL,
+            {', '.join(f'{f} INTEGER NOT NULL DEFAULT 0' for f in MOVE_FIELDS)}
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_hourly_changes_call ON hourly_changes (call_id, seq);")
+    # how far each long-lived series has read the journal; rows every reader is past are trimmed,
+    # and the floor records up to where, so a reader left behind knows to start over
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS hourly_change_readers (
+            call_id INTEGER NOT NULL,
+            reader TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            seen REAL NOT NULL,
+            PRIMARY KEY (call_id, reader)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute("CREATE TABLE IF NOT EXISTS hourly_changes_floor (call_id INTEGER PRIMARY KEY, seq INTEGER NOT NULL);")
+
+    def entry(ref, sign):
+        return (f"INSERT INTO hourly_changes (call_id, hour_id, report_date, hour_label, hours, "
+                f"{', '.join(MOVE_FIELDS)}) VALUES ({ref}.call_id, OLD.id, "
+                f"COALESCE({ref}.report_date, substr({ref}.timestamp, 1, 10)), {ref}.hour_label, {sign}1, "
+                + ", ".join(f"{sign}{ref}.{f}" for f in MOVE_FIELDS) + ");")
+
+    for name in ("hourly_changes_del", "hourly_changes_upd"):
+        cur.execute(f"DROP TRIGGER IF EXISTS {name};")
+    cur.execute(f"CREATE TRIGGER hourly_changes_del AFTER DELETE ON hourly BEGIN {entry('OLD', '-')} END;")
+    cur.execute(f"CREATE TRIGGER hourly_changes_upd AFTER UPDATE ON hourly BEGIN "
+                f"{entry('OLD', '-')} {entry('NEW', '')} END;")
+
+def init_summaries(cur):
+    """Create the summary table and its triggers; rebuild when new or when SHIFTS changed."""
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS hourly_summary (
+            call_id INTEGER NOT NULL,
+            grain TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            {', '.join(f'{f} INTEGER NOT NULL DEFAULT 0' for f in SUMMARY_FIELDS)},
+            hours INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (call_id, grain, bucket)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute("CREATE TABLE IF NOT EXISTS shift_def (name TEXT PRIMARY KEY, start INTEGER, length INTEGER);")
+    wanted = sorted((name, start, length) for name, (start, length) in aggregate.SHIFTS.items())
+    stored = sorted(cur.execute("SELECT name, start, length FROM shift_def;").fetchall())
+    # triggers are regenerated each open, so a new ledger column is picked up too
+    for name in ("hourly_summary_ins", "hourly_summary_del", "hourly_summary_upd"):
+        cur.execute(f"DROP TRIGGER IF EXISTS {name};")
+    cur.execute("CREATE TRIGGER hourly_summary_ins AFTER INSERT ON hourly BEGIN "
+                + " ".join(_summary_upserts("NEW", "")) + " END;")
+    cur.execute("CREATE TRIGGER hourly_summary_del AFTER DELETE ON hourly BEGIN "
+                + " ".join(_summary_upserts("OLD", "-"))
+                + " DELETE FROM hourly_summary WHERE call_id = OLD.call_id AND hours = 0; END;")
+    cur.execute("CREATE TRIGGER hourly_summary_upd AFTER UPDATE ON hourly BEGIN "
+                + " ".join(_summary_upserts("OLD", "-") + _summary_upserts("NEW", ""))
+                + " DELETE FROM hourly_summary WHERE call_id = OLD.call_id AND hours = 0; END;")
+    if stored != wanted or not cur.execute("SELECT 1 FROM hourly_summary LIMIT 1;").fetchone():
+        cur.execute("DELETE FROM shift_def;")
+        cur.executemany("INSERT INTO shift_def (name, start, length) VALUES (?, ?, ?);", wanted)
+        rebuild_summaries(cur)
+
+def _box_moves(row: Dict[str, int]) -> List[int]:
+    """Box moves (load, disch, restows) per position of one ledger row / hour."""
+    return [sum(row.get(f"{p}_{g}", 0) for g in PLAN_GROUPS) for p in moves.POSITIONS]
+
+def forecast_state(cur, call_id):
+    """ETC state rebuilt from the call's last forecast.TAIL clock hours (summary rows, newest first)."""
+    cols = ", ".join(" + ".join(f"{p}_{g}" for g in PLAN_GROUPS) for p in moves.POSITIONS)
+    cur.execute(f"SELECT bucket, {cols} FROM hourly_summary WHERE call_id = ? AND grain = 'hour' "
+                "ORDER BY bucket DESC LIMIT ?;", (call_id, forecast.TAIL))
+    hours = [(aggregate.hour_key(date.fromisoformat(r[0][:10]), int(r[0][11:13])), list(r[1:]))
+             for r in cur.fetchall()[::-1] if len(r[0]) >= 13]
+    return forecast.rebuild(hours)
+
+def _meta_value(cum: dict):
+    return json.dumps({k: v for k, v in cum.items() if k not in DERIVED_KEYS and k != VERSION_KEY})
+
+class StaleMeta(RuntimeError):
+    """The meta row changed since this cumulative was loaded (another session saved)."""
+
+class InvalidHour(ValueError):
+    """An hour that cannot go into the ledger (bad label, unknown field, negative count)."""
+
+class UnknownCall(ValueError):
+    """Writes for a call id that is not in `calls`."""
+
+HOUR_LABEL = re.compile(r"^([01]\d|2[0-3])h00 - ([01]\d|2[0-3])h00$")
+
+def check_hour(hour: "HourInput") -> None:
+    """Raise InvalidHour unless the hour is a one-hour 'HHh00 - HHh00' slot with known, >= 0 moves."""
+    m = HOUR_LABEL.match(str(hour.hour_label or ""))
+    if not m or int(m.group(2)) != (int(m.group(1)) + 1) % 24:
+        raise InvalidHour(f"bad hour label {hour.hour_label!r}; expected e.g. '06h00 - 07h00'")
+    unknown = sorted(set(hour.moves) - set(MOVE_FIELDS))
+    if unknown:
+        raise InvalidHour(f"unknown move fields: {', '.join(unknown)}")
+    negative = sorted(f for f, v in hour.moves.items() if int(v) < 0)
+    if negative or int(hour.gearbox or 0) < 0:
+        raise InvalidHour(f"negative counts: {', '.join(negative or ['gearbox'])}")
+
+def _require_call(cur, call_id):
+    cur.execute("SELECT 1 FROM calls WHERE id = ?;", (call_id,))
+    if cur.fetchone() is None:
+        raise UnknownCall(f"no vessel call {call_id}")
+
+def init_db(db):
+    """Create DB and default meta row if not exists; upgrade hourly to the typed ledger."""
+    with db.transaction() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                vessel_name TEXT,
+                created TEXT
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                call_id INTEGER NOT NULL DEFAULT 1,
+                key TEXT,
+                value TEXT,
+                PRIMARY KEY (call_id, key)
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS hourly (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                hour_label TEXT,
+                timestamp TEXT,
+                data TEXT
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS fourh (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                block_label TEXT,
+                timestamp TEXT,
+                data TEXT
+            );
+        """)
+        # single-vessel DBs: meta was keyed on key alone; everything so far becomes call 1
+        if "call_id" not in {r[1] for r in cur.execute("PRAGMA table_info(meta);").fetchall()}:
+            cur.execute("ALTER TABLE meta RENAME TO meta_single;")
+            cur.execute("""
+                CREATE TABLE meta (
+                    call_id INTEGER NOT NULL DEFAULT 1,
+                    key TEXT,
+                    value TEXT,
+                    PRIMARY KEY (call_id, key)
+                );
+            """)
+            cur.execute("INSERT INTO meta (call_id, key, value) SELECT 1, key, value FROM meta_single;")
+            cur.execute("DROP TABLE meta_single;")
+        # hourly is the source of truth: one integer column per position & move type
+        existing = {r[1] for r in cur.execute("PRAGMA table_info(hourly);").fetchall()}
+        for col, decl in LEDGER_COLUMNS:
+            if col not in existing:
+                cur.execute(f"ALTER TABLE hourly ADD COLUMN {col} {decl};")
+        # optimistic concurrency: every meta write bumps the row version
+        if "version" not in {r[1] for r in cur.execute("PRAGMA table_info(meta);").fetchall()}:
+            cur.execute("ALTER TABLE meta ADD COLUMN version INTEGER NOT NULL DEFAULT 0;")
+        if "call_id" not in {r[1] for r in cur.execute("PRAGMA table_info(fourh);").fetchall()}:
+            cur.execute("ALTER TABLE fourh ADD COLUMN call_id INTEGER NOT NULL DEFAULT 1;")
+        existing = {r[1] for r in cur.execute("PRAGMA table_info(fourh);").fetchall()}
+        for col, decl in (("report_date", "TEXT"), ("moves", "BLOB"), ("totals", "BLOB")):
+            if col not in existing:
+                cur.execute(f"ALTER TABLE fourh ADD COLUMN {col} {decl};")
+        migrate_fourh_json(cur)
+        # per-call partitions: every read filters on call_id first
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_hourly_call ON hourly (call_id, id);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_fourh_call ON fourh (call_id, id);")
+        init_summaries(cur)
+        init_change_log(cur)
+        # idle lines as intervals (absolute minutes, see idle.interval); the same line sent on
+        # several reports is stored once
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS idle (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                call_id INTEGER NOT NULL,
+                crane TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                start_at INTEGER NOT NULL,
+                end_at INTEGER NOT NULL,
+                UNIQUE (call_id, start_at, crane, end_at, reason)
+            );
+        """)
+        # ensure at least one call with a cumulative meta exists
+        cur.execute("SELECT COUNT(*) FROM calls;")
+        if not cur.fetchone()[0]:
+            cur.execute("SELECT value FROM meta WHERE call_id = 1 AND key = 'cumulative';")
+            row = cur.fetchone()
+            stored = json.loads(row[0]) if row else DEFAULT_CUMULATIVE
+            cur.execute("INSERT INTO calls (id, vessel_name, created) VALUES (1, ?, ?);",
+                        (stored.get("vessel_name", DEFAULT_CUMULATIVE["vessel_name"]), datetime.now(TZ).isoformat()))
+            if not row:
+                cur.execute("INSERT INTO meta (call_id, key, value) VALUES (1, 'cumulative', ?);",
+                            (_meta_value(DEFAULT_CUMULATIVE),))
+        for call_id, raw in cur.execute("SELECT call_id, value FROM meta WHERE key = 'cumulative';").fetchall():
+            migrate_legacy_cumulative(cur, call_id, raw)
+
+def migrate_legacy_cumulative(cur, call_id, raw):
+    """Old DBs kept done_* totals (and the 4h lists) inside the meta blob.
+
+    Legacy hourly rows only stored hour totals as JSON, so whatever the blob says is done
+    beyond the typed ledger is kept as carried_* and the 4h window starts after those rows.
+    """
+    try:
+        stored = json.loads(raw)
+    except Exception:
+        return
+    if not any(k in stored for k in DERIVED_KEYS):
+        return
+    sums = _ledger_sums(cur, call_id)
+    for g in DONE_FIELDS:
+        stored[f"carried_{g}"] = int(stored.get(f"carried_{g}", 0)) + int(stored.get(f"done_{g}", 0)) - sums[g]
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM hourly WHERE call_id = ?;", (call_id,))
+    stored["fourh_since_id"] = cur.fetchone()[0]
+    cur.execute("INSERT OR REPLACE INTO meta (call_id, key, value) VALUES (?, 'cumulative', ?);",
+                (call_id, _meta_value(stored)))
+
+def migrate_fourh_json(cur):
+    """Imported 4h blocks used to keep their moves and plan lines in the JSON `data`.
+
+    Rows not yet converted get the packed columns and a slimmed `data`; rows in any other
+    shape are left as they are. Runs on every open, so it only reads unconverted rows.
+    """
+    updates = []
+    for row_id, raw in cur.execute("SELECT id, data FROM fourh WHERE moves IS NULL AND data LIKE '%\"moves\"%';"):
+        try:
+            data = json.loads(raw)
+        except Exception:
+            continue
+        if not isinstance(data, dict) or not isinstance(data.get("moves"), dict):
+            continue
+        move_values, totals = data.pop("moves"), data.pop("cumulative", None) or {}
+        updates.append((data.pop("report_date", None), moves.to_bytes(moves.HourRecord.from_fields(move_values).mat),
+                        moves.pack_counts(totals, FOURH_TOTALS), json.dumps(data), row_id))
+    cur.executemany("UPDATE fourh SET report_date = ?, moves = ?, totals = ?, data = ? WHERE id = ?;", updates)
+
+def open_db(path: str) -> vessel_db.Database:
+    """Shared connection with the schema checked / migrated."""
+    db = vessel_db.Database(path)
+    init_db(db)
+    return db
+
+def list_calls(db) -> List[Tuple[int, str]]:
+    """[(call_id, vessel_name)], newest call first."""
+    return db.query("SELECT id, vessel_name FROM calls ORDER BY id DESC;")
+
+def create_call(db, vessel_name: str, berthed_date: str) -> int:
+    """Start a new vessel call with default plans; returns its id."""
+    cum = DEFAULT_CUMULATIVE.copy()
+    cum.update({"vessel_name": vessel_name, "berthed_date": berthed_date})
+    with db.transaction() as cur:
+        cur.execute("INSERT INTO calls (vessel_name, created) VALUES (?, ?);",
+                    (vessel_name, datetime.now(TZ).isoformat()))
+        call_id = cur.lastrowid
+        cur.execute("INSERT INTO meta (call_id, key, value) VALUES (?, 'cumulative', ?);",
+                    (call_id, _meta_value(cum)))
+    return call_id
+
+def reset_call(db, call_id: int) -> None:
+    """Clear one call's ledger, 4h blocks, idle log and settings back to the defaults.
+
+    Other calls are untouched. The call's change readers go too: every series kept for it
+    is dropped by the caller, and readers elsewhere find the journal floor past them.
+    """
+    with db.transaction() as cur:
+        cur.execute("DELETE FROM meta WHERE call_id = ? AND key = 'cumulative';", (call_id,))
+        for table in ("hourly", "fourh", "idle", "hourly_change_readers"):
+            cur.execute(f"DELETE FROM {table} WHERE call_id = ?;", (call_id,))
+        save_cumulative(db, DEFAULT_CUMULATIVE.copy(), call_id)
+
+def load_cumulative(db, call_id: int) -> dict:
+    with db.reading() as cur:
+        cur.execute("SELECT value, version FROM meta WHERE call_id = ? AND key = 'cumulative';", (call_id,))
+        row = cur.fetchone()
+        # done totals = carried + everything in this call's ledger
+        sums = _ledger_sums(cur, call_id)
+        cum = DEFAULT_CUMULATIVE.copy()
+        if row:
+            try:
+                cum.update(json.loads(row[0]))
+            except Exception:
+                pass
+            cum[VERSION_KEY] = row[1]
+        if not cum.get(FORECAST_KEY):  # older rows: start from the ledger tail
+            cum[FORECAST_KEY] = forecast_state(cur, call_id)
+    for g in DONE_FIELDS:
+        cum[f"done_{g}"] = int(cum.get(f"carried_{g}", 0)) + sums[g]
+    return cum
+
+def _meta_version(cur, call_id):
+    cur.execute("SELECT version FROM meta WHERE call_id = ? AND key = 'cumulative';", (call_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def save_cumulative(db, cum: dict, call_id: int) -> None:
+    """Persist meta settings only; done_* totals live in the ledger.
+
+    A cumulative from load_cumulative() carries the row version it was read at, and saving
+    it is a compare-and-swap: StaleMeta if another writer saved in between. Dicts without a
+    version (defaults, merged rows) are written as they are.
+    """
+    expected = cum.get(VERSION_KEY)
+    with db.transaction() as cur:
+        current = _meta_version(cur, call_id)
+        if current is None:
+            cur.execute("INSERT INTO meta (call_id, key, value, version) VALUES (?, 'cumulative', ?, 1);",
+                        (call_id, _meta_value(cum)))
+        elif expected is not None and expected != current:
+            raise StaleMeta(f"call {call_id}: meta is at version {current}, this copy was read at {expected}")
+        else:
+            cur.execute("UPDATE meta SET value = ?, version = version + 1 WHERE call_id = ? AND key = 'cumulative';",
+                        (_meta_value(cum), call_id))
+        cur.execute("UPDATE calls SET vessel_name = ? WHERE id = ?;", (cum.get("vessel_name"), call_id))
+    if VERSION_KEY in cum:
+        cum[VERSION_KEY] = (current or 0) + 1
+
+def update_meta(db, call_id: int, values: dict) -> None:
+    """Write some meta settings (vessel, plans, openings) over what is stored now.
+
+    Read-modify-write inside one transaction, so a deferred settings save cannot undo
+    anything another write (an hour, a 4h reset) stored in the meantime.
+    """
+    with db.transaction() as cur:
+        cur.execute("SELECT value FROM meta WHERE call_id = ? AND key = 'cumulative';", (call_id,))
+        row = cur.fetchone()
+        stored = json.loads(row[0]) if row else {k: v for k, v in DEFAULT_CUMULATIVE.items() if k not in DERIVED_KEYS}
+        stored.update(values)
+        save_cumulative(db, stored, call_id)  # no version: we hold the write lock since the read
+
+def load_fourh_ring(db, call_id: int, since_id: int) -> dict:
+    """Rebuild the rolling 4-hour tracker from the call's last 4 ledger rows after since_id."""
+    rows = db.query(f"SELECT {', '.join(MOVE_FIELDS)} FROM hourly WHERE call_id = ? AND id > ? "
+                    "ORDER BY id DESC LIMIT 4;", (call_id, since_id))[::-1]
+    ring = moves.empty_ring(4)
+    for mat in moves.matrices_from_rows(rows, MOVE_FIELDS):
+        moves.push_hour(ring, mat)
+    return ring
+
+def fourh_row(call_id: int, block_label: str, timestamp: str, report_date: str,
+              move_values: Dict[str, int], totals: Dict[str, int], extra: dict) -> list:
+    """One fourh row in FOURH_COLUMNS order."""
+    return [call_id, block_label, timestamp, report_date, moves.to_bytes(moves.HourRecord.from_fields(move_values).mat),
+            moves.pack_counts(totals, FOURH_TOTALS), json.dumps(extra)]
+
+def load_blocks(db, call_id: int):
+    """Sent 4h blocks of a call, oldest first: (labels, report dates, (n, 4, 6) moves, totals dicts)."""
+    rows = db.query("SELECT block_label, report_date, moves, totals FROM fourh "
+                    "WHERE call_id = ? AND moves IS NOT NULL ORDER BY id;", (call_id,))
+    return ([r[0] for r in rows], [r[1] for r in rows], moves.matrices_from_bytes([r[2] for r in rows]),
+            [moves.unpack_counts(r[3], FOURH_TOTALS) for r in rows])
+
+def restart_fourh_window(db, cum: dict, call_id: int) -> None:
+    """The 4-hour window restarts after the latest ledger row."""
+    with db.transaction() as cur:
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM hourly WHERE call_id = ?;", (call_id,))
+        cum["fourh_since_id"] = cur.fetchone()[0]
+        update_meta(db, call_id, {"fourh_since_id": cum["fourh_since_id"]})
+
+# --------------------------
+# Plain state objects
+# --------------------------
+@dataclass
+class HourInput:
+    """One hour's entry: move counts by field name (missing fields count as 0)."""
+    hour_label: str
+    report_date: date
+    moves: Dict[str, int] = field(default_factory=dict)
+    gearbox: int = 0
+    first_lift: Optional[str] = ""
+    last_lift: Optional[str] = ""
+
+    def row(self) -> Dict[str, int]:
+        return {f: int(self.moves.get(f, 0)) for f in MOVE_FIELDS}
+
+@dataclass
+class ReportState:
+    """Everything a report needs for one call: stored cumulative settings and the 4h ring."""
+    call_id: int
+    cumulative: dict
+    fourh: dict
+    idle: List[dict] = field(default_factory=list)
+
+def load_state(db, call_id: int) -> ReportState:
+    cum = load_cumulative(db, call_id)
+    return ReportState(call_id, cum, load_fourh_ring(db, call_id, int(cum.get("fourh_since_id", 0))))
+
+# --------------------------
+# Hour application
+# --------------------------
+def apply_openings_once(cum: dict, openings: Dict[str, int]) -> None:
+    """Opening balances are "already done" — carry them into done totals (only once)."""
+    if cum.get("_openings_applied", False):
+        return
+    for g in PLAN_GROUPS:
+        opening = int(openings.get(g, 0))
+        cum[f"carried_{g}"] = int(cum.get(f"carried_{g}", 0)) + opening
+        cum[f"done_{g}"] += opening
+    cum["_openings_applied"] = True
+
+def bump_plans(cum: dict, plans: Dict[str, int]) -> Dict[str, int]:
+    """Keep done <= plan by raising any plan that was passed; returns the raised plans."""
+    bumped = {}
+    for g in PLAN_GROUPS:
+        if cum[f"done_{g}"] > int(plans.get(g, 0)):
+            cum[f"planned_{g}"] = bumped[g] = cum[f"done_{g}"]
+    return bumped
+
+def stored_plans(cum: dict) -> Dict[str, int]:
+    return {g: int(cum.get(f"planned_{g}", 0)) for g in PLAN_GROUPS}
+
+def stored_openings(cum: dict) -> Dict[str, int]:
+    return {g: int(cum.get(f"opening_{g}", 0)) for g in PLAN_GROUPS}
+
+def apply_hour(db, state: ReportState, hour: HourInput,
+               plans: Optional[Dict[str, int]] = None,
+               openings: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Add one hour to the call: ledger row + meta in one transaction, then the 4h ring.
+
+    plans / openings default to the stored ones (the app passes its unsaved inputs).
+    Returns any plans that had to be raised to stay >= done.
+    """
+    return apply_hours(db, state, [hour], plans, openings)
+
+def apply_hours(db, state: ReportState, hours: List[HourInput],
+                plans: Optional[Dict[str, int]] = None,
+                openings: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Add hours in the given order: one multi-row insert and one meta write, one transaction.
+
+    `state` only changes once the transaction is in, so a failed batch leaves the DB and
+    the in-memory totals as they were. Several sessions can add hours to one call: a
+    session whose copy is out of date merges onto the stored row instead of overwriting it.
+    """
+    if not hours:
+        return {}
+    for hour in hours:
+        check_hour(hour)
+    with db.transaction() as cur:
+        _require_call(cur, state.call_id)
+        # optimistic check: if another session saved meta since `state` was loaded, start from
+        # the stored row (and the full ledger) instead; hours are deltas, so nothing is lost
+        stale = state.cumulative.get(VERSION_KEY) != _meta_version(cur, state.call_id)
+        if stale:
+            cum = load_cumulative(db, state.call_id)
+            cum.update({k: state.cumulative[k] for k in SESSION_KEYS if k in state.cumulative})
+        else:
+            cum = dict(state.cumulative)
+        bumped = _add_hours(cur, db, state.call_id, cum, hours, plans, openings)
+    state.cumulative.update(cum)
+    if stale:
+        # the 4h ring also missed the other session's hours: rebuild it (ours are in the ledger)
+        state.fourh.update(load_fourh_ring(db, state.call_id, int(cum.get("fourh_since_id", 0))))
+    else:
+        rows = [[h.row()[f] for f in MOVE_FIELDS] for h in hours]
+        for mat in moves.matrices_from_rows(rows, MOVE_FIELDS):
+            moves.push_hour(state.fourh, mat)
+    return bumped
+
+def _add_hours(cur, db, call_id, cum, hours, plans, openings):
+    """Insert the rows and save `cum` (current as of this transaction) with the hours added."""
+    apply_openings_once(cum, stored_openings(cum) if openings is None else openings)
+    stamp = datetime.now(TZ).isoformat()
+    rows = []
+    # ETC: hours after the latest one move the EWMA in O(1) each; an earlier or repeated
+    # hour (backfill, re-entry) re-reads the last forecast.TAIL hours instead
+    fc = cum.get(FORECAST_KEY)
+    fc = {**fc, "rate": list(fc["rate"])} if fc else None
+    for hour in hours:
+        row = hour.row()
+        for g, fields in DONE_FIELDS.items():
+            cum[f"done_{g}"] += sum(row[f] for f in fields)
+        key = aggregate.hour_key(hour.report_date, int(hour.hour_label[:2]))
+        if fc is not None and (fc["last"] is None or key > fc["last"]):
+            forecast.update(fc, key, _box_moves(row))
+        else:
+            fc = None
+        row.update({
+            "call_id": call_id,
+            "hour_label": hour.hour_label,
+            "timestamp": stamp,
+            "report_date": hour.report_date.isoformat(),
+            "gearbox": int(hour.gearbox or 0),
+            "first_lift": hour.first_lift,
+            "last_lift": hour.last_lift,
+        })
+        rows.append(row)
+    bumped = bump_plans(cum, stored_plans(cum) if plans is None else plans)
+    cum["last_hour"] = hours[-1].hour_label
+
+    # ledger rows + meta commit together, so a crash can neither lose nor double-count an hour
+    cols = list(rows[0])
+    cur.executemany(f"INSERT INTO hourly ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))});",
+                    [[r[c] for c in cols] for r in rows])
+    cum[FORECAST_KEY] = fc if fc is not None else forecast_state(cur, call_id)
+    save_cumulative(db, cum, call_id)
+    return bumped
+
+def ledger_hours(db, call_id: int) -> set:
+    """(report_date ISO, hour_label) of every hour already in the call's ledger."""
+    return set(db.query("SELECT report_date, hour_label FROM hourly WHERE call_id = ?;", (call_id,)))
+
+# --------------------------
+# Idle / delay intervals
+# --------------------------
+def save_idle(db, call_id: int, report_date: date, entries: Iterable[dict]) -> int:
+    """Store a report's idle lines (times parsed once); returns how many were new."""
+    rows = []
+    for e in entries:
+        span = idle_index.interval(report_date, e.get("start"), e.get("end"))
+        if span is not None:
+            rows.append((call_id, (e.get("crane") or "").strip(), (e.get("delay") or e.get("reason") or "").strip(), *span))
+    with db.transaction() as cur:
+        before = db.conn.total_changes
+        cur.executemany("INSERT OR IGNORE INTO idle (call_id, crane, reason, start_at, end_at) VALUES (?, ?, ?, ?, ?);",
+                        rows)
+        return db.conn.total_changes - before
+
+def load_idle(db, call_ids: Optional[Iterable[int]] = None) -> idle_index.IdleIndex:
+    """Stored idle intervals of the given calls (all calls by default)."""
+    sql, params = "SELECT call_id, crane, reason, start_at, end_at FROM idle", ()
+    if call_ids is not None:
+        params = list(call_ids)
+        sql += f" WHERE call_id IN ({', '.join('?' * len(params))})"
+    return idle_index.IdleIndex(db.query(sql + ";", params))
+
+# --------------------------
+# Corrections: edit / delete / undo one ledger row
+# --------------------------
+@dataclass
+class LedgerEntry:
+    """A saved hour as stored, with its ledger id."""
+    id: int
+    hour: HourInput
+
+ENTRY_COLUMNS = (f"id, COALESCE(report_date, substr(timestamp, 1, 10)), hour_label, "
+                 f"{', '.join(MOVE_FIELDS)}, gearbox, first_lift, last_lift")
+
+def _ledger_entry(r) -> LedgerEntry:
+    n = len(MOVE_FIELDS)
+    return LedgerEntry(r[0], HourInput(r[2], date.fromisoformat(r[1]), dict(zip(MOVE_FIELDS, r[3:3 + n])),
+                                       r[3 + n], r[4 + n], r[5 + n]))
+
+def ledger_entries(db, call_id: int, limit: int = 24) -> List[LedgerEntry]:
+    """The call's most recent ledger rows, newest first."""
+    rows = db.query(f"SELECT {ENTRY_COLUMNS} FROM hourly WHERE call_id = ? ORDER BY id DESC LIMIT ?;",
+                    (call_id, limit))
+    return [_ledger_entry(r) for r in rows]
+
+def ledger_entry(db, call_id: int, hour_id: int) -> Optional[LedgerEntry]:
+    """One saved hour by its ledger id (None if the call has no such hour)."""
+    row = db.query_one(f"SELECT {ENTRY_COLUMNS} FROM hourly WHERE id = ? AND call_id = ?;", (hour_id, call_id))
+    return _ledger_entry(row) if row else None
+
+def edit_hour(db, state: ReportState, hour_id: int, hour: HourInput) -> Dict[str, int]:
+    """Replace a saved hour's values; returns any plans raised to stay >= done."""
+    check_hour(hour)
+    row = hour.row()
+    row.update({"hour_label": hour.hour_label, "report_date": hour.report_date.isoformat(),
+                "gearbox": int(hour.gearbox or 0), "first_lift": hour.first_lift, "last_lift": hour.last_lift})
+    with db.transaction() as cur:
+        cur.execute(f"UPDATE hourly SET {', '.join(f'{c} = ?' for c in row)} WHERE id = ? AND call_id = ?;",
+                    [*row.values(), hour_id, state.call_id])
+        return _after_correction(cur, db, state, hour_id)
+
+def delete_hour(db, state: ReportState, hour_id: int) -> None:
+    """Take a saved hour out of the ledger (and so out of every total)."""
+    with db.transaction() as cur:
+        cur.execute("DELETE FROM hourly WHERE id = ? AND call_id = ?;", (hour_id, state.call_id))
+        _after_correction(cur, db, state, hour_id)
+
+def undo_last_hour(db, state: ReportState) -> Optional[LedgerEntry]:
+    """Delete the call's most recently saved hour; returns it (None if the ledger is empty)."""
+    with db.transaction():
+        last = ledger_entries(db, state.call_id, limit=1)
+        if last:
+            delete_hour(db, state, last[0].id)
+    return last[0] if last else None
+
+def _after_correction(cur, db, state, hour_id):
+    """Triggers already moved the summaries; reload `state` from them (one row, not a rescan).
+
+    The meta row is saved too, so its version moves and other sessions holding this call
+    merge onto the corrected totals instead of their own.
+    """
+    if not cur.rowcount:
+        raise ValueError(f"call {state.call_id} has no saved hour {hour_id}")
+    cum = load_cumulative(db, state.call_id)
+    cum.update({k: state.cumulative[k] for k in SESSION_KEYS if k in state.cumulative})
+    cum[FORECAST_KEY] = forecast_state(cur, state.call_id)
+    bumped = bump_plans(cum, stored_plans(cum))
+    save_cumulative(db, cum, state.call_id)
+    state.cumulative.update(cum)
+    # the 4h ring only holds the last 4 rows: re-reading them is cheaper than working out a delta
+    state.fourh.update(load_fourh_ring(db, state.call_id, int(cum.get("fourh_since_id", 0))))
+    return bumped
+
+# --------------------------
+# Windows over the ledger
+# --------------------------
+# a reader not heard from in this long no longer holds the journal back
+CHANGE_READER_TTL = 7 * 24 * 3600
+
+def load_series(db, call_id: int, series: Optional[aggregate.MoveSeries] = None) -> aggregate.MoveSeries:
+    """Prefix-sum series for a call; pass an existing one to fold in only newer rows and
+    the deltas of hours edited or deleted since it was last read.
+
+    A series passed in is kept for later top-ups, so how far it has read the change journal
+    is recorded and the rows every such series has read are trimmed.
+    """
+    kept = series is not None
+    series = series if kept else aggregate.MoveSeries()
+    with db.snapshot() as cur:  # all reads from one committed state
+        floor = cur.execute("SELECT seq FROM hourly_changes_floor WHERE call_id = ?;", (call_id,)).fetchone()
+        floor = floor[0] if floor else 0
+        if series.last_id and series.last_change < floor:
+            series.clear()  # deltas it still needed were trimmed: read the ledger afresh
+        changes = cur.execute(f"SELECT seq, hour_id, report_date, hour_label, hours, {', '.join(MOVE_FIELDS)} "
+                              "FROM hourly_changes WHERE call_id = ? AND seq > ? ORDER BY seq;",
+                              (call_id, series.last_change)).fetchall()
+        rows = cur.execute(f"SELECT id, COALESCE(report_date, substr(timestamp, 1, 10)), hour_label, "
+                           f"{', '.join(MOVE_FIELDS)} FROM hourly WHERE call_id = ? AND id > ? ORDER BY id;",
+                           (call_id, series.last_id)).fetchall()
+    series.apply_changes(changes, MOVE_FIELDS)  # before extend_rows moves last_id on
+    series.extend_rows(rows, MOVE_FIELDS)
+    series.last_change = max(series.last_change, floor)
+    if kept:
+        _report_reader(db, call_id, series)
+    return series
+
+def _report_reader(db, call_id: int, series: aggregate.MoveSeries):
+    """Record how far `series` has read the change journal and trim what every reader is past.
+
+    Only writes when the series moved on or its record is half-way to expiring, so an
+    unchanged rerun stays read-only.
+    """
+    now = time.time()
+    if (series.reported is not None and series.reported[0] == series.last_change
+            and now - series.reported[1] < CHANGE_READER_TTL / 2):
+        return
+    with db.transaction() as cur:
+        cur.execute("INSERT OR REPLACE INTO hourly_change_readers (call_id, reader, seq, seen) VALUES (?, ?, ?, ?);",
+                    (call_id, series.reader, series.last_change, now))
+        cur.execute("DELETE FROM hourly_change_readers WHERE call_id = ? AND reader != ? AND seen < ?;",
+                    (call_id, series.reader, now - CHANGE_READER_TTL))
+        upto = cur.execute("SELECT MIN(seq) FROM hourly_change_readers WHERE call_id = ?;", (call_id,)).fetchone()[0]
+        cur.execute("DELETE FROM hourly_changes WHERE call_id = ? AND seq <= ?;", (call_id, upto))
+        cur.execute("INSERT INTO hourly_changes_floor (call_id, seq) VALUES (?, ?) "
+                    "ON CONFLICT (call_id) DO UPDATE SET seq = MAX(seq, excluded.seq);", (call_id, upto))
+    series.reported = (series.last_change, now)
+
+def latest_hour(db, call_id: int) -> Optional[Tuple[date, int]]:
+    """(report date, start hour) of the latest hour in the ledger, from the summary rows."""
+    row = db.query_one("SELECT MAX(bucket) FROM hourly_summary WHERE call_id = ? AND grain = 'hour';", (call_id,))
+    if not row or not row[0] or len(row[0]) < 13:
+        return None
+    return date.fromisoformat(row[0][:10]), int(row[0][11:13])
+
+# window kinds a summary row answers on its own
+SUMMARY_KINDS = ("shift", "day", "call")
+
+def summary_window(db, call_id: int, kind: str, day: Optional[date] = None, shift: Optional[str] = None):
+    """(4, 6) totals and hour count for a shift, day or whole call: one summary row, no scan."""
+    if kind == "shift":
+        grain, bucket = f"shift:{shift}", day.isoformat()
+    elif kind == "day":
+        grain, bucket = "day", day.isoformat()
+    elif kind == "call":
+        grain, bucket = "call", ""
+    else:
+        raise ValueError(f"no summary for window kind: {kind}")
+    row = db.query_one(f"SELECT {', '.join(MOVE_FIELDS)}, hours FROM hourly_summary "
+                       "WHERE call_id = ? AND grain = ? AND bucket = ?;", (call_id, grain, bucket))
+    if row is None:
+        return moves.matrix_from([0] * len(MOVE_FIELDS), MOVE_FIELDS), 0
+    return moves.matrix_from(list(row[:-1]), MOVE_FIELDS), row[-1]
+
+def compute_window(series: aggregate.MoveSeries, kind: str, day: Optional[date] = None,
+                   hours: int = 4, shift: Optional[str] = None,
+                   end_day: Optional[date] = None, start_hour: int = 0, end_hour: int = 24):
+    """(4, 6) totals and hour count for kind = rolling | shift | day | call | custom."""
+    if kind == "rolling":
+        return series.rolling(hours)
+    if kind == "shift":
+        return series.shift(day, shift)
+    if kind == "day":
+        return series.day(day)
+    if kind == "call":
+        return series.call()
+    if kind == "custom":
+        return series.custom(day, start_hour, end_day or day, end_hour)
+    raise ValueError(f"unknown window kind: {kind}")
+
+# --------------------------
+# Rendering
+# --------------------------
+def report_values(cum: dict, move_values: Dict[str, int], report_date: date,
+                  plans: Optional[Dict[str, int]] = None, **extra) -> dict:
+    """Flat slot values for templates: heading, plan / done / remain, then the given moves.
+
+    plans may hold the raw input values (shown as entered); remain uses their int value.
+    """
+    plans = {g: cum.get(f"planned_{g}", 0) for g in PLAN_GROUPS} if plans is None else plans
+    vals = {"vessel_name": cum.get("vessel_name"), "berthed_date": cum.get("berthed_date"),
+            "date": report_date.strftime("%d/%m/%Y")}
+    for g in PLAN_GROUPS:
+        vals[f"planned_{g}"] = plans[g]
+        vals[f"done_{g}"] = cum[f"done_{g}"]
+        vals[f"remain_{g}"] = int(plans.get(g, 0)) - cum[f"done_{g}"]
+    vals["etc"] = forecast.etc_text(estimate_completion(cum, plans))
+    vals.update(move_values)
+    vals.update(extra)
+    return vals
+
+def estimate_completion(cum: dict, plans: Optional[Dict[str, int]] = None) -> Optional[dict]:
+    """ETC for the box moves still to do (plan - done per group, never below 0); see forecast.estimate."""
+    plans = stored_plans(cum) if plans is None else plans
+    remaining = sum(max(int(plans.get(g, 0)) - cum[f"done_{g}"], 0) for g in PLAN_GROUPS)
+    return forecast.estimate(cum.get(FORECAST_KEY), remaining)
+
+def render_hourly(state: ReportState, hour: HourInput, idle: Iterable[dict] = ()) -> str:
+    values = report_values(state.cumulative, hour.row(), hour.report_date, hour=hour.hour_label,
+                           gearbox=hour.gearbox, first_lift=hour.first_lift, last_lift=hour.last_lift)
+    return templates.HOURLY.render(values, idle or state.idle)
+
+def render_4h(state: ReportState, block: str, report_date: date,
+              move_values: Optional[Dict[str, int]] = None, idle: Iterable[dict] = ()) -> str:
+    """4-hour report from the state's ring (or from explicit / manual totals)."""
+    if move_values is None:
+        move_values = moves.as_fields(moves.window_sum(state.fourh))
+    values = report_values(state.cumulative, move_values, report_date, block=block)
+    return templates.FOUR_HOUR.render(values, idle or state.idle)
+
+def render_window(state: ReportState, mat, n_hours: int, report_date: date, label: Optional[str] = None) -> str:
+    """Shift / period report, or the end-of-call report when label is None."""
+    values = report_values(state.cumulative, moves.as_fields(mat), report_date)
+    if label is None:
+        return templates.END_OF_CALL.render(dict(values, hours=n_hours))
+    return templates.SHIFT.render(dict(values, window=label))
@@ -0,0 +1,87 @@
+# templates.py — monospace WhatsApp report layouts, compiled once and memoised
+from functools import lru_cache
+from string import Formatter
+
+SEP = "_________________________"
+POS_ROWS = [("FWD", "fwd"), ("MID", "mid"), ("AFT", "aft"), ("POOP", "poop")]
+HATCH_ROWS = POS_ROWS[:3]
+
+def _grid(header, rows, lead, gap):
+    """Column header plus one fixed-width row per (label, left slot, right slot)."""
+    return [header] + [f"{label:<{lead}}{{{a}:>5}}{' ' * gap}{{{b}:>5}}" for label, a, b in rows]
+
+def _moves(header):
+    return (["*Crane Moves*"] + _grid(header, [(l, f"{p}_load", f"{p}_disch") for l, p in POS_ROWS], 10, 5)
+            + [SEP, "*Restows*"]
+            + _grid(header, [(l, f"{p}_restow_load", f"{p}_restow_disch") for l, p in POS_ROWS], 10, 5))
+
+def _cumulative(title, restow_header):
+    def plan_rows(g1, g2):
+        return [("Plan", f"planned_{g1}", f"planned_{g2}"), ("Done", f"done_{g1}", f"done_{g2}"),
+                ("Remain", f"remain_{g1}", f"remain_{g2}")]
+    return ([SEP, title, SEP] + _grid("           Load   Disch", plan_rows("load", "disch"), 11, 6)
+            + [SEP, "*Restows*"] + _grid(restow_header, plan_rows("restow_load", "restow_disch"), 11, 6))
+
+def _hatch(header, lead, gap):
+    rows = [(l, f"hatch_{p}_open", f"hatch_{p}_close") for l, p in HATCH_ROWS]
+    return [SEP, "*Hatch Moves*"] + _grid(header, rows, lead, gap)
+
+# Every block a report can use; each layout below is an ordered pick from these.
+SECTIONS = {
+    "heading":      ["{vessel_name}", "Berthed {berthed_date}", "", "Date: {date}"],
+    "hour":         ["Hour: {hour}"],
+    "block":        ["4-Hour Block: {block}"],
+    "window":       ["Period: {window}"],
+    "call_span":    ["Hours Worked: {hours}"],
+    "lifts":        [SEP, "*First Lift:* {first_lift}    *Last Lift:* {last_lift}"],
+    "moves_hour":   [SEP, "   *HOURLY MOVES*", SEP] + _moves("           Load   Discharge"),
+    "moves_4h":     [SEP, "   *HOURLY MOVES*", SEP] + _moves("           Load    Discharge"),
+    "moves_shift":  [SEP, "   *SHIFT MOVES*", SEP] + _moves("           Load    Discharge"),
+    "moves_call":   [SEP, "   *CALL TOTAL MOVES*", SEP] + _moves("           Load    Discharge"),
+    "gearbox":      [SEP, "*Gearbox*", "Total Gearboxes (hour): {gearbox}"],
+    "cum_hour":     _cumulative("      *CUMULATIVE*", "           Load   Disch"),
+    "cum_4h":       _cumulative("      *CUMULATIVE* (from hourly saved entries)", "           Load    Disch"),
+    "hatch_hour":   _hatch("           Open   Close", 10, 6),
+    "hatch_4h":     _hatch("             Open         Close", 13, 10),
+    "etc":          [SEP, "*ETC:* {etc}"],
+    "idle":         [SEP, "*Idle / Delays*"],
+}
+
+# section name -> (format string, slot names it reads)
+_COMPILED = {}
+for _name, _lines in SECTIONS.items():
+    _fmt = "\n".join(_lines) + "\n"
+    _COMPILED[_name] = (_fmt, tuple(dict.fromkeys(f for _, f, _, _ in Formatter().parse(_fmt) if f)))
+
+@lru_cache(maxsize=512)
+def _render_section(name, key):
+    """One section for one set of slot values; unchanged sections come straight from here."""
+    fmt, slots = _COMPILED[name]
+    return fmt.format_map(dict(zip(slots, key)))
+
+def _idle_lines(idle):
+    return "".join(f"{i+1}. {crane} {start}-{end} : {delay}\n" for i, (crane, start, end, delay) in enumerate(idle))
+
+class Layout:
+    """An ordered list of sections; render() takes a flat dict of slot values."""
+
+    def __init__(self, *sections):
+        self.sections = sections
+        self.slots = tuple(dict.fromkeys(s for name in sections for s in _COMPILED[name][1]))
+        self._render = lru_cache(maxsize=64)(self._render_key)
+
+    def _render_key(self, key, idle):
+        values = dict(zip(self.slots, key))
+        text = "".join(_render_section(name, tuple(values[s] for s in _COMPILED[name][1]))
+                       for name in self.sections)
+        return text + _idle_lines(idle) if "idle" in self.sections else text
+
+    def render(self, values, idle_entries=()):
+        """Report text; the same inputs (the fingerprint) return the memoised string."""
+        idle = tuple((e["crane"], e["start"], e["end"], e["delay"]) for e in idle_entries)
+        return self._render(tuple(values[s] for s in self.slots), idle)
+
+HOURLY = Layout("heading", "hour", "lifts", "moves_hour", "gearbox", "cum_hour", "hatch_hour", "etc", "idle")
+FOUR_HOUR = Layout("heading", "block", "moves_4h", "cum_4h", "hatch_4h", "etc", "idle")
+SHIFT = Layout("heading", "window", "moves_shift", "hatch_4h", "cum_4h")
+END_OF_CALL = Layout("heading", "call_span", "moves_call", "hatch_4h", "cum_4h")
@@ -0,0 +1,42 @@
+from datetime import date
+
+import numpy as np
+
+import aggregate
+import moves
+
+DAY = date(2025, 8, 14)
+
+def _mat(fwd_load):
+    return moves.HourRecord.from_fields({"fwd_load": fwd_load}).mat
+
+def _fwd_load(result):
+    mat, n = result
+    return int(mat[0, 0]), n
+
+def test_out_of_order_add_matches_sorted_add():
+    hours = [(9, 4), (6, 1), (8, 3), (6, 10), (7, 2), (12, 5), (5, 7)]
+    shuffled, ordered = aggregate.MoveSeries(), aggregate.MoveSeries()
+    for h, n in hours:
+        shuffled.add(aggregate.hour_key(DAY, h), _mat(n))
+    for h, n in sorted(hours):
+        ordered.add(aggregate.hour_key(DAY, h), _mat(n))
+    assert shuffled.keys == ordered.keys
+    assert np.array_equal(shuffled.prefix[:len(hours) + 1], ordered.prefix[:len(hours) + 1])
+    assert np.array_equal(shuffled.counts[:len(hours) + 1], ordered.counts[:len(hours) + 1])
+    assert _fwd_load(shuffled.call()) == (32, 7)
+    assert _fwd_load(shuffled.shift(DAY, "Day 06h00 - 14h00")) == (25, 6)  # both 06h hours count
+    assert _fwd_load(shuffled.custom(DAY, 6, DAY, 8)) == (13, 3)
+    assert _fwd_load(shuffled.rolling(4)) == (9, 2)  # 09h up to and including 12h
+    assert shuffled.latest_key() == aggregate.hour_key(DAY, 12)
+
+def test_out_of_order_correction_delta():
+    series = aggregate.MoveSeries()
+    for h in (6, 7, 8):
+        series.add(aggregate.hour_key(DAY, h), _mat(10))
+    # the 07h hour corrected 10 -> 4: its old values come off at its own key, after later hours
+    series.add(aggregate.hour_key(DAY, 7), -_mat(10), -1)
+    series.add(aggregate.hour_key(DAY, 7), _mat(4))
+    assert _fwd_load(series.call()) == (24, 3)
+    assert _fwd_load(series.custom(DAY, 7, DAY, 8)) == (4, 1)
+    assert _fwd_load(series.custom(DAY, 8, DAY, 9)) == (10, 1)
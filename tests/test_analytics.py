@@ -0,0 +1,30 @@
+import numpy as np
+
+import analytics
+import idle
+
+def _hours(*rows):
+    return analytics.from_records([dict(r) for r in rows])
+
+def test_fully_idle_hour_is_not_taken_out_twice():
+    # FWD: 30 moves in hour 1, hour 2 lost to a 60-minute stoppage
+    row_calls, mats = _hours({"fwd_load": 30}, {})
+    index = idle.IdleIndex([(0, "FWD", "Crane break down", 7 * 60, 8 * 60)])
+    kpis = analytics.productivity(row_calls, mats, analytics.idle_arrays(index))
+    assert kpis["crane_hours"][0, 0] == 2
+    assert kpis["gross"][0, 0] == 15
+    assert kpis["net"][0, 0] == 30
+
+def test_idle_without_position_only_counts_for_the_vessel():
+    row_calls, mats = _hours({"fwd_load": 20, "aft_disch": 20}, {"fwd_load": 20, "aft_disch": 20})
+    index = idle.IdleIndex([(0, "Crane 3", "Awaiting cargo", 0, 60)])
+    kpis = analytics.productivity(row_calls, mats, analytics.idle_arrays(index))
+    assert np.allclose(kpis["net"][0], [20, 0, 20, 0])
+    assert kpis["idle_unassigned_hours"][0] == 1
+    assert kpis["vessel_net"][0] == 80 / 3
+
+def test_positions_that_never_worked_have_no_crane_hours():
+    row_calls, mats = _hours({"mid_load": 5}, {"mid_load": 5}, {})
+    kpis = analytics.productivity(row_calls, mats)
+    assert kpis["crane_hours"][0].tolist() == [0, 3, 0, 0]
+    assert kpis["gross"][0].tolist() == [0, 10 / 3, 0, 0]
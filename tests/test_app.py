@@ -0,0 +1,164 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+streamlit = pytest.importorskip("streamlit")
+import streamlit.logger
+from streamlit.testing.v1 import AppTest
+
+import aggregate
+import metrics
+import record_store
+import report_core
+import vessel_db
+import write_behind
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(REPO, "WhatsApp_Report.py")
+JSON_APP = os.path.join(REPO, "whatsapp_report.py")
+
+def _instances(monkeypatch, cls):
+    """Every `cls` built from now on (the apps keep theirs in st.cache_resource)."""
+    made = []
+    init = cls.__init__
+
+    def capture(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        made.append(self)
+
+    monkeypatch.setattr(cls, "__init__", capture)
+    return made
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    """Run the apps on fresh files in tmp_path, with nothing cached from another test."""
+    monkeypatch.chdir(tmp_path)
+    streamlit.cache_resource.clear()
+    streamlit.cache_data.clear()
+    writers = _instances(monkeypatch, write_behind.WriteBehind)
+    yield tmp_path
+    for w in writers:
+        w.flush()  # background saves land here, not wherever the cwd is restored to
+    streamlit.cache_resource.clear()
+    streamlit.cache_data.clear()
+
+@pytest.fixture
+def statements(app_dir, monkeypatch):
+    """SQL run by the DB app."""
+    seen = []
+    real_connect = sqlite3.connect
+
+    def connect(*args, **kwargs):
+        conn = real_connect(*args, **kwargs)
+        conn.set_trace_callback(seen.append)
+        return conn
+
+    monkeypatch.setattr(vessel_db.sqlite3, "connect", connect)
+    return seen
+
+def _app():
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    assert not at.exception
+    return at
+
+def test_unchanged_rerun_reads_nothing(statements):
+    at = _app()
+    at.number_input(key="hr_fwd_load").set_value(5).run()
+    [b for b in at.button if "Generate Hourly" in b.label][0].click().run()
+    at.run()  # a save moves the generation once more (the series records its read)
+    statements.clear()
+    at.run()
+    assert not at.exception
+    assert [s for s in statements if "data_version" not in s] == []
+
+def test_json_app_leaves_the_shared_store_to_the_log(app_dir, monkeypatch):
+    stores = _instances(monkeypatch, record_store.RecordStore)
+    at = AppTest.from_file(JSON_APP, default_timeout=60)
+    at.run()
+    [t for t in at.text_input if t.label == "Vessel Name"][0].set_value("MSC SESSION").run()
+    assert not at.exception
+    # whatever this session typed reaches the shared dict only through the log
+    store = stores[0]
+    with store.lock:
+        assert store.data == record_store.RecordStore(store.path).load()
+
+def test_json_app_settings_never_set_the_totals(app_dir, monkeypatch):
+    writers = _instances(monkeypatch, write_behind.WriteBehind)
+    at = AppTest.from_file(JSON_APP, default_timeout=60)
+    at.run()
+    at.number_input(key="h_fwd_load").set_value(3).run()
+    [b for b in at.button if b.label == "Save Hourly Entry"][0].click().run()
+    at.run()
+    assert not at.exception
+    writers[0].flush()
+    with open(app_dir / "vessel_report.jsonl") as f:
+        ops = [json.loads(line) for line in f]
+    assert all(not k.startswith("done_") and k != "hourly_last_saved"
+               for op in ops if op["op"] == "set" for k in op["values"])
+    assert sum(op.get("add", {}).get("done_load", 0) for op in ops) == 3
+
+def _button(at, label):
+    return [b for b in at.button if b.label.startswith(label)][0]
+
+def test_master_reset_asks_before_clearing_the_call(statements):
+    at = _app()
+    at.number_input(key="planned_load").set_value(900).run()
+    at.number_input(key="hr_fwd_load").set_value(5).run()
+    _button(at, "✅ Generate Hourly").click().run()
+    _button(at, "🚨 MASTER RESET").click().run()
+    assert at.warning and at.session_state["confirm_master_reset"]
+    _button(at, "Cancel").click().run()
+    assert "confirm_master_reset" not in at.session_state
+    db = vessel_db.Database("vessel_report.db")
+    assert db.query_one("SELECT COUNT(*) FROM hourly;")[0] == 1
+
+    _button(at, "🚨 MASTER RESET").click().run()
+    _button(at, "🚨 Yes, clear everything").click().run()
+    assert not at.exception
+    assert db.query_one("SELECT COUNT(*) FROM hourly;")[0] == 0
+    assert at.session_state["planned_load"] == report_core.DEFAULT_CUMULATIVE["planned_load"]
+    assert "confirm_master_reset" not in at.session_state
+    db.close()
+
+def test_fragment_callbacks_toast_from_the_fragment(statements, caplog, monkeypatch):
+    monkeypatch.setattr(streamlit.logger.get_logger("root"), "propagate", True)  # into caplog
+    at = _app()
+    at.number_input(key="hr_fwd_load").set_value(5).run()
+    _button(at, "✅ Generate Hourly").click().run()
+    _button(at, "⏬ Populate 4-Hourly").click().run()
+    assert [t.value for t in at.toast] == ["Manual 4-hour inputs populated from hourly tracker; manual override enabled."]
+    _button(at, "🔄 Reset 4-Hourly").click().run()
+    assert [t.value for t in at.toast] == ["4-hourly tracker reset."]
+    assert not at.exception
+    assert "callback that displays" not in caplog.text
+
+def test_window_queries_hold_the_series_lock(statements, monkeypatch):
+    held = []
+    for kind in ("rolling", "custom"):
+        query = getattr(aggregate.MoveSeries, kind)
+
+        def locked(self, *args, _query=query):
+            held.append(self.lock.locked())  # another session's top-up re-sums the arrays in place
+            return _query(self, *args)
+
+        monkeypatch.setattr(aggregate.MoveSeries, kind, locked)
+    at = _app()
+    at.radio(key="agg_window").set_value("Rolling hours").run()
+    at.radio(key="agg_window").set_value("Custom range").run()
+    assert not at.exception
+    assert len(held) >= 2 and all(held)
+
+def test_diag_shows_this_rerun_and_metrics_file_gets_a_line(app_dir, monkeypatch):
+    monkeypatch.setenv(metrics.METRICS_ENV, str(app_dir / "metrics.jsonl"))
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.query_params["diag"] = "1"
+    at.run()
+    assert not at.exception
+    shown = [c.value for c in at.code if "total (app)" in c.value]
+    assert len(shown) == 1 and "hourly_send_panel" in shown[0] and "db_connect" in shown[0]
+    with open(app_dir / "metrics.jsonl") as f:
+        runs = [json.loads(line) for line in f]
+    assert runs[-1]["run"] == "app" and {"hourly_send_panel", "fourh_panel"} <= {s["name"] for s in runs[-1]["spans"]}
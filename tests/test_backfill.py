@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+
+import backfill
+import report_core
+
+DAY = date(2025, 8, 14)
+
+def _hour(label, day=DAY):
+    return report_core.HourInput(label, day, {"fwd_load": 1})
+
+@pytest.mark.parametrize("text, label", [("6", "06h00 - 07h00"), ("06h00", "06h00 - 07h00"),
+                                         ("23", "23h00 - 00h00"), (" 06h00 - 07h00 ", "06h00 - 07h00")])
+def test_parse_hour_takes_the_label_or_its_start(text, label):
+    assert backfill.parse_hour(text) == label
+
+@pytest.mark.parametrize("text", ["24", "6h00 - 7h00", "06h00 - 08h00", "x", ""])
+def test_parse_hour_rejects_what_report_core_rejects(text):
+    with pytest.raises(report_core.InvalidHour):
+        backfill.parse_hour(text)
+
+def test_parse_csv_reports_every_bad_row_by_line():
+    text = ("﻿Date,Hour,FWD_LOAD,gearbox\n"
+            "2025-08-14,6,3,1\n"
+            "14/08/2025,07h00 - 08h00,,\n"
+            ",,,\n"
+            "2025-08-14,07h00 - 09h00,2,0\n"
+            "2025-13-01,8,2,0\n"
+            "2025-08-14,9,-1,0\n")
+    hours, problems = backfill.parse_csv(text)
+    assert [(h.report_date, h.hour_label, h.moves["fwd_load"], h.gearbox) for h in hours] == [
+        (DAY, "06h00 - 07h00", 3, 1), (DAY, "07h00 - 08h00", 0, 0)]
+    assert [p.split(":")[0] for p in problems] == ["line 5", "line 6", "line 7"]  # line 4 is blank
+    assert "bad hour label '07h00 - 09h00'" in problems[0]
+    assert "bad date" in problems[1] and "fwd_load must be a whole number" in problems[2]
+
+def test_parse_csv_checks_the_header_first():
+    assert backfill.parse_csv("date,fwd_lod\n2025-08-14,3\n") == (
+        [], ["unknown column(s): fwd_lod", "missing column(s): hour"])
+
+def test_template_csv_parses_clean():
+    hours, problems = backfill.parse(backfill.template_csv())
+    assert problems == [] and len(hours) == 1 and hours[0].hour_label == "06h00 - 07h00"
+
+def test_report_text_takes_hourly_reports_only(tmp_path):
+    db = report_core.open_db(str(tmp_path / "vessel.db"))
+    state = report_core.load_state(db, 1)
+    hour = report_core.HourInput("06h00 - 07h00", DAY, {"fwd_load": 3})
+    report_core.apply_hours(db, state, [hour])
+    text = report_core.render_hourly(state, hour, []) + "\n" + report_core.render_4h(state, "06h00 - 10h00", DAY)
+    db.close()
+    hours, problems = backfill.parse(text)
+    assert [(h.hour_label, h.moves["fwd_load"]) for h in hours] == [("06h00 - 07h00", 3)]
+    assert len(problems) == 1 and "4-hour report 06h00 - 10h00" in problems[0]
+    assert backfill.parse("nothing here") == ([], ["no 'Hour:' lines found"])
+
+def test_check_batch_and_order():
+    hours = [_hour("08h00 - 09h00"), _hour("23h00 - 00h00", date(2025, 8, 13)), _hour("06h00 - 07h00"),
+             _hour("08h00 - 09h00")]
+    saved = {(DAY.isoformat(), "06h00 - 07h00")}
+    assert backfill.check_batch(hours, saved) == ["14/08/2025 06h00 - 07h00 is already saved for this call",
+                                                  "14/08/2025 08h00 - 09h00 appears more than once"]
+    assert [(h.report_date.day, h.hour_label[:2]) for h in backfill.in_order(hours)] == [
+        (13, "23"), (14, "06"), (14, "08"), (14, "08")]
@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+
+import chatlog
+import report_core
+
+DAY = date(2025, 8, 14)
+WINDBOUND = {"crane": "FWD", "start": "06h10", "end": "06h30", "delay": "Windbound"}
+BREAKDOWN = {"crane": "AFT", "start": "07h40", "end": "07h55", "delay": "Crane break down"}
+
+@pytest.fixture
+def dbs(tmp_path):
+    sent, received = (report_core.open_db(str(tmp_path / name)) for name in ("sent.db", "received.db"))
+    yield sent, received
+    sent.close()
+    received.close()
+
+def _message(minute, text):
+    """One chat message as an Android export writes it."""
+    first, *rest = text.splitlines()
+    return [f"14/08/2025, 07:{minute:02d} - Clerk: {first}", *rest]
+
+def _send_hours(db):
+    """Save three hours and return the chat with each report as sent (one resent)."""
+    state = report_core.load_state(db, 1)
+    idle = [[WINDBOUND], [WINDBOUND, BREAKDOWN], [BREAKDOWN]]  # a delay stays on until it scrolls off
+    chat = []
+    for h in range(3):
+        hour = report_core.HourInput(f"{6 + h:02d}h00 - {7 + h:02d}h00", DAY,
+                                     {"fwd_load": 3 + h, "mid_disch": 2, "aft_restow_load": h, "hatch_fwd_open": 1},
+                                     h, "06h10", "08h55")
+        report_core.apply_hours(db, state, [hour])
+        chat += _message(h, report_core.render_hourly(state, hour, idle[h]))
+        if h == 1:
+            chat += _message(30, report_core.render_hourly(state, hour, idle[h]))  # sent twice
+    chat += _message(59, report_core.render_4h(state, "06h00 - 10h00", DAY))
+    return chat
+
+def _ledger(db):
+    return [(e.hour.hour_label, e.hour.report_date, e.hour.row(), e.hour.gearbox, e.hour.first_lift, e.hour.last_lift)
+            for e in report_core.ledger_entries(db, 1, limit=-1)]
+
+def test_sent_reports_import_back_once(dbs):
+    sent, received = dbs
+    chat = _send_hours(sent)
+    stats = chatlog.import_reports(received, chatlog.iter_chat_reports(chat))
+    assert stats["problems"] == []
+    assert (stats["hourly"], stats["4h"], stats["skipped"], stats["calls_created"]) == (3, 1, 1, 0)
+    assert _ledger(received) == _ledger(sent)
+    done = {k: v for k, v in report_core.load_cumulative(sent, 1).items() if k.startswith("done_")}
+    assert {k: report_core.load_cumulative(received, 1)[k] for k in done} == done
+    assert received.query_one("SELECT COUNT(*) FROM idle;")[0] == 2
+    labels, _, mats, _ = report_core.load_blocks(received, 1)
+    assert labels == ["06h00 - 10h00"] and int(mats[0, 0, 0]) == 3 + 4 + 5
+
+    again = chatlog.import_reports(received, chatlog.iter_chat_reports(chat))
+    assert (again["hourly"], again["4h"], again["skipped"]) == (0, 0, 5)
+    assert _ledger(received) == _ledger(sent)
+    assert received.query_one("SELECT COUNT(*) FROM idle;")[0] == 2
+
+def test_invalid_hours_are_reported_not_imported(dbs):
+    sent, received = dbs
+    chat = _send_hours(sent)
+    chat = [line.replace("07h00 - 08h00", "07h00 - 09h00") for line in chat]  # a hand-edited hour line
+    stats = chatlog.import_reports(received, chatlog.iter_chat_reports(chat))
+    assert stats["hourly"] == 2 and len(stats["problems"]) == 2  # the hour and its resend
+    assert all("bad hour label '07h00 - 09h00'" in p for p in stats["problems"])
+    assert [h[0] for h in _ledger(received)] == ["08h00 - 09h00", "06h00 - 07h00"]
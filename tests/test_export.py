@@ -0,0 +1,58 @@
+import csv
+import json
+import os
+
+import pytest
+
+import export
+
+def _records(n):
+    # older records lack "used_in_4h"; one value is a dict (stored as JSON text in Parquet)
+    return [dict({"ts": f"t{i}", "fwd_load": i, "rate": i / 2}, **({"used_in_4h": i % 2 == 0} if i > 1 else {}),
+                 **({"extra": {"note": "x"}} if i == 4 else {})) for i in range(n)]
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_ROWS", 3)
+
+def _read_back(path, fmt):
+    fh = export.open_once(path)
+    assert not os.path.exists(path)
+    with fh:
+        body = fh.read()
+    if fmt == "CSV":
+        return list(csv.DictReader(body.decode().splitlines()))
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+@pytest.mark.parametrize("n", [0, 1, 3, 4, 7])
+def test_csv_and_jsonl_across_chunk_boundaries(n):
+    records = _records(n)
+    assert [len(b) for b in export.chunks(records)] == [3] * (n // 3) + ([n % 3] if n % 3 else [])
+    assert _read_back(export.export_records(records, "JSON lines"), "JSON lines") == records
+    rows = _read_back(export.export_records(records, "CSV"), "CSV")
+    assert [r["ts"] for r in rows] == [r["ts"] for r in records]
+    assert all(r.get("used_in_4h", "") == "" for r in rows[:2])  # missing fields are blank, not shifted
+    if n:
+        assert list(rows[0]) == export.columns_of(records)
+
+@pytest.mark.parametrize("n", [1, 3, 7])
+def test_parquet_row_group_per_chunk(n):
+    pq = pytest.importorskip("pyarrow.parquet")
+    records = _records(n)
+    path = export.export_records(records, "Parquet")
+    try:
+        f = pq.ParquetFile(path)
+        assert f.metadata.num_row_groups == -(-n // 3)
+        table = f.read()
+    finally:
+        os.remove(path)
+    assert table.column("fwd_load").to_pylist() == list(range(n))
+    assert table.column("rate").to_pylist() == [i / 2 for i in range(n)]
+    if n > 4:
+        assert table.column("extra").to_pylist()[4] == '{"note": "x"}'
+        assert table.column("used_in_4h").to_pylist()[:3] == [None, None, True]
+
+def test_full_json_export():
+    data = {"vessel_name": "MSC NILA", "idle_logs": _records(2)}
+    with export.open_once(export.export_json(data)) as fh:
+        assert json.load(fh) == data
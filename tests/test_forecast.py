@@ -0,0 +1,49 @@
+import math
+from datetime import date, datetime
+
+import pytest
+
+import aggregate
+import forecast
+
+DAY = date(2025, 8, 14)
+
+def _state(totals, first_hour=6):
+    return forecast.rebuild((aggregate.hour_key(DAY, first_hour + i), [n, 0, 0, 0]) for i, n in enumerate(totals))
+
+def test_ewma_rate_and_variance():
+    state = _state([10, 20, 10])
+    # 10; then 10 + 0.2 * (20 - 10) = 12; then 12 + 0.2 * (10 - 12) = 11.6
+    assert state["rate"] == pytest.approx([11.6, 0, 0, 0])
+    # 0.8 * (0 + 0.2 * 10²) = 16; then 0.8 * (16 + 0.2 * 2²) = 13.44
+    assert state["var"] == pytest.approx(13.44)
+    assert (state["hours"], state["last"]) == (3, aggregate.hour_key(DAY, 8))
+    # folding in one hour at a time is the same as a rebuild
+    again = forecast.update(_state([10, 20]), aggregate.hour_key(DAY, 8), [10, 0, 0, 0])
+    assert again == pytest.approx(state)
+
+def test_estimate_counts_from_the_end_of_the_latest_hour():
+    est = forecast.estimate(_state([10, 20, 10]), 116)
+    assert est["hours"] == pytest.approx(10)
+    assert est["etc"] == datetime(2025, 8, 14, 19)  # 08h00 - 09h00 was the latest hour
+    spread = forecast.Z * math.sqrt(13.44) / math.sqrt(10)
+    assert est["earliest"] < est["etc"] < est["latest"]
+    assert (est["latest"] - datetime(2025, 8, 14, 9)).total_seconds() / 3600 == pytest.approx(116 / (11.6 - spread))
+    done = forecast.estimate(_state([10, 20, 10]), 0)
+    assert (done["hours"], done["etc"]) == (0.0, datetime(2025, 8, 14, 9))
+
+def test_no_estimate_without_enough_hours_or_a_rate():
+    assert forecast.estimate(None, 100) is None
+    assert forecast.estimate(_state([10, 20]), 100) is None
+    assert forecast.estimate(_state([0, 0, 0]), 100) is None
+    # a very uneven rate: the slow end of the band never finishes
+    assert forecast.estimate(_state([0, 0, 100]), 10)["latest"] is None
+
+def test_etc_text():
+    assert forecast.etc_text(None) == "n/a (needs 3+ saved hours and a recent move rate)"
+    assert forecast.etc_text(forecast.estimate(_state([10, 20, 10]), 0)) == "plan complete"
+    text = forecast.etc_text(forecast.estimate(_state([10, 10, 10]), 30))
+    assert text == "14/08 12h00 (14/08 12h00 - 14/08 12h00) @ 10 moves/h"
+    slow = forecast.etc_text(forecast.estimate(_state([0, 0, 100]), 10))
+    assert slow.startswith("14/08 09h") and "(from 14/08 09h" in slow
+    assert forecast.as_json(forecast.estimate(_state([0, 0, 100]), 10))["latest"] is None
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+import idle
+
+DAY = date(2025, 8, 14)
+MIDNIGHT = (DAY + timedelta(days=1)).toordinal() * idle.DAY
+
+def _runs(keys, starts, ends):
+    return list(zip(*(a.tolist() for a in idle.merge(keys, starts, ends))))
+
+def test_merge_overlapping_nested_and_touching():
+    # key 1: [5, 20) overlaps [0, 10), [2, 4) sits inside it, [20, 25) touches the run,
+    # [30, 40) stands apart; key 2's [5, 8) overlaps key 1 but is merged on its own
+    keys = [1, 1, 1, 1, 1, 2]
+    starts = [5, 0, 2, 20, 30, 5]
+    ends = [20, 10, 4, 25, 40, 8]
+    assert _runs(keys, starts, ends) == [(1, 0, 25), (1, 30, 40), (2, 5, 8)]
+    assert _runs([], [], []) == []
+
+def test_merge_across_midnight():
+    # reported on the 14th running past midnight, then again on the 15th's first report
+    late = idle.interval(DAY, "23h40", "00h20")
+    early = idle.interval(DAY + timedelta(days=1), "00h10", "00h30")
+    assert late == (MIDNIGHT - 20, MIDNIGHT + 20)
+    assert _runs([0, 0], [late[0], early[0]], [late[1], early[1]]) == [(0, MIDNIGHT - 20, MIDNIGHT + 30)]
+
+def test_covered_counts_each_interval():
+    starts, ends = np.array([0, 5]), np.array([10, 20])
+    assert idle.covered(starts, ends, [-1, 0, 7, 15, 25]).tolist() == [0, 0, 9, 20, 25]
+
+def test_index_totals_across_midnight():
+    entries = [
+        {"date": DAY.isoformat(), "crane": "FWD", "start": "23h40", "end": "00h20", "delay": "Windbound"},
+        {"date": (DAY + timedelta(days=1)).isoformat(), "crane": "FWD", "start": "00h10", "end": "00h30",
+         "delay": "Windbound"},
+        {"date": DAY.isoformat(), "crane": "AFT", "start": "23h50", "end": "00h05", "delay": "Awaiting cargo"},
+    ]
+    ix = idle.IdleIndex.from_entries(entries)
+    assert ix.by_crane() == {"AFT": 15, "FWD": 50}
+    assert ix.by_reason() == {"Awaiting cargo": 15, "Windbound": 50}
+    # a night shift is filed under the day it started, midnight or not
+    assert ix.by_shift("Night 22h00 - 06h00") == {DAY: 65}
+    # the calendar day splits at midnight
+    _, starts, ends = idle.merge(np.zeros(3), ix.starts, ix.ends)
+    before = idle.covered(starts, ends, [MIDNIGHT])[0]
+    assert before == 20
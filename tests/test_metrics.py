@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+import metrics
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    monkeypatch.delenv(metrics.METRICS_ENV, raising=False)
+    monkeypatch.setattr(metrics, "_totals", {})
+    yield
+    metrics.end_run()
+
+@metrics.timed()
+def outer():
+    with metrics.span("inner"):
+        pass
+    return 7
+
+def test_off_unless_a_file_or_diag_asks():
+    assert metrics.begin_run("main") is None
+    assert outer() == 7 and metrics.current() is None
+    run = metrics.begin_run("main", force=True)
+    outer()
+    metrics.end_run(run)
+    assert [(name, depth) for name, depth, _ in run.spans] == [("inner", 1), ("outer", 0)]
+    assert metrics.current() is None
+    assert metrics.format_run(run).splitlines()[-1].endswith("total (main)")
+
+def test_json_lines_one_per_run(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.jsonl"
+    monkeypatch.setenv(metrics.METRICS_ENV, str(path))
+    metrics.begin_run("main")
+    outer()
+    metrics.begin_run("main")  # a rerun that never reached end_run is flushed first
+    with metrics.run_or_span("hourly_panel") as own:
+        assert own is None  # inside a run: just a span
+    metrics.end_run()
+    with metrics.run_or_span("hourly_panel") as own:  # a fragment rerun: its own run
+        assert own is metrics.current()
+    runs = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["run"] for r in runs] == ["main", "main", "hourly_panel"]
+    assert [(s["name"], s["depth"]) for s in runs[0]["spans"]] == [("inner", 1), ("outer", 0)]
+    assert [s["name"] for s in runs[1]["spans"]] == ["hourly_panel"] and runs[2]["spans"] == []
+
+def test_prometheus_file_keeps_process_totals(tmp_path, monkeypatch):
+    path = tmp_path / "report.prom"
+    monkeypatch.setenv(metrics.METRICS_ENV, str(path))
+    for _ in range(2):
+        metrics.begin_run("main")
+        with metrics.span('say "hi"'):
+            outer()
+        metrics.end_run()
+    text = path.read_text()
+    assert 'report_span_seconds_count{span="outer"} 2' in text
+    assert 'report_span_seconds_count{span="run:main"} 2' in text
+    assert 'report_span_seconds_count{span="say \\"hi\\""} 2' in text
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,58 @@
+import numpy as np
+
+import moves
+import report_core
+
+def test_packed_matrices_and_counts_round_trip():
+    mats = np.arange(2 * 24, dtype=np.int32).reshape((2,) + moves.SHAPE) - 20
+    mats[:, moves.POSITIONS.index("poop"), 4:] = 0  # POOP hatch cells are not stored
+    blobs = [moves.to_bytes(m) for m in mats]
+    assert all(len(b) == moves.MATRIX_BYTES for b in blobs)
+    assert np.array_equal(moves.matrices_from_bytes(blobs), mats)
+    assert np.array_equal(moves.from_bytes(blobs[1]), mats[1])
+    assert moves.matrices_from_bytes([]).shape == (0,) + moves.SHAPE
+
+    totals = {"planned_load": 900, "done_load": 0, "remain_disch": -3}
+    blob = moves.pack_counts(totals, report_core.FOURH_TOTALS)
+    assert moves.unpack_counts(blob, report_core.FOURH_TOTALS) == totals  # absent keys stay absent
+
+def test_hour_record_session_round_trip():
+    state = {"hr_fwd_load": 3, "hr_poop_disch": 2, "hr_hatch_aft_close": 1, "hr_mid_restow_load": None, "gearbox": 4}
+    rec = moves.HourRecord.from_session(state, "hr_", "gearbox")
+    assert rec.fields() == dict(moves.as_fields(np.zeros(moves.SHAPE)), fwd_load=3, poop_disch=2, hatch_aft_close=1)
+    assert rec.gearbox == 4
+    assert moves.HourRecord.keys("hr_")[0] == "hr_fwd_load" and len(moves.HourRecord.keys("hr_")) == 22
+    out = {}
+    rec.to_session(out, "m4h_", "m4h_gearbox")
+    assert out["m4h_poop_disch"] == 2 and out["m4h_mid_restow_load"] == 0 and out["m4h_gearbox"] == 4
+    assert moves.HourRecord.from_session(out, "m4h_", "m4h_gearbox") == rec
+    assert moves.HourRecord.from_fields(rec.fields(), 4) == rec
+
+def test_hour_record_arithmetic_and_checks():
+    a = moves.HourRecord.from_fields({"fwd_load": 5, "aft_restow_disch": 2, "hatch_fwd_open": 1}, gearbox=1)
+    b = moves.HourRecord.from_fields({"fwd_load": 2, "poop_load": 7})
+    assert (a + b).fields()["fwd_load"] == 7 and (a + b).gearbox == 1
+    diff = b - a
+    assert diff.problems() == ["fwd_load", "hatch_fwd_open", "aft_restow_disch", "gearbox"]
+    assert a.problems() == [] and a != b and a != a.fields()
+    assert (a + b).box_moves().tolist() == [7, 0, 2, 7]  # hatch covers are not box moves
+    split = (a + b).split()
+    assert split["load"] == {"FWD": 7, "MID": 0, "AFT": 0, "POOP": 7}
+    assert split["hatch_open"] == {"FWD": 1, "MID": 0, "AFT": 0}  # no POOP hatch column
+
+def test_ring_keeps_the_last_four_hours():
+    ring = moves.empty_ring(4)
+    assert not moves.window_sum(ring).any() and ring["count_hours"] == 0
+    for n in range(1, 7):
+        moves.push_hour(ring, moves.HourRecord.from_fields({"fwd_load": n, "hatch_mid_close": 1}).mat)
+    assert moves.as_fields(moves.window_sum(ring))["fwd_load"] == 3 + 4 + 5 + 6
+    assert moves.as_fields(moves.window_sum(ring))["hatch_mid_close"] == 4
+    assert (ring["head"], ring["count_hours"]) == (2, 4)
+
+def test_ledger_rows_become_matrices():
+    fields = ["aft_disch", "hatch_fwd_open", "poop_load"]
+    mats = moves.matrices_from_rows([(1, 2, 3), (4, 5, 6)], fields)
+    assert mats.shape == (2,) + moves.SHAPE
+    assert moves.as_fields(mats[1]) == dict(moves.as_fields(np.zeros(moves.SHAPE)), aft_disch=4, hatch_fwd_open=5, poop_load=6)
+    assert np.array_equal(moves.matrix_from([1, 2, 3], fields), mats[0])
+    assert moves.matrices_from_rows([], fields).shape == (0,) + moves.SHAPE
@@ -0,0 +1,140 @@
+import multiprocessing
+
+from record_store import RecordStore
+
+def test_compaction_keeps_lines_another_writer_appended(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    a, b = RecordStore(path, compact_after=3), RecordStore(path)
+    a.load()
+    b.load()
+    b.append("hourly_records", {"ts": "t1", "date": "2025-08-14", "start_hour": 6}, add={"done_load": 5})
+    for i in range(3):
+        a.update({"x": i})  # a never reloaded; the third update compacts
+    data = RecordStore(path).load()
+    assert [r["ts"] for r in data["hourly_records"]] == ["t1"]
+    assert data["done_load"] == 5 and data["x"] == 2
+    assert a.load()["done_load"] == 5
+
+def test_tail_replay_picks_up_other_writers(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    a, b = RecordStore(path), RecordStore(path)
+    a.append("hourly_records", {"ts": "t1"}, add={"done_load": 1})
+    before = a.load()
+    b.append("hourly_records", {"ts": "t2"}, add={"done_load": 2})
+    after = a.load()
+    assert after is before  # appended lines replayed onto the same data
+    assert after["done_load"] == 3 and len(after["hourly_records"]) == 2
+
+def test_torn_line_does_not_swallow_the_next_write(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    store = RecordStore(path)
+    store.update({"x": 1})
+    with open(path, "ab") as f:
+        f.write(b'{"op":"set","val')
+    store.update({"y": 2})
+    data = RecordStore(path).load()
+    assert data["x"] == 1 and data["y"] == 2
+
+def _writer(path, n):
+    store = RecordStore(path, compact_after=5)
+    for i in range(n):
+        store.append("hourly_records", {"ts": f"{path}-{multiprocessing.current_process().pid}-{i}"},
+                     add={"done_load": 1})
+        store.update({"note": i})
+
+def test_concurrent_processes_with_compaction(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    procs = [multiprocessing.Process(target=_writer, args=(path, 40)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    data = RecordStore(path).load()
+    assert len(data["hourly_records"]) == 160
+    assert data["done_load"] == 160
+
+def test_compact_snapshots_the_log_not_a_stale_copy(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    a, b = RecordStore(path), RecordStore(path)
+    a.update({"vessel_name": "MSC NILA"})
+    b.append("idle_logs", {"ts": "i1", "crane": "FWD"})
+    b.delete("idle_logs", ["i1"])
+    b.append("idle_logs", {"ts": "i2", "crane": "AFT"})
+    a.compact()
+    with open(path) as f:
+        assert sum(1 for _ in f) == 2  # one set line + one record
+    data = RecordStore(path).load()
+    assert data["vessel_name"] == "MSC NILA"
+    assert [r["ts"] for r in data["idle_logs"]] == ["i2"]
+
+def test_delete_by_ts_after_another_writer_changed_the_list(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    a, b = RecordStore(path), RecordStore(path)
+    for ts in ("i1", "i2", "i3"):
+        a.append("idle_logs", {"ts": ts})
+    b.load()
+    a.delete("idle_logs", ["i1"])
+    a.append("idle_logs", {"ts": "i4"})
+    b.delete("idle_logs", ["i3"])  # b's copy still has i3 at position 2
+    assert [r["ts"] for r in RecordStore(path).load()["idle_logs"]] == ["i2", "i4"]
+
+def test_positional_deletes_in_older_logs_still_replay(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    with open(path, "w") as f:
+        for ts in ("i1", "i2", "i3"):
+            f.write(f'{{"op":"append","list":"idle_logs","rec":{{"ts":"{ts}"}}}}\n')
+        f.write('{"op":"delete","list":"idle_logs","idx":[1]}\n')
+    assert [r["ts"] for r in RecordStore(path).load()["idle_logs"]] == ["i1", "i3"]
+
+def test_a_line_appended_during_a_read_is_not_marked_seen(tmp_path, monkeypatch):
+    path = str(tmp_path / "log.jsonl")
+    a, b = RecordStore(path), RecordStore(path)
+    b.append("idle_logs", {"ts": "i1"})
+    replay_tail = RecordStore._replay_tail
+
+    def racing(self):
+        replay_tail(self)
+        if self is a:
+            b.append("idle_logs", {"ts": "i2"})  # lands after a read the file, before it stats it
+
+    monkeypatch.setattr(RecordStore, "_replay_tail", racing)
+    assert [r["ts"] for r in a.load()["idle_logs"]] == ["i1"]
+    monkeypatch.undo()
+    assert [r["ts"] for r in a.load()["idle_logs"]] == ["i1", "i2"]
+
+def test_match_block_takes_the_latest_unused_record_per_hour(tmp_path):
+    store = RecordStore(str(tmp_path / "log.jsonl"))
+    store.load()
+    for ts, day, h in [("a", "2025-08-14", 22), ("b", "2025-08-14", 22), ("c", "2025-08-14", 1), ("d", "2025-08-15", 23)]:
+        store.append("hourly_records", {"ts": ts, "date": day, "start_hour": h})
+    matched, missing = store.match_block("2025-08-14", "22h00 - 02h00")
+    assert [r["ts"] for r in matched] == ["b", "c"] and missing == [23, 0]  # the block's hours share its date
+    store.mark_used(["b"])
+    assert [r["ts"] for r in store.match_block("2025-08-14", "22h00 - 02h00", include_used=False)[0]] == ["a", "c"]
+
+def _scan(data, date_str, start_hour):
+    """What the index replaces: a pass over every hourly record."""
+    return [r for r in data["hourly_records"] if (r["date"], r["start_hour"]) == (date_str, start_hour)]
+
+def test_hourly_index_follows_every_write(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    a, b = RecordStore(path, compact_after=2), RecordStore(path)
+    a.load()
+    for ts, h in [("h1", 6), ("h2", 7), ("h3", 6)]:
+        a.append("hourly_records", {"ts": ts, "date": "2025-08-14", "start_hour": h})
+    b.load()
+    b.append("hourly_records", {"ts": "h4", "date": "2025-08-14", "start_hour": 7})  # a replays it as a tail
+    a.load()
+    a.mark_used(["h1", "h4"])
+    a.delete("hourly_records", ["h3"])  # two lines of overhead: compacts
+    with open(path) as f:
+        assert sum(1 for _ in f) == 4  # head + the three records left
+    for store in (a, RecordStore(path)):
+        data = store.load()
+        for h in (6, 7, 8):
+            assert store.hourly_for("2025-08-14", h) == _scan(data, "2025-08-14", h)
+        assert store.hourly_for("2025-08-14", 6, include_used=False) == []
+        assert [r["ts"] for r in store.hourly_for("2025-08-14", 7, include_used=False)] == ["h2"]
+        assert set(store.by_ts) == {"h1", "h2", "h4"} and store.by_ts["h4"]["used_in_4h"]
+    a.reset_used()
+    assert [r["ts"] for r in a.hourly_for("2025-08-14", 7, include_used=False)] == ["h2", "h4"]
@@ -0,0 +1,56 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from datetime import date
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import report_cli
+import report_core
+
+@pytest.fixture
+def db(tmp_path):
+    db = report_core.open_db(str(tmp_path / "vessel.db"))
+    yield db
+    db.close()
+
+@pytest.fixture
+def server(db):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), report_cli.make_handler(db))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def _post(url, body):
+    req = urllib.request.Request(url + "/hour", data=json.dumps(body).encode(), method="POST")
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def _hours(db, call_id):
+    return db.query("SELECT COUNT(*) FROM hourly WHERE call_id = ?;", (call_id,))[0][0]
+
+def test_post_hour_rejects_unknown_call_and_bad_label(db, server):
+    hour = {"hour_label": "06h00 - 07h00", "report_date": "2025-08-14", "moves": {"fwd_load": 3}}
+    assert _post(server, dict(hour, call=99)) == 400
+    assert _post(server, dict(hour, call=1, hour_label="6h00 - 7h00")) == 400
+    assert _post(server, dict(hour, call=1, moves={"fwd_lod": 3})) == 400
+    assert _hours(db, 99) == 0
+    assert db.query("SELECT COUNT(*) FROM meta WHERE call_id = 99;")[0][0] == 0
+    assert _post(server, dict(hour, call=1)) == 200
+    assert _hours(db, 1) == 1
+
+def test_apply_hours_checks_every_hour_before_writing(db):
+    state = report_core.load_state(db, 1)
+    good = report_core.HourInput("06h00 - 07h00", date(2025, 8, 14), {"fwd_load": 3})
+    bad = report_core.HourInput("07h00 - 09h00", date(2025, 8, 14), {"fwd_load": 3})
+    with pytest.raises(report_core.InvalidHour):
+        report_core.apply_hours(db, state, [good, bad])
+    assert _hours(db, 1) == 0
+    with pytest.raises(report_core.UnknownCall):
+        report_core.apply_hours(db, report_core.load_state(db, 7), [good])
@@ -0,0 +1,144 @@
+import json
+from datetime import date
+
+import pytest
+
+import moves
+import report_core
+
+DAY = date(2025, 8, 14)
+
+@pytest.fixture
+def db(tmp_path):
+    db = report_core.open_db(str(tmp_path / "vessel.db"))
+    yield db
+    db.close()
+
+def _hour(h, fwd_load):
+    return report_core.HourInput(f"{h:02d}h00 - {h + 1:02d}h00", DAY, {"fwd_load": fwd_load})
+
+def _summary(db):
+    """Summary rows that still count any hour (a removed hour leaves a zeroed row behind)."""
+    return sorted(db.query("SELECT * FROM hourly_summary WHERE hours != 0;"))
+
+def _journal(db):
+    return db.query("SELECT COUNT(*) FROM hourly_changes WHERE call_id = 1;")[0][0]
+
+def _fwd_load(series):
+    return int(series.call()[0].sum())
+
+def test_change_journal_is_trimmed_past_every_reader(db):
+    report_core.apply_hours(db, report_core.load_state(db, 1), [_hour(h, 10) for h in range(6, 10)])
+    a = report_core.load_series(db, 1, report_core.aggregate.MoveSeries())
+    b = report_core.load_series(db, 1, report_core.aggregate.MoveSeries())
+    first = report_core.ledger_entries(db, 1, limit=-1)[-1]
+    report_core.edit_hour(db, report_core.load_state(db, 1), first.id, _hour(6, 4))
+    assert _journal(db) == 2
+    report_core.load_series(db, 1, a)
+    assert _journal(db) == 2  # b has not read the edit yet
+    report_core.load_series(db, 1, b)
+    assert _journal(db) == 0
+    assert _fwd_load(a) == _fwd_load(b) == 34
+
+def test_unchanged_reload_writes_nothing(db):
+    report_core.apply_hours(db, report_core.load_state(db, 1), [_hour(6, 10)])
+    series = report_core.load_series(db, 1, report_core.aggregate.MoveSeries())
+    generation = db.generation()
+    report_core.load_series(db, 1, series)
+    assert db.generation() == generation
+
+def test_reader_left_behind_rebuilds(db, monkeypatch):
+    report_core.apply_hours(db, report_core.load_state(db, 1), [_hour(h, 10) for h in range(6, 9)])
+    stale = report_core.load_series(db, 1, report_core.aggregate.MoveSeries())
+    entries = report_core.ledger_entries(db, 1, limit=-1)
+    report_core.delete_hour(db, report_core.load_state(db, 1), entries[0].id)
+    # the stale reader expires, so the other reader trims the delete it never read
+    monkeypatch.setattr(report_core, "CHANGE_READER_TTL", -1)
+    report_core.load_series(db, 1, report_core.aggregate.MoveSeries())
+    assert _journal(db) == 0
+    monkeypatch.undo()
+    report_core.load_series(db, 1, stale)
+    assert _fwd_load(stale) == 20
+    assert report_core.ledger_entry(db, 1, entries[0].id) is None
+    assert report_core.ledger_entry(db, 1, entries[1].id).hour.moves["fwd_load"] == 10
+
+def test_legacy_done_totals_become_carried(tmp_path):
+    path = str(tmp_path / "vessel.db")
+    db = report_core.open_db(path)
+    report_core.apply_hours(db, report_core.load_state(db, 1), [_hour(6, 10), _hour(7, 10)])
+    # an old build kept done_* (and the 4h lists) in the meta blob itself
+    legacy = dict(report_core.DEFAULT_CUMULATIVE, done_load=50, done_disch=5, fourh={"fwd_load": [1]})
+    with db.transaction() as cur:
+        cur.execute("UPDATE meta SET value = ? WHERE call_id = 1 AND key = 'cumulative';", (json.dumps(legacy),))
+    db.close()
+    for _ in range(2):  # migrating twice must not carry the ledger twice
+        db = report_core.open_db(path)
+        cum = report_core.load_cumulative(db, 1)
+        assert (cum["carried_load"], cum["carried_disch"]) == (30, 5)
+        assert (cum["done_load"], cum["done_disch"]) == (50, 5)
+        assert cum["fourh_since_id"] == max(e.id for e in report_core.ledger_entries(db, 1))
+        db.close()
+
+def test_stale_session_merges_onto_the_stored_row(db):
+    mine, theirs = report_core.load_state(db, 1), report_core.load_state(db, 1)
+    mine.cumulative["fourh_block"] = "10h00 - 14h00"
+    report_core.apply_hours(db, theirs, [_hour(6, 10)])
+    report_core.apply_hours(db, mine, [_hour(7, 5)])  # read before their hour went in
+    assert mine.cumulative["done_load"] == 15
+    assert report_core.load_cumulative(db, 1)["done_load"] == 15
+    assert report_core.load_cumulative(db, 1)["fourh_block"] == "10h00 - 14h00"
+    assert moves.as_fields(moves.window_sum(mine.fourh))["fwd_load"] == 15
+
+def test_corrections_keep_the_summaries_in_step(db):
+    state = report_core.load_state(db, 1)
+    report_core.apply_hours(db, state, [_hour(h, 10) for h in range(5, 9)])
+    first, second = report_core.ledger_entries(db, 1, limit=-1)[-2:][::-1]
+    report_core.edit_hour(db, state, first.id, report_core.HourInput("13h00 - 14h00", DAY, {"fwd_load": 4}))
+    report_core.delete_hour(db, state, second.id)
+    assert report_core.undo_last_hour(db, state).hour.hour_label == "08h00 - 09h00"
+    assert state.cumulative["done_load"] == 14
+    triggered = _summary(db)
+    with db.transaction() as cur:
+        report_core.rebuild_summaries(cur)
+    assert triggered == _summary(db)
+    assert report_core.summary_window(db, 1, "call")[1] == 2
+    assert report_core.summary_window(db, 1, "shift", day=DAY, shift="Day 06h00 - 14h00")[1] == 2
+
+def test_imported_4h_blocks_read_back_after_migration(tmp_path):
+    path = str(tmp_path / "vessel.db")
+    db = report_core.open_db(path)
+    # an old build kept the block's moves and plan lines in the JSON data
+    legacy = {"moves": {"fwd_load": 12, "aft_disch": 3}, "cumulative": {"planned_load": 900, "done_load": 40},
+              "report_date": "2025-08-14", "sender": "Clerk"}
+    with db.transaction() as cur:
+        cur.execute("INSERT INTO fourh (call_id, block_label, timestamp, data) VALUES (1, '06h00 - 10h00', '', ?);",
+                    (json.dumps(legacy),))
+    db.close()
+    db = report_core.open_db(path)
+    labels, days, mats, totals = report_core.load_blocks(db, 1)
+    assert (labels, days, totals) == (["06h00 - 10h00"], ["2025-08-14"], [{"planned_load": 900, "done_load": 40}])
+    assert moves.as_fields(mats[0]) == moves.HourRecord.from_fields({"fwd_load": 12, "aft_disch": 3}).fields()
+    assert json.loads(db.query_one("SELECT data FROM fourh;")[0]) == {"sender": "Clerk"}
+    db.close()
+
+def test_reset_call_clears_only_that_call(db):
+    other = report_core.create_call(db, "MSC NILA", "2025-08-13")
+    for call_id in (1, other):
+        state = report_core.load_state(db, call_id)
+        state.cumulative["planned_load"] = 500
+        report_core.apply_hours(db, state, [_hour(6, 10), _hour(7, 5)])
+        report_core.save_idle(db, call_id, DAY, [{"crane": "FWD", "start": "06h10", "end": "06h30", "delay": "Windbound"}])
+        with db.transaction() as cur:
+            cur.execute(f"INSERT INTO fourh ({', '.join(report_core.FOURH_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?);",
+                        report_core.fourh_row(call_id, "06h00 - 10h00", "", DAY.isoformat(), {"fwd_load": 15}, {}, {}))
+        report_core.load_series(db, call_id, report_core.aggregate.MoveSeries())
+    before = {t: db.query(f"SELECT COUNT(*) FROM {t} WHERE call_id = ?;", (other,))[0][0]
+              for t in ("hourly", "fourh", "idle", "hourly_change_readers")}
+    report_core.reset_call(db, 1)
+    for table, n in before.items():
+        assert db.query(f"SELECT COUNT(*) FROM {table} WHERE call_id = 1;")[0][0] == 0
+        assert db.query(f"SELECT COUNT(*) FROM {table} WHERE call_id = ?;", (other,))[0][0] == n > 0
+    cum = report_core.load_cumulative(db, 1)
+    assert (cum["done_load"], cum["planned_load"]) == (0, report_core.DEFAULT_CUMULATIVE["planned_load"])
+    assert report_core.load_cumulative(db, other)["done_load"] == 15
+    assert _fwd_load(report_core.load_series(db, 1)) == 0
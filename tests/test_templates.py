@@ -0,0 +1,159 @@
+import report_core
+import templates
+
+SEP = "_________________________\n"
+IDLE = [{"crane": "FWD", "start": "06h10", "end": "06h30", "delay": "Windbound"},
+        {"crane": "AFT", "start": "07h40", "end": "07h55", "delay": "Crane break down"}]
+
+def _values():
+    """Every slot set to a distinct value, wide enough to show any column drift."""
+    v = {"vessel_name": "MSC NILA", "berthed_date": "14/08/2025 @ 10H55", "date": "14/08/2025",
+         "hour": "06h00 - 07h00", "block": "06h00 - 10h00", "first_lift": "06h05", "last_lift": "06h55",
+         "gearbox": 7, "etc": "15/08 02h00 (14/08 23h10 - 15/08 05h40) @ 31 moves/h"}
+    for i, f in enumerate(report_core.MOVE_FIELDS):
+        v[f] = i * 7 % 23 + (100 if i % 5 == 0 else 0)
+    for i, g in enumerate(report_core.PLAN_GROUPS):
+        v[f"planned_{g}"], v[f"done_{g}"] = 1000 + i, 400 + 37 * i
+        v[f"remain_{g}"] = v[f"planned_{g}"] - v[f"done_{g}"]
+    return v
+
+# the baseline app's generate_hourly_template / generate_4h_template, with session state
+# and cumulative read from one dict
+def baseline_hourly(v, idle):
+    tmpl = f"""\
+{v['vessel_name']}
+Berthed {v['berthed_date']}
+
+Date: {v['date']}
+Hour: {v['hour']}
+_________________________
+*First Lift:* {v['first_lift']}    *Last Lift:* {v['last_lift']}
+_________________________
+   *HOURLY MOVES*
+_________________________
+*Crane Moves*
+           Load   Discharge
+FWD       {v['fwd_load']:>5}     {v['fwd_disch']:>5}
+MID       {v['mid_load']:>5}     {v['mid_disch']:>5}
+AFT       {v['aft_load']:>5}     {v['aft_disch']:>5}
+POOP      {v['poop_load']:>5}     {v['poop_disch']:>5}
+_________________________
+*Restows*
+           Load   Discharge
+FWD       {v['fwd_restow_load']:>5}     {v['fwd_restow_disch']:>5}
+MID       {v['mid_restow_load']:>5}     {v['mid_restow_disch']:>5}
+AFT       {v['aft_restow_load']:>5}     {v['aft_restow_disch']:>5}
+POOP      {v['poop_restow_load']:>5}     {v['poop_restow_disch']:>5}
+_________________________
+*Gearbox*
+Total Gearboxes (hour): {v['gearbox']}
+_________________________
+      *CUMULATIVE*
+_________________________
+           Load   Disch
+Plan       {v['planned_load']:>5}      {v['planned_disch']:>5}
+Done       {v['done_load']:>5}      {v['done_disch']:>5}
+Remain     {v['remain_load']:>5}      {v['remain_disch']:>5}
+_________________________
+*Restows*
+           Load   Disch
+Plan       {v['planned_restow_load']:>5}      {v['planned_restow_disch']:>5}
+Done       {v['done_restow_load']:>5}      {v['done_restow_disch']:>5}
+Remain     {v['remain_restow_load']:>5}      {v['remain_restow_disch']:>5}
+_________________________
+*Hatch Moves*
+           Open   Close
+FWD       {v['hatch_fwd_open']:>5}      {v['hatch_fwd_close']:>5}
+MID       {v['hatch_mid_open']:>5}      {v['hatch_mid_close']:>5}
+AFT       {v['hatch_aft_open']:>5}      {v['hatch_aft_close']:>5}
+_________________________
+*Idle / Delays*
+"""
+    for i, idle in enumerate(idle):
+        tmpl += f"{i+1}. {idle['crane']} {idle['start']}-{idle['end']} : {idle['delay']}\n"
+    return tmpl
+
+def baseline_4h(v, idle):
+    t = f"""\
+{v['vessel_name']}
+Berthed {v['berthed_date']}
+
+Date: {v['date']}
+4-Hour Block: {v['block']}
+_________________________
+   *HOURLY MOVES*
+_________________________
+*Crane Moves*
+           Load    Discharge
+FWD       {v['fwd_load']:>5}     {v['fwd_disch']:>5}
+MID       {v['mid_load']:>5}     {v['mid_disch']:>5}
+AFT       {v['aft_load']:>5}     {v['aft_disch']:>5}
+POOP      {v['poop_load']:>5}     {v['poop_disch']:>5}
+_________________________
+*Restows*
+           Load    Discharge
+FWD       {v['fwd_restow_load']:>5}     {v['fwd_restow_disch']:>5}
+MID       {v['mid_restow_load']:>5}     {v['mid_restow_disch']:>5}
+AFT       {v['aft_restow_load']:>5}     {v['aft_restow_disch']:>5}
+POOP      {v['poop_restow_load']:>5}     {v['poop_restow_disch']:>5}
+_________________________
+      *CUMULATIVE* (from hourly saved entries)
+_________________________
+           Load   Disch
+Plan       {v['planned_load']:>5}      {v['planned_disch']:>5}
+Done       {v['done_load']:>5}      {v['done_disch']:>5}
+Remain     {v['remain_load']:>5}      {v['remain_disch']:>5}
+_________________________
+*Restows*
+           Load    Disch
+Plan       {v['planned_restow_load']:>5}      {v['planned_restow_disch']:>5}
+Done       {v['done_restow_load']:>5}      {v['done_restow_disch']:>5}
+Remain     {v['remain_restow_load']:>5}      {v['remain_restow_disch']:>5}
+_________________________
+*Hatch Moves*
+             Open         Close
+FWD          {v['hatch_fwd_open']:>5}          {v['hatch_fwd_close']:>5}
+MID          {v['hatch_mid_open']:>5}          {v['hatch_mid_close']:>5}
+AFT          {v['hatch_aft_open']:>5}          {v['hatch_aft_close']:>5}
+_________________________
+*Idle / Delays*
+"""
+    for i, idle in enumerate(idle):
+        t += f"{i+1}. {idle['crane']} {idle['start']}-{idle['end']} : {idle['delay']}\n"
+    return t
+
+def _with_etc(text, v):
+    """The one line added since the baseline: ETC, just above the idle list (user-023)."""
+    head, tail = text.split(SEP + "*Idle / Delays*\n")
+    return head + SEP + f"*ETC:* {v['etc']}\n" + SEP + "*Idle / Delays*\n" + tail
+
+def _blocks_4h(v):
+    """The baseline 4H report cut into heading, moves, cumulative and hatch parts."""
+    text = baseline_4h(v, [])
+    heading, rest = text.split(f"4-Hour Block: {v['block']}\n")
+    moves, rest = rest.split(SEP + "      *CUMULATIVE*")
+    cumulative, rest = rest.split(SEP + "*Hatch Moves*")
+    return (heading, moves, SEP + "      *CUMULATIVE*" + cumulative,
+            SEP + "*Hatch Moves*" + rest[:-len(SEP + "*Idle / Delays*\n")])
+
+def test_hourly_and_4h_match_the_baseline_templates():
+    v = _values()
+    for idle in ([], IDLE):
+        assert templates.HOURLY.render(v, idle) == _with_etc(baseline_hourly(v, idle), v)
+        assert templates.FOUR_HOUR.render(v, idle) == _with_etc(baseline_4h(v, idle), v)
+
+def test_shift_and_call_reuse_the_baseline_4h_blocks():
+    v = _values()
+    heading, moves, cumulative, hatch = _blocks_4h(v)
+    shift = moves.replace("*HOURLY MOVES*", "*SHIFT MOVES*")
+    assert templates.SHIFT.render(dict(v, window="Day 06h00 - 14h00")) == (
+        heading + "Period: Day 06h00 - 14h00\n" + shift + hatch + cumulative)
+    call = moves.replace("*HOURLY MOVES*", "*CALL TOTAL MOVES*")
+    assert templates.END_OF_CALL.render(dict(v, hours=31)) == heading + "Hours Worked: 31\n" + call + hatch + cumulative
+
+def test_renders_are_memoised_on_their_inputs():
+    v = _values()
+    first = templates.HOURLY.render(v, IDLE)
+    assert templates.HOURLY.render(dict(v), IDLE) is first
+    changed = templates.HOURLY.render(dict(v, fwd_load=v["fwd_load"] + 1), IDLE)
+    assert changed != first and changed.replace(f"{v['fwd_load'] + 1:>5}", f"{v['fwd_load']:>5}", 1) == first
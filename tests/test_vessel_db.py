@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+import vessel_db
+
+@pytest.fixture
+def db(tmp_path):
+    db = vessel_db.Database(str(tmp_path / "vessel.db"))
+    with db.transaction() as cur:
+        cur.execute("CREATE TABLE t (x INTEGER);")
+    yield db
+    db.close()
+
+def test_pragmas_are_set(db):
+    assert db.query_one("PRAGMA journal_mode;")[0] == "wal"
+    assert db.query_one("PRAGMA busy_timeout;")[0] == 5000
+
+def test_nested_transactions_commit_once(db):
+    before = db.generation()
+    with db.transaction() as cur:
+        cur.execute("INSERT INTO t VALUES (1);")
+        with db.transaction() as inner:
+            inner.execute("INSERT INTO t VALUES (2);")
+        assert db.generation() == before  # the inner block joined the outer one
+    assert db.generation() != before
+    assert db.query("SELECT x FROM t ORDER BY x;") == [(1,), (2,)]
+
+def test_an_error_rolls_back_the_whole_transaction(db):
+    before = db.generation()
+    with pytest.raises(ZeroDivisionError):
+        with db.transaction() as cur:
+            cur.execute("INSERT INTO t VALUES (1);")
+            with db.transaction() as inner:
+                inner.execute("INSERT INTO t VALUES (2);")
+                1 / 0
+    assert db.query("SELECT COUNT(*) FROM t;") == [(0,)]
+    assert db.generation() == before
+    with db.transaction() as cur:  # the connection is usable again
+        cur.execute("INSERT INTO t VALUES (3);")
+    assert db.query("SELECT x FROM t;") == [(3,)]
+
+def test_another_connections_commit_moves_the_generation(db):
+    other = vessel_db.Database(db.path)
+    before = db.generation()
+    with db.snapshot() as cur:
+        cur.execute("SELECT COUNT(*) FROM t;")
+    assert db.generation() == before  # reads do not move it
+    with other.transaction() as cur:
+        cur.execute("INSERT INTO t VALUES (1);")
+    assert db.generation() != before
+    other.close()
+
+def test_snapshot_sees_one_committed_state(db):
+    other = vessel_db.Database(db.path)
+    with db.snapshot() as cur:
+        first = cur.execute("SELECT COUNT(*) FROM t;").fetchone()
+        with other.transaction() as ocur:  # WAL: the writer is not blocked by the reader
+            ocur.execute("INSERT INTO t VALUES (1);")
+        assert cur.execute("SELECT COUNT(*) FROM t;").fetchone() == first
+    assert db.query_one("SELECT COUNT(*) FROM t;") == (1,)
+    other.close()
+
+def test_sessions_share_the_connection_across_threads(db):
+    def worker(n):
+        for i in range(50):
+            with db.transaction() as cur:
+                cur.execute("INSERT INTO t VALUES (?);", (n * 100 + i,))
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert db.query_one("SELECT COUNT(DISTINCT x) FROM t;") == (200,)
@@ -0,0 +1,66 @@
+import threading
+
+import write_behind
+
+def test_edits_coalesce_and_flush_writes_them_once():
+    wb = write_behind.WriteBehind(delay=60, max_delay=60)
+    writes = []
+    for n in range(3):
+        wb.submit("meta", {"planned_load": n, f"k{n}": n}, writes.append)
+    assert wb.has_pending("meta") and writes == []
+    wb.flush()
+    assert writes == [{"planned_load": 2, "k0": 0, "k1": 1, "k2": 2}]
+    assert not wb.has_pending()
+
+def test_flush_waits_for_the_write_the_worker_took():
+    wb = write_behind.WriteBehind(delay=0, max_delay=0, max_backoff=0.01)
+    started, release, log = threading.Event(), threading.Event(), []
+
+    def slow(values):
+        if not started.is_set():  # the worker's attempt is slow and then fails once
+            started.set()
+            release.wait(5)
+            raise OSError("database is locked")
+        log.append(values)
+
+    wb.submit("meta", {"vessel_name": "MSC A"}, slow)
+    assert started.wait(5)  # the worker has taken the job; nothing is left queued
+    flushed = threading.Thread(target=lambda: (wb.flush(), log.append("hour saved")))
+    flushed.start()
+    flushed.join(0.2)
+    assert flushed.is_alive()
+    release.set()
+    flushed.join(5)
+    assert log == [{"vessel_name": "MSC A"}, "hour saved"]
+
+def test_a_failing_write_backs_off_then_gives_up():
+    wb = write_behind.WriteBehind(delay=0.01, max_delay=0.01, max_backoff=0.02, max_attempts=3)
+    tries = []
+
+    def broken(values):
+        tries.append(dict(values))
+        raise OSError("disk full")
+
+    wb.submit("meta", {"planned_load": 1}, broken)
+    wb.flush()
+    assert len(tries) == 3 and not wb.has_pending()
+    assert "gave up after 3 attempts" in wb.failed["meta"] and "disk full" in wb.last_error
+
+    wb.submit("meta", {"planned_load": 2}, lambda v: None)
+    wb.flush()
+    assert wb.failed == {} and wb.last_error is None
+
+def test_newer_edits_win_over_a_failed_write():
+    wb = write_behind.WriteBehind(delay=60, max_delay=60, max_backoff=0.01)
+    writes = []
+
+    def flaky(values):
+        if not writes:
+            writes.append(None)
+            wb.submit("meta", {"planned_load": 2}, flaky)  # typed while the write was failing
+            raise OSError("locked")
+        writes.append(dict(values))
+
+    wb.submit("meta", {"planned_load": 1, "opening_load": 5}, flaky)
+    wb.flush()
+    assert writes == [None, {"planned_load": 2, "opening_load": 5}]
@@ -0,0 +1,98 @@
+# vessel_db.py — shared SQLite connection for the report apps
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# WAL lets readers carry on while one writer commits; NORMAL only fsyncs at checkpoints,
+# which is still crash-safe in WAL mode. busy_timeout waits out other processes' writes
+# instead of failing straight away with "database is locked".
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+}
+
+class Database:
+    """One long-lived connection per process, shared by all Streamlit sessions.
+
+    Streamlit runs each session on its own thread, so every use of the connection goes
+    through a re-entrant lock. transaction() blocks nest: inner blocks join the outer
+    transaction, so a whole user action commits (and fsyncs) once.
+
+    generation() changes whenever anything commits, so derived reads can be cached on it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        for name, value in PRAGMAS.items():
+            self.conn.execute(f"PRAGMA {name} = {value};")
+        self._depth = 0
+        self._commits = 0
+
+    def generation(self):
+        """(commits on this connection, PRAGMA data_version) — the latter moves when another
+        connection or process commits. Both are in-memory reads; no table is touched."""
+        with self.lock:
+            return (self._commits, self.conn.execute("PRAGMA data_version;").fetchone()[0])
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            cur = self.conn.cursor()
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield cur
+                finally:
+                    self._depth -= 1
+                return
+            cur.execute("BEGIN IMMEDIATE;")
+            self._depth = 1
+            try:
+                yield cur
+            except BaseException:
+                self._depth = 0
+                self.conn.rollback()
+                raise
+            self._depth = 0
+            self.conn.commit()
+            self._commits += 1
+
+    @contextmanager
+    def snapshot(self):
+        """Cursor for several reads that must see one committed state (a read transaction).
+
+        Nothing is written, so generation() does not move; inside transaction() it simply
+        joins the open transaction. Do not write through it.
+        """
+        with self.lock:
+            cur = self.conn.cursor()
+            if self._depth:
+                yield cur
+                return
+            cur.execute("BEGIN;")
+            try:
+                yield cur
+            finally:
+                self.conn.commit()
+
+    @contextmanager
+    def reading(self):
+        """Cursor for reads outside a transaction (several SELECTs under one lock hold)."""
+        with self.lock:
+            yield self.conn.cursor()
+
+    def query(self, sql: str, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
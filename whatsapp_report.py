@@ -3,29 +3,117 @@ import streamlit as st
 import json
 import os
 import urllib.parse
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 import pytz
 import pandas as pd
-import io
+import re
+
+import analytics
+import export
+import idle
+import write_behind
+from record_store import RecordStore
 
 # ---------------- CONFIG ----------------
-SAVE_FILE = "vessel_report.json"
+SAVE_FILE = "vessel_report.json"   # legacy full-file save, imported once into the log
+LOG_FILE = "vessel_report.jsonl"  # log of the default call
+CALLS_DIR = "vessel_calls"         # one log per additional vessel call
+DEFAULT_CALL = "default"
 SA_TZ = pytz.timezone("Africa/Johannesburg")
 st.set_page_config(page_title="Vessel Moves Tracker", layout="wide")
 
 # ---------------- HELPERS ----------------
+def call_log_path(call_id):
+    # the original single-vessel log stays the default call
+    if call_id == DEFAULT_CALL:
+        return LOG_FILE
+    return os.path.join(CALLS_DIR, f"{call_id}.jsonl")
+
+def list_calls():
+    calls = [DEFAULT_CALL]
+    if os.path.isdir(CALLS_DIR):
+        calls += sorted(f[:-len(".jsonl")] for f in os.listdir(CALLS_DIR) if f.endswith(".jsonl"))
+    return calls
+
+def create_call(vessel_name, berthed_date):
+    call_id = re.sub(r"[^a-z0-9]+", "-", f"{vessel_name} {berthed_date}".lower()).strip("-") or "call"
+    os.makedirs(CALLS_DIR, exist_ok=True)
+    path = call_log_path(call_id)
+    if not os.path.exists(path):
+        new_store = RecordStore(path)
+        new_store.update({"vessel_name": vessel_name, "berthed_date": berthed_date})
+    return call_id
+
+def on_new_call():
+    name = (st.session_state.get("new_call_vessel") or "").strip()
+    if name:
+        st.session_state["call_id"] = create_call(name, (st.session_state.get("new_call_berthed") or "").strip())
+
+# ---- Vessel call switcher: each call only ever loads its own log ----
+if st.session_state.get("call_id") not in list_calls():
+    st.session_state["call_id"] = DEFAULT_CALL
+with st.sidebar:
+    st.subheader("Vessel Call")
+    st.selectbox("Active call", list_calls(), key="call_id")
+    with st.expander("Start new vessel call"):
+        st.text_input("Vessel Name", key="new_call_vessel")
+        st.text_input("Berthed Date", key="new_call_berthed")
+        st.button("Create call", on_click=on_new_call)
+
+@st.cache_resource
+def get_store(path, legacy_path=None):
+    """One store per call log for the whole server; it only replays the log when it changed."""
+    return RecordStore(path, legacy_path=legacy_path)
+
+@st.cache_resource
+def get_autosave():
+    """Per-process write-behind worker: settings edits are coalesced and saved off the UI thread."""
+    return write_behind.WriteBehind()
+
+CALL_ID = st.session_state["call_id"]
+store = get_store(call_log_path(CALL_ID), legacy_path=SAVE_FILE if CALL_ID == DEFAULT_CALL else None)
+autosave = get_autosave()
+
+def save_settings(values):
+    """Settings shown this run go into this session's `data` now and reach the log in the background."""
+    saved = store.load()
+    changed = {k: v for k, v in values.items() if saved.get(k, object()) != v}
+    data.update(values)
+    if changed:
+        autosave.submit(store.path, changed, lambda v, s=store: s.update(v))
+
+def save_now():
+    """Before an explicit save: settings edits land first, so the log keeps their order."""
+    autosave.flush()
+
 def load_data():
-    if os.path.exists(SAVE_FILE):
-        try:
-            with open(SAVE_FILE, "r") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
-
-def save_data(d):
-    with open(SAVE_FILE, "w") as f:
-        json.dump(d, f, indent=2)
+    """This session's own copy of the log state, and the log generation it was read at.
+
+    The store's dict is shared by every session, so it is only ever changed through the
+    store (under its lock). Lists are copied too; the records in them are the store's and
+    are read-only here. The generation is taken under the same lock, so caches keyed on it
+    never hold rows from another point of the log.
+    """
+    with store.lock:
+        saved = store.load()
+        return {k: list(v) if isinstance(v, list) else v for k, v in saved.items()}, store.seen
+
+@st.cache_data(max_entries=16)
+def idle_frame(path, generation, _data):
+    """Idle log DataFrame, rebuilt only when the log generation moves."""
+    return pd.DataFrame(_data.get("idle_logs") or [])
+
+@st.cache_data(max_entries=16)
+def idle_ix_for(path, generation, _data):
+    """Idle lines as an IdleIndex, shared by the idle panel and productivity."""
+    return idle.IdleIndex.from_entries(_data.get("idle_logs") or [])
+
+@st.cache_data(max_entries=16)
+def productivity_rows(path, generation, _data):
+    """Crane productivity table rows, recomputed only when the log generation moves."""
+    row_calls, mats = analytics.from_records(_data["hourly_records"])
+    prod_idle = analytics.idle_arrays(idle_ix_for(path, generation, _data))
+    return analytics.table(analytics.productivity(row_calls, mats, prod_idle))
 
 def hour_label_to_start(label):
     # "06h00 - 07h00" -> 6
@@ -34,35 +122,18 @@ def hour_label_to_start(label):
     except Exception:
         return None
 
-def parse_block_hours(block_label):
-    # returns list of start hours in the block (e.g. 06-10 => [6,7,8,9])
-    left, right = block_label.split(" - ")
-    s = int(left[:2])
-    e = int(right[:2])
-    if s < e:
-        return list(range(s, e))
-    else:
-        return list(range(s, 24)) + list(range(0, e))
-
 def now_iso():
     return datetime.now(SA_TZ).isoformat()
 
 def minutes_between(start_str, end_str):
-    # expects "HHhMM" or "HH:MM" or "HHMM"
-    def to_dt(t):
-        t = t.replace("h", ":")
-        if ":" not in t:
-            t = t[:2] + ":" + t[2:]
-        return datetime.strptime(t, "%H:%M")
-    s = to_dt(start_str)
-    e = to_dt(end_str)
-    # if end earlier than start, assume next day
-    if e < s:
-        e += timedelta(days=1)
-    return int((e - s).total_seconds() // 60)
+    # expects "HHhMM" or "HH:MM" or "HHMM"; an end earlier than the start is the next day
+    mins = idle.idle_minutes(start_str, end_str)
+    if mins is None:
+        raise ValueError(f"bad idle time {start_str!r} - {end_str!r}")
+    return mins
 
 # ---------------- LOAD / INIT ----------------
-data = load_data()
+data, data_gen = load_data()
 defaults = {
     "vessel_name": "MSC NILA",
     "berthed_date": "14/08/2025 @ 10H55",
@@ -89,7 +160,10 @@ defaults = {
 }
 for k, v in defaults.items():
     data.setdefault(k, v)
-save_data(data)
+# done_* only ever change by `add` when an hour is saved (hourly_last_saved with them): a "set"
+# from this session's copy could overwrite another clerk's hour
+SAVED_WITH_HOURS = {k for k in defaults if k.startswith("done_")} | {"hourly_last_saved"}
+save_settings({k: data[k] for k in defaults if not isinstance(defaults[k], list) and k not in SAVED_WITH_HOURS})
 
 # ---------------- UI ----------------
 st.title("⚓ Vessel Hourly & 4-Hourly Moves Tracker")
@@ -117,8 +191,8 @@ with st.expander("Plan Totals & Opening Balances (click to expand)", expanded=Fa
         opening_restow_load = st.number_input("Opening Restow Load (deduction)", value=int(data["opening_restow_load"]))
         opening_restow_disch = st.number_input("Opening Restow Discharge (deduction)", value=int(data["opening_restow_disch"]))
 
-# persist vessel & plan fields
-data.update({
+# persist vessel & plan fields (only changed values reach disk, in the background)
+save_settings({
     "vessel_name": vessel_name,
     "berthed_date": berthed_date,
     "first_lift": first_lift,
@@ -132,7 +206,10 @@ data.update({
     "opening_restow_load": int(opening_restow_load),
     "opening_restow_disch": int(opening_restow_disch)
 })
-save_data(data)
+if autosave.failed:
+    st.error(f"Background save gave up: {'; '.join(autosave.failed.values())}. Re-enter those changes.")
+elif autosave.last_error:
+    st.warning(f"Background save failed, retrying: {autosave.last_error}")
 
 # ---- Hourly Entry ----
 st.header("Hourly Entry")
@@ -250,23 +327,30 @@ if st.button("Add Idle Entry"):
             "reason": reason,
             "ts": now_iso()
         }
-        data.setdefault("idle_logs", []).append(rec)
-        save_data(data)
+        save_now()
+        store.append("idle_logs", rec)
+        data, data_gen = load_data()
         st.success("Idle entry added.")
 
 # show idle log (today)
 st.subheader("Idle Log (all entries)")
-idle_df = pd.DataFrame(data.get("idle_logs", []))
+idle_df = idle_frame(store.path, data_gen, data)
 if not idle_df.empty:
     st.dataframe(idle_df.sort_values("ts", ascending=False).reset_index(drop=True))
-    # delete selected entries
-    idx_to_delete = st.multiselect("Select rows (index) to delete from idle log (then press Delete selected)", idle_df.index.tolist())
+    idle_ix = idle_ix_for(store.path, data_gen, data)
+    st.caption("Downtime by crane (overlaps counted once): "
+               + " | ".join(f"{c} {m} min" for c, m in sorted(idle_ix.by_crane().items())))
+    st.caption("By reason: " + " | ".join(f"{r} {m} min" for r, m in sorted(idle_ix.by_reason().items(), key=lambda kv: -kv[1])))
+    # delete selected entries (by ts: another clerk may have added or removed lines since this copy)
+    idle_by_ts = {r["ts"]: r for r in data.get("idle_logs", []) if r.get("ts")}
+    ts_to_delete = st.multiselect(
+        "Select entries to delete from idle log (then press Delete selected)", sorted(idle_by_ts, reverse=True),
+        format_func=lambda ts: " ".join(str(idle_by_ts[ts].get(k, "")) for k in ("date", "crane", "start", "end", "reason")))
     if st.button("Delete selected idle entries"):
-        if idx_to_delete:
-            remaining = [r for i, r in enumerate(data.get("idle_logs", [])) if i not in idx_to_delete]
-            data["idle_logs"] = remaining
-            save_data(data)
-            st.experimental_rerun()
+        if ts_to_delete:
+            save_now()
+            store.delete("idle_logs", ts_to_delete)
+            st.rerun()
         else:
             st.info("No rows selected.")
 else:
@@ -289,18 +373,18 @@ if st.button("Save Hourly Entry"):
         "used_in_4h": False,
         "ts": now_iso()
     }
-    data.setdefault("hourly_records", []).append(rec)
-
-    # update cumulative totals
-    data["done_load"] = data.get("done_load", 0) + rec["fwd_load"] + rec["mid_load"] + rec["aft_load"] + rec["poop_load"]
-    data["done_disch"] = data.get("done_disch", 0) + rec["fwd_disch"] + rec["mid_disch"] + rec["aft_disch"] + rec["poop_disch"]
-    data["done_restow_load"] = data.get("done_restow_load", 0) + rec["fwd_restow_load"] + rec["mid_restow_load"] + rec["aft_restow_load"] + rec["poop_restow_load"]
-    data["done_restow_disch"] = data.get("done_restow_disch", 0) + rec["fwd_restow_disch"] + rec["mid_restow_disch"] + rec["aft_restow_disch"] + rec["poop_restow_disch"]
-    data["done_hatch_open"] = data.get("done_hatch_open", 0) + rec["hatch_fwd_open"] + rec["hatch_mid_open"] + rec["hatch_aft_open"]
-    data["done_hatch_close"] = data.get("done_hatch_close", 0) + rec["hatch_fwd_close"] + rec["hatch_mid_close"] + rec["hatch_aft_close"]
-
-    data["hourly_last_saved"] = hour_label
-    save_data(data)
+    # update cumulative totals (written with the record as one log line); the totals go in as
+    # increments, so a clerk saving from an out-of-date copy cannot overwrite another's hour
+    save_now()
+    store.append("hourly_records", rec, values={"hourly_last_saved": hour_label}, add={
+        "done_load": rec["fwd_load"] + rec["mid_load"] + rec["aft_load"] + rec["poop_load"],
+        "done_disch": rec["fwd_disch"] + rec["mid_disch"] + rec["aft_disch"] + rec["poop_disch"],
+        "done_restow_load": rec["fwd_restow_load"] + rec["mid_restow_load"] + rec["aft_restow_load"] + rec["poop_restow_load"],
+        "done_restow_disch": rec["fwd_restow_disch"] + rec["mid_restow_disch"] + rec["aft_restow_disch"] + rec["poop_restow_disch"],
+        "done_hatch_open": rec["hatch_fwd_open"] + rec["hatch_mid_open"] + rec["hatch_aft_open"],
+        "done_hatch_close": rec["hatch_fwd_close"] + rec["hatch_mid_close"] + rec["hatch_aft_close"],
+    })
+    data, data_gen = load_data()
     st.success("Hourly entry saved and cumulative updated.")
 
 # ---- Hourly Template preview (always visible) ----
@@ -404,18 +488,8 @@ sel_date = st.date_input("Date for 4-hour block", value=datetime.now(SA_TZ).date
 include_used = st.checkbox("Include hourly entries that were already used in a 4H report", value=False)
 
 # find matched hourly records
-req_hours = parse_block_hours(sel_block)
 sel_date_str = sel_date.strftime("%Y-%m-%d")
-matched = []
-missing = []
-for h in req_hours:
-    candidates = [r for r in data.get("hourly_records", []) if r["date"] == sel_date_str and r["start_hour"] == h]
-    if not include_used:
-        candidates = [r for r in candidates if not r.get("used_in_4h", False)]
-    if candidates:
-        matched.append(candidates[-1])
-    else:
-        missing.append(h)
+matched, missing = store.match_block(sel_date_str, sel_block, include_used=include_used)
 
 if missing:
     st.info(f"Missing hourly entries for: {', '.join(str(x).zfill(2) for x in missing)}. You can manually edit 4H inputs below.")
@@ -547,19 +621,18 @@ if st.button("Save 4-Hourly Report (mark matched hourly entries as used)"):
         "hatch_fwd_open": int(hatch_fwd_open_4h), "hatch_mid_open": int(hatch_mid_open_4h), "hatch_aft_open": int(hatch_aft_open_4h),
         "hatch_fwd_close": int(hatch_fwd_close_4h), "hatch_mid_close": int(hatch_mid_close_4h), "hatch_aft_close": int(hatch_aft_close_4h)
     }
-    data.setdefault("four_hour_reports", []).append(report)
+    save_now()
+    store.append("four_hour_reports", report)
     # mark matched hourly records as used if they were matched
-    for rec in matched:
-        for orig in data.get("hourly_records", []):
-            if orig.get("ts") == rec.get("ts"):
-                orig["used_in_4h"] = True
-    save_data(data)
+    if matched:
+        store.mark_used([rec.get("ts") for rec in matched])
+    data, data_gen = load_data()
     st.success("4-hourly saved and matched hourly entries (if any) marked used.")
 
 if st.button("Reset all 'used_in_4h' flags"):
-    for rec in data.get("hourly_records", []):
-        rec["used_in_4h"] = False
-    save_data(data)
+    save_now()
+    store.reset_used()
+    data, data_gen = load_data()
     st.success("'used_in_4h' flags reset.")
 
 # Send 4-hourly via WhatsApp
@@ -580,40 +653,42 @@ if st.button("Open WhatsApp (4H)"):
     else:
         st.warning("Enter a valid number or group link.")
 
+# ---- Crane productivity (gross / net moves per crane hour) ----
+st.header("Crane Productivity")
+if data.get("hourly_records"):
+    prod_rows = productivity_rows(store.path, data_gen, data)
+    st.dataframe(pd.DataFrame(prod_rows).drop(columns=["call", "vessel"]), hide_index=True)
+    st.caption("Gross = box moves / hours on the call of each working crane; net also takes out the idle logged for that crane.")
+else:
+    st.write("No hourly entries saved yet.")
+
 # ---- Export / Download data ----
+# Nothing is built until a download is clicked; exports are written in chunks to a temp file.
 st.header("Export / Download")
-if st.button("Download vessel_report.json"):
-    with open(SAVE_FILE, "rb") as f:
-        st.download_button("Click to download JSON", f, file_name=SAVE_FILE)
+EXPORT_LISTS = {"Hourly records": "hourly_records", "4-Hourly reports": "four_hour_reports", "Idle log": "idle_logs"}
 
-# prepare CSV downloads
-if data.get("hourly_records"):
-    hr_df = pd.DataFrame(data["hourly_records"])
-else:
-    hr_df = pd.DataFrame()
-if data.get("four_hour_reports"):
-    fr_df = pd.DataFrame(data["four_hour_reports"])
-else:
-    fr_df = pd.DataFrame()
-if data.get("idle_logs"):
-    idle_df = pd.DataFrame(data["idle_logs"])
-else:
-    idle_df = pd.DataFrame()
+def stored_lists():
+    """The store's own lists as they are now (no copy of the records, just of the lists)."""
+    with store.lock:
+        return {k: list(v) if isinstance(v, list) else v for k, v in store.load().items()}
+
+def deferred_records(list_key, fmt):
+    """Download data built only when the button is clicked, from the store rather than this run's copy."""
+    return lambda: export.open_once(export.export_records(stored_lists().get(list_key, []), fmt))
 
-def to_csv_bytes(df):
-    buf = io.StringIO()
-    df.to_csv(buf, index=False)
-    return buf.getvalue().encode()
+st.download_button("Download vessel_report.json", lambda: export.open_once(export.export_json(stored_lists())),
+                   file_name=SAVE_FILE, mime="application/json", on_click="ignore")
 
-col_dl1, col_dl2, col_dl3 = st.columns(3)
+col_dl1, col_dl2, col_dl3 = st.columns([2, 1, 1])
 with col_dl1:
-    if not hr_df.empty:
-        st.download_button("Download Hourly CSV", to_csv_bytes(hr_df), file_name="hourly_records.csv", mime="text/csv")
+    export_list = st.selectbox("Records to export", list(EXPORT_LISTS))
 with col_dl2:
-    if not fr_df.empty:
-        st.download_button("Download 4-Hourly CSV", to_csv_bytes(fr_df), file_name="four_hour_reports.csv", mime="text/csv")
+    export_fmt = st.selectbox("Format", export.available_formats())
 with col_dl3:
-    if not idle_df.empty:
-        st.download_button("Download Idle Log CSV", to_csv_bytes(idle_df), file_name="idle_logs.csv", mime="text/csv")
+    n_rows = len(data.get(EXPORT_LISTS[export_list], []))
+    suffix, mime = export.FORMATS[export_fmt]
+    st.download_button(f"Download {export_list} ({n_rows} rows)", deferred_records(EXPORT_LISTS[export_list], export_fmt),
+                       file_name=EXPORT_LISTS[export_list] + suffix, mime=mime, on_click="ignore",
+                       disabled=not n_rows)
 
-st.caption("Data is saved in vessel_report.json. 4-hourly sums are prefilled from hourly saved entries but are editable. Cumulative totals come from saved hourly records and remain consistent.")
\ No newline at end of file
+st.caption("Data is saved in vessel_report.jsonl (append-only log). 4-hourly sums are prefilled from hourly saved entries but are editable. Cumulative totals come from saved hourly records and remain consistent.")
\ No newline at end of file
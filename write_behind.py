@@ -0,0 +1,137 @@
+# write_behind.py — debounced background saves for settings edits (one worker per process)
+import atexit
+import threading
+import time
+
+class WriteBehind:
+    """Coalesces scalar edits per key and writes them from a background thread.
+
+    submit(key, values, write) merges `values` into whatever is already pending for `key`;
+    the worker calls write(merged) once no edit has arrived for `delay` seconds (or `max_delay`
+    after the first one, so a stream of edits still lands). flush() writes everything pending
+    in the caller's thread: explicit actions (Generate, Save, switching call) flush first, so
+    their own writes always follow the edits made before them.
+
+    A failed write keeps its values pending (newer edits win) and is retried after a backoff
+    that doubles up to `max_backoff`; last_error holds the failure for the UI. After
+    `max_attempts` failures in a row the edit is dropped and `failed[key]` says so until
+    that key next saves.
+    """
+
+    def __init__(self, delay=0.5, max_delay=3.0, max_backoff=8.0, max_attempts=5):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.pending = {}      # key -> [values, write, first submit, last submit / failure, failures]
+        self.in_flight = set() # keys taken for writing and not yet written
+        self.last_error = None
+        self.failed = {}       # key -> why its edit was dropped
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()  # one write at a time, worker or flush
+        self.worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self.worker.start()
+        atexit.register(self.flush)
+
+    def submit(self, key, values, write):
+        now = time.monotonic()
+        with self.cond:
+            job = self.pending.get(key)
+            if job is None:
+                self.pending[key] = [dict(values), write, now, now, 0]
+            else:
+                job[0].update(values)
+                job[1], job[3] = write, now
+            self.cond.notify_all()
+
+    def _ready_at(self, job):
+        _, _, first, last, failures = job
+        if failures:
+            return last + min(self.delay * 2 ** (failures - 1), self.max_backoff)
+        return min(last + self.delay, first + self.max_delay)
+
+    def _due(self, now, keys=None):
+        """Keys ready to write, and seconds until the next one will be (keys being written wait)."""
+        ready, wait = [], None
+        for key, job in self.pending.items():
+            if key in self.in_flight or (keys is not None and key not in keys):
+                continue
+            at = self._ready_at(job)
+            if at <= now:
+                ready.append(key)
+            else:
+                wait = at - now if wait is None else min(wait, at - now)
+        return ready, wait
+
+    def _take(self, keys):
+        """Pop the jobs for `keys` and mark them in flight (call with self.cond held)."""
+        jobs = [(k, self.pending.pop(k)) for k in keys if k in self.pending]
+        self.in_flight.update(k for k, _ in jobs)
+        return jobs
+
+    def _write(self, jobs):
+        with self.write_lock:
+            for key, (values, write, _, _, failures) in jobs:
+                try:
+                    write(values)
+                except Exception as e:
+                    self._failed(key, values, write, failures + 1, e)
+                else:
+                    self.last_error = None
+                    self.failed.pop(key, None)
+                finally:
+                    with self.cond:
+                        self.in_flight.discard(key)
+                        self.cond.notify_all()
+
+    def _failed(self, key, values, write, failures, error):
+        """Keep the edit for a later retry, or drop it once it has failed max_attempts times."""
+        self.last_error = f"{key}: {error}"
+        if failures >= self.max_attempts:
+            self.failed[key] = f"{key}: {error} (gave up after {failures} attempts)"
+            return
+        now = time.monotonic()
+        with self.cond:
+            job = self.pending.setdefault(key, [{}, write, now, now, 0])
+            job[0] = {**values, **job[0]}
+            job[3], job[4] = now, failures
+
+    def _run(self):
+        while True:
+            with self.cond:
+                ready, wait = self._due(time.monotonic())
+                while not ready:
+                    self.cond.wait(wait)
+                    ready, wait = self._due(time.monotonic())
+                jobs = self._take(ready)
+            self._write(jobs)
+
+    def flush(self, key=None):
+        """Write pending edits now (all keys, or just `key`), in the calling thread.
+
+        Returns once nothing for them is pending or being written by the worker, so a write
+        made after flush() always lands after them. A failing edit is retried on its backoff
+        until it saves or is dropped.
+        """
+        keys = None if key is None else {key}
+        while True:
+            with self.cond:
+                while True:
+                    busy = self.in_flight if keys is None else self.in_flight & keys
+                    mine = [k for k in self.pending if keys is None or k in keys]
+                    if not busy and not mine:
+                        return
+                    ready, wait = self._due(time.monotonic(), keys)
+                    # jobs that never failed are written now, without their debounce delay
+                    ready += [k for k in mine if k not in busy and not self.pending[k][4] and k not in ready]
+                    if ready:
+                        break
+                    self.cond.wait(wait)
+                jobs = self._take(ready)
+            self._write(jobs)
+
+    def has_pending(self, key=None):
+        with self.cond:
+            if key is None:
+                return bool(self.pending or self.in_flight)
+            return key in self.pending or key in self.in_flight